@@ -0,0 +1,48 @@
+'''Times reading a LevelDB directory with scripts/ccl_leveldb.py: the full iteration of its records,
+   and looking up keys with find_records against filtering the full iteration, as the plugins did.
+
+   Usage (from the repository root):
+       python -m benchmarks.leveldb_benchmark <leveldb directory> [--lookups 100]
+
+   The keys looked up are picked from the records of the database. The snappy backend in use
+   (cramjam, python-snappy or python) is printed with the times.
+'''
+import argparse
+import random
+import time
+
+from scripts import ccl_leveldb
+from scripts import ccl_simplesnappy
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the LevelDB reader')
+    parser.add_argument('path', help='LevelDB directory')
+    parser.add_argument('--lookups', type=int, default=100, help='Number of keys looked up')
+    args = parser.parse_args()
+
+    with ccl_leveldb.RawLevelDb(args.path) as db:
+        start = time.perf_counter()
+        records = list(db.iterate_records_raw())
+        iterate_time = time.perf_counter() - start
+
+    by_key = {}
+    for record in records:
+        by_key.setdefault(record.user_key, []).append(record)
+    keys = random.Random(1).sample(sorted(by_key), min(args.lookups, len(by_key)))
+
+    with ccl_leveldb.RawLevelDb(args.path) as db:
+        start = time.perf_counter()
+        for key in keys:
+            if list(db.find_records(key)) != by_key[key]:
+                raise AssertionError(f'Records of {key!r} differ')
+        find_time = time.perf_counter() - start
+
+    print(f'{len(records)} records, comparator {db.comparator}, snappy backend {ccl_simplesnappy.BACKEND}')
+    print(f'iterate_records_raw:               {iterate_time:.3f}s')
+    print(f'{len(keys)} lookups with find_records:   {find_time:.3f}s')
+    print(f'{len(keys)} lookups by full iteration: ~{iterate_time * len(keys):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
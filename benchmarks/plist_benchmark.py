@@ -0,0 +1,85 @@
+'''Compares reading binary plists with scripts/plists.py against plistlib.load, the way the plugins
+   that share plists read them: several plugins each looking up a few keys of the same files.
+
+   Usage (from the repository root):
+       python -m benchmarks.plist_benchmark [--files 200] [--keys 500] [--readers 3]
+
+   The plists are generated in a temporary folder, with nested dicts and arrays under each key.
+   The values looked up are checked against those of plistlib.
+'''
+import argparse
+import datetime
+import os
+import plistlib
+import random
+import tempfile
+import time
+
+from scripts.plists import PlistCache, load_plist, open_plist
+
+
+def generate_plist(rng, keys):
+    return {
+        'MCMMetadataIdentifier': f'com.example.app{rng.randrange(10 ** 6)}',
+        **{f'key{index}': {'name': f'value {rng.random()}', 'count': rng.randrange(2 ** 40),
+                           'date': datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=rng.randrange(10 ** 8)),
+                           'items': [rng.random() for _ in range(rng.randrange(10))],
+                           'data': rng.randbytes(rng.randrange(64))}
+           for index in range(keys)}}
+
+
+def read_with_plistlib(paths, readers):
+    values = []
+    for _ in range(readers):
+        for path in paths:
+            with open(path, 'rb') as f:
+                values.append(plistlib.load(f)['MCMMetadataIdentifier'])
+    return values
+
+
+def read_with_open_plist(paths, readers):
+    return [open_plist(path)['MCMMetadataIdentifier'] for _ in range(readers) for path in paths]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the shared plist reader')
+    parser.add_argument('--files', type=int, default=200, help='Number of plist files')
+    parser.add_argument('--keys', type=int, default=500, help='Number of keys of each plist')
+    parser.add_argument('--readers', type=int, default=3, help='Number of plugins reading each file')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for index in range(args.files):
+            path = os.path.join(folder, f'{index}.plist')
+            with open(path, 'wb') as f:
+                plistlib.dump(generate_plist(rng, args.keys), f, fmt=plistlib.FMT_BINARY)
+            paths.append(path)
+
+        plistlib_time, expected = timed(read_with_plistlib, paths, args.readers)
+        PlistCache.clear()
+        shared_time, values = timed(read_with_open_plist, paths, args.readers)
+        if values != expected:
+            raise AssertionError('Looked up values differ')
+        PlistCache.clear()
+        load_time, loaded = timed(lambda: [load_plist(path) for path in paths])
+        with open(paths[0], 'rb') as f:
+            if loaded[0] != plistlib.load(f):
+                raise AssertionError('Loaded plist differs')
+        PlistCache.clear()
+
+    print(f'{args.files} files, {args.keys} keys, read by {args.readers} plugins')
+    print(f'plistlib.load:          {plistlib_time:.3f}s')
+    print(f'open_plist:             {shared_time:.3f}s')
+    print(f'load_plist (once each): {load_time:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
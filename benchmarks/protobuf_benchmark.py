@@ -0,0 +1,118 @@
+'''Compares the compiled protobuf decoders (scripts/protobuf_decoders.py) against
+   blackboxprotobuf.decode_message on synthetic records of Biome stream typedefs.
+
+   Usage (from the repository root):
+       python -m benchmarks.protobuf_benchmark [--records 20000]
+
+   Records are encoded from the typedef of each stream, with every field set and a few fields the
+   typedef doesn't know about, as found in real records. The decoded values are checked against
+   those of blackboxprotobuf.
+'''
+import argparse
+import copy
+import random
+import time
+
+import blackboxprotobuf
+
+from scripts.protobuf_decoders import compile_typedef
+from scripts.artifacts.biomeBluetooth import bluetooth_stream
+from scripts.artifacts.biomeInfocus import infocus_stream
+from scripts.artifacts.biomeNowplaying import nowplaying_stream
+from scripts.artifacts.biomeSafari import safari_stream
+
+streams = [safari_stream, nowplaying_stream, infocus_stream, bluetooth_stream]
+
+# fields without typedef, as (typedef, value) to be encoded with the known fields
+extra_fields = {
+    '90': ({'type': 'int', 'name': ''}, 1),
+    '91': ({'type': 'bytes', 'name': ''}, b'\x08\x01\x12\x04text'),
+    '92': ({'type': 'bytes', 'name': ''}, b'com.apple.mobilesafari'),
+}
+
+
+def encodable_typedef(typedef):
+    '''typedef with the 'str' fields as 'bytes', which blackboxprotobuf can encode'''
+    typedef = copy.deepcopy(typedef)
+    for field_typedef in typedef.values():
+        if field_typedef['type'] == 'str':
+            field_typedef['type'] = 'bytes'
+        elif field_typedef['type'] == 'message':
+            field_typedef['message_typedef'] = encodable_typedef(field_typedef.get('message_typedef', {}))
+    return typedef
+
+
+def random_values(typedef, rng):
+    values = {}
+    for number, field_typedef in typedef.items():
+        field_type = field_typedef['type']
+        if field_type == 'message':
+            values[number] = random_values(field_typedef.get('message_typedef', {}), rng)
+        elif field_type in ('int', 'uint'):
+            values[number] = rng.randrange(2 ** 40)
+        elif field_type in ('double', 'float'):
+            values[number] = rng.random() * 1e9
+        elif field_type in ('fixed64', 'fixed32'):
+            values[number] = rng.randrange(2 ** 32)
+        else:
+            values[number] = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz/.:') for _ in range(rng.randrange(8, 60))).encode()
+    return values
+
+
+def generate_records(typedef, count, rng):
+    typedef = encodable_typedef(typedef or {})
+    typedef.update((number, field_typedef) for number, (field_typedef, value) in extra_fields.items())
+    records = []
+    for _ in range(count):
+        values = random_values(typedef, rng)
+        values.update((number, value) for number, (field_typedef, value) in extra_fields.items())
+        records.append(bytes(blackboxprotobuf.encode_message(values, typedef)))
+    return records
+
+
+def time_decoding(decode, records):
+    start = time.perf_counter()
+    values = [decode(record) for record in records]
+    return time.perf_counter() - start, values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the compiled protobuf decoders')
+    parser.add_argument('--records', type=int, default=20000, help='Number of synthetic records per stream')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    total_blackbox = total_compiled = 0.0
+    for stream in streams:
+        records = generate_records(stream.typedef, args.records, rng)
+        if stream.typedef is None:
+            blackbox_decode = lambda data: blackboxprotobuf.decode_message(data)[0]
+        else:
+            blackbox_decode = lambda data: blackboxprotobuf.decode_message(data, stream.typedef)[0]
+
+        blackbox_time, expected = time_decoding(blackbox_decode, records)
+        compiled_time, decoded = time_decoding(compile_typedef(stream.typedef), records)
+        if decoded != expected:
+            raise AssertionError(f'Values differ for {stream.name}')
+        line = (f'{stream.name:<30} {len(records):>7} records  blackboxprotobuf {blackbox_time:7.3f}s  '
+                f'compiled {compiled_time:7.3f}s')
+        total_blackbox += blackbox_time
+        total_compiled += compiled_time
+
+        if stream.fields is not None:
+            fields_time, decoded = time_decoding(compile_typedef(stream.typedef, stream.fields), records)
+            for path in stream.fields:
+                for values, expected_values in zip(decoded, expected):
+                    for number in path:
+                        values, expected_values = values[number], expected_values[number]
+                    if values != expected_values:
+                        raise AssertionError(f'Values of field {path} differ for {stream.name}')
+            line += f'  fields {fields_time:7.3f}s'
+        print(line)
+
+    print(f'blackboxprotobuf total: {total_blackbox:.3f}s')
+    print(f'Compiled total:         {total_compiled:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+'''Compares the indexed FileSeekerDir search against the previous linear scan of every path.
+
+   Usage (from the repository root):
+       python -m benchmarks.search_files_benchmark [--paths 2000000] [--linear 10]
+       python -m benchmarks.search_files_benchmark --check [--paths 20000]
+
+   A synthetic, depth-first listing shaped like an iOS full file system extraction is generated in
+   memory, so no files are created on disk.
+
+   With --check, every glob of the artifact plugins (__artifacts__ paths) is searched through the
+   index of a listing that also holds a path made up from each glob, the way FileSeekerDir and
+   FileSeekerItunes search, and through _PatternSet as the archive seekers do. The results must be
+   the same as matching every path with fnmatch.
+'''
+import argparse
+import os
+import random
+import re
+import time
+
+from fnmatch import _compile_pattern
+
+import plugin_loader
+from scripts.search_files import _PathIndex, _PatternSet, normcase
+
+# A sample of the globs used by the artifact plugins
+patterns = [
+    '*/mobile/Library/SMS/sms*',
+    '*/mobile/Library/Preferences/com.apple.locationd.plist',
+    '*/wireless/Library/Databases/DataUsage.sqlite*',
+    '*/Biome/streams/restricted/_DKEvent.Safari.History/local/*',
+    '*/mobile/Containers/Data/Application/*/Documents/user.db*',
+    '*/mobile/Containers/Shared/AppGroup/*/Library/Preferences/group.com.apple.Maps.plist',
+    '**/Safari/Bookmarks.db*',
+    '**/iTunesMetadata.plist',
+    '**/PluginKitPlugin/*.metadata.plist',
+    '*Health/healthdb.sqlite*',
+    '*/mobile/Media/PhotoData/PhotoCloudSharingData/*',
+    '**/Containers/Data/Application/*/tmp/*/*.*',
+    '*/LastBuildInfo.plist',
+    '*/shutdown.log',
+    '**/com.viber/ViberIcons/*.*',
+]
+
+# Globs the plugins build at run time, with dots in folder names
+checked_patterns = [
+    '*/b.c/d',
+    '*b.c/d',
+    '*/0A1B/Library/Application Support/PersistentStorage/Store/PaymentFoundation.PaymentStreamModelKey/profiles',
+    '*/com.apple.foo/Data',
+    '*/com.apple.foo/',
+]
+
+top_folders = ['private/var/mobile', 'private/var/root', 'private/var/wireless', 'private/var/db', 'System/Library']
+sub_folders = ['Library', 'Documents', 'Caches', 'Preferences', 'Application Support', 'tmp', 'Media', 'Logs',
+               'Containers', 'Data', 'Application', 'Shared', 'AppGroup', 'PhotoData', 'Thumbnails', 'Databases']
+extensions = ['plist', 'sqlite', 'sqlite-wal', 'db', 'JPG', 'HEIC', 'json', 'log', 'dat', '']
+# Files the sample patterns look for, placed once in every generated volume
+artifact_files = [
+    'mobile/Library/SMS/sms.db',
+    'mobile/Library/SMS/sms.db-wal',
+    'mobile/Library/Preferences/com.apple.locationd.plist',
+    'wireless/Library/Databases/DataUsage.sqlite',
+    'mobile/Library/Biome/streams/restricted/_DKEvent.Safari.History/local/786512',
+    'mobile/Containers/Data/Application/0A1B/Documents/user.db',
+    'mobile/Containers/Shared/AppGroup/2C3D/Library/Preferences/group.com.apple.Maps.plist',
+    'mobile/Library/Safari/Bookmarks.db',
+    'mobile/Library/Health/healthdb.sqlite',
+    'mobile/Media/PhotoData/PhotoCloudSharingData/4E5F/100CLOUD/IMG_0001.JPG',
+    'mobile/Containers/Data/Application/6A7B/tmp/cache/image.png',
+    'mobile/Containers/Data/Application/8C9D/Library/Caches/com.viber/ViberIcons/icon.png',
+    'installd/Library/MobileInstallation/LastBuildInfo.plist',
+    'db/diagnostics/shutdown.log',
+]
+
+
+def generate_paths(count, base='/extraction'):
+    '''Returns a depth-first list of count synthetic paths under base'''
+    rng = random.Random(0)
+    paths = []
+
+    def add_artifact_files(volume):
+        for artifact_file in artifact_files:
+            folder = volume
+            for part in artifact_file.split('/'):
+                folder = os.path.join(folder, part)
+                paths.append(folder)
+
+    def add_folder(folder, depth):
+        paths.append(folder)
+        if depth == 0:
+            add_artifact_files(os.path.join(folder, 'artifacts'))
+        for number in range(rng.randint(5, 40)):
+            if len(paths) >= count:
+                return
+            if depth < 9 and rng.random() < 0.12:
+                add_folder(os.path.join(folder, f'{rng.choice(sub_folders)}{number}'), depth + 1)
+            else:
+                ext = rng.choice(extensions)
+                paths.append(os.path.join(folder, f'file{number}_{rng.randrange(10 ** 6)}' + (f'.{ext}' if ext else '')))
+
+    while len(paths) < count:
+        for top in top_folders:
+            add_folder(os.path.join(base, top, f'volume{len(paths)}'), 0)
+    del paths[count:]
+    return paths
+
+
+def linear_search(paths, filepattern):
+    '''The search FileSeekerDir used before the index was added'''
+    pat = _compile_pattern(normcase(filepattern))
+    root = normcase('root/')
+    return [item for item in paths if pat(root + normcase(item)) is not None]
+
+
+def artifact_patterns():
+    '''Returns the globs of all the artifact plugins'''
+    found = []
+    for plugin in plugin_loader.PluginLoader().plugins:
+        found.extend([plugin.search] if isinstance(plugin.search, str) else plugin.search)
+    return list(dict.fromkeys(found))
+
+
+def path_for_pattern(filepattern):
+    '''Returns a relative path that (mostly) matches filepattern, its wildcards replaced by names'''
+    path = re.sub(r'\[!?\^?(.).*?\]', r'\1', filepattern)
+    return path.replace('**', 'x/y').replace('*', 'x').replace('?', 'q').lstrip('/')
+
+
+def depth_first(paths):
+    '''Returns paths and all their folders, in depth-first order'''
+    listed = set()
+    for path in paths:
+        parts = path.split('/')
+        for length in range(1, len(parts) + 1):
+            listed.add('/'.join(parts[:length]))
+    return sorted(listed, key=lambda path: path.split('/'))
+
+
+def check(count):
+    filepatterns = artifact_patterns() + checked_patterns
+    base = '/extraction'
+    relative_paths = [path[len(base) + 1:] for path in generate_paths(count, base)]
+    relative_paths = depth_first(relative_paths + [path_for_pattern(filepattern) for filepattern in filepatterns])
+    full_paths = [f'{base}/{path}' for path in relative_paths]
+    # the files of an iTunes backup: no folder entries, in the (unsorted) order of Manifest.db
+    folders = set(path.rpartition('/')[0] for path in relative_paths)
+    backup_files = [path for path in relative_paths if path not in folders]
+    random.Random(1).shuffle(backup_files)
+    order = {path: position for position, path in enumerate(backup_files)}
+    print(f'Checking {len(filepatterns)} globs against {len(full_paths)} paths')
+
+    dir_index = _PathIndex(full_paths, base, depth_first=True)
+    itunes_index = _PathIndex(sorted(backup_files, key=lambda path: path.split('/')), depth_first=True, root='',
+                              dir_entries=False)
+    pattern_set = _PatternSet(filepatterns)
+    archive_found = {filepattern: [] for filepattern in pattern_set.filepatterns}
+    for path in relative_paths:
+        for filepattern in pattern_set.match(path):
+            archive_found[filepattern].append(path)
+
+    failures = 0
+    for filepattern in filepatterns:
+        pat = _compile_pattern(normcase(filepattern))
+        results = {
+            'FileSeekerDir': (dir_index.search(filepattern), linear_search(full_paths, filepattern)),
+            'FileSeekerItunes': (sorted(itunes_index.search(filepattern), key=order.__getitem__),
+                                 [path for path in backup_files if pat(normcase(path)) is not None]),
+            '_PatternSet': (archive_found[filepattern], linear_search(relative_paths, filepattern)),
+        }
+        for seeker, (found, expected) in results.items():
+            if found != expected:
+                failures += 1
+                print(f'{seeker}: {filepattern} found {len(found)} paths, fnmatch {len(expected)}')
+    if failures:
+        raise AssertionError(f'{failures} searches differ from fnmatch')
+    print('All searches match fnmatch')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the FileSeekerDir path index')
+    parser.add_argument('--paths', type=int, default=None,
+                        help='Number of synthetic paths (2000000, or 20000 with --check)')
+    parser.add_argument('--linear', type=int, default=len(patterns),
+                        help='Number of patterns to also run through the linear scan (slow)')
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the searches of every artifact glob with fnmatch instead of timing them')
+    args = parser.parse_args()
+
+    if args.check:
+        check(args.paths or 20000)
+        return
+    args.paths = args.paths or 2000000
+
+    start = time.perf_counter()
+    paths = generate_paths(args.paths)
+    print(f'Generated {len(paths)} paths in {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    index = _PathIndex(paths, '/extraction', depth_first=True)
+    print(f'Index built in {time.perf_counter() - start:.2f}s')
+
+    indexed_total = linear_total = 0.0
+    for number, filepattern in enumerate(patterns):
+        start = time.perf_counter()
+        found = index.search(filepattern)
+        indexed_time = time.perf_counter() - start
+        indexed_total += indexed_time
+        line = f'{filepattern:<90} {len(found):>7} hits  indexed {indexed_time * 1000:9.2f}ms'
+        if number < args.linear:
+            start = time.perf_counter()
+            expected = linear_search(paths, filepattern)
+            linear_time = time.perf_counter() - start
+            linear_total += linear_time
+            if found != expected:
+                raise AssertionError(f'Results differ for {filepattern}')
+            line += f'  linear {linear_time * 1000:9.2f}ms'
+        print(line)
+
+    print(f'Indexed search total: {indexed_total:.3f}s')
+    if linear_total:
+        print(f'Linear search total:  {linear_total:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 import json
 import argparse
+import concurrent.futures
+import importlib.util
 import io
+import logging
 import pytz
 import os.path
 import typing
@@ -10,6 +13,8 @@ import traceback
 
 from scripts.search_files import *
 from scripts.ilapfuncs import *
+from scripts.plists import PlistCache
+from scripts.results_store import ResultStore
 from scripts.version_info import ileapp_version
 from time import process_time, gmtime, strftime, perf_counter
 
@@ -37,6 +42,12 @@ def validate_args(args):
     if args.load_profile and not os.path.exists(args.load_profile):
         raise argparse.ArgumentError(None, 'iLEAPP Profile file not found! Run the program again.')
 
+    if args.export == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise argparse.ArgumentError(None, 'The parquet export needs pyarrow (pip install pyarrow). Run the program again.')
+
+    if args.jobs < 1:
+        raise argparse.ArgumentError(None, 'JOBS must be at least 1. Run the program again.')
+
     try:
         timezone = pytz.timezone(args.timezone)
     except pytz.UnknownTimeZoneError:
@@ -150,6 +161,17 @@ def main():
     parser.add_argument('-c', '--create_profile_casedata', required=False, action="store",
                         help=("Generate an iLEAPP Profile file (.ilprofile) or LEAPP Case Data file (.lcasedata) into the specified path. "
                               "This argument is meant to be used alone, without any other arguments."))
+    parser.add_argument('-j', '--jobs', required=False, action="store", type=int, default=1,
+                        help='Number of artifact plugins to run at the same time (default: 1)')
+    parser.add_argument('--cache_listing', required=False, action="store_true",
+                        help=("Keep the file listing of a 'fs' or 'itunes' input in the user cache folder, "
+                              "and reuse it when the same extraction is processed again."))
+    parser.add_argument('--export', choices=['tsv', 'parquet'], required=False, action="store", default='tsv',
+                        help=("Format of the exported artifact data. 'tsv' for _TSV Exports (default), "
+                              "'parquet' for typed Parquet files and a timeline dataset partitioned by activity "
+                              "in _Parquet Exports (needs pyarrow)."))
+    parser.add_argument('--log_level', choices=['debug', 'info', 'warning', 'error'], required=False, action="store",
+                        default='info', help='Only log messages of this level and above (default: info)')
     parser.add_argument('-p', '--artifact_paths', required=False, action="store_true",
                         help=("Generate a text file list of artifact paths. "
                               "This argument is meant to be used alone, without any other arguments."))
@@ -285,15 +307,66 @@ def main():
         if output_path[1] == ':': output_path = '\\\\?\\' + output_path.replace('/', '\\')
 
     out_params = OutputParameters(output_path)
+    Logger.level = getattr(logging, args.log_level.upper())
 
     selected_plugins = plugins_parsed_first + selected_plugins
     
-    crunch_artifacts(selected_plugins, extracttype, input_path, out_params, wrap_text, loader, casedata, time_offset, profile_filename)
+    crunch_artifacts(selected_plugins, extracttype, input_path, out_params, wrap_text, loader, casedata, time_offset, profile_filename, args.jobs, args.cache_listing, args.export)
+
+
+def run_plugin(plugin, files_found, category_folder, seeker, wrap_text, time_offset):
+    '''Runs one plugin, any exception it raises is logged and does not stop the run'''
+    logfunc()
+    logfunc('{} [{}] artifact started'.format(plugin.name, plugin.module_name))
+    try:
+        plugin.method(files_found, category_folder, seeker, wrap_text, time_offset)
+    except Exception as ex:
+        logfunc('Reading {} artifact had errors!'.format(plugin.name), logging.ERROR)
+        logfunc('Error was {}'.format(str(ex)), logging.ERROR)
+        logfunc('Exception Traceback: {}'.format(traceback.format_exc()), logging.ERROR)
+        return False
+    logfunc('{} [{}] artifact completed'.format(plugin.name, plugin.module_name))
+    return True
+
+
+def run_plugins_parallel(planned, jobs, run_args, plugin_done):
+    '''Runs the planned (plugin, files_found, category_folder) entries on a pool of jobs threads.
+       A plugin is only started once the plugins named in its requires (and lastbuild, which sets
+       the iOS version in artGlobals) have finished. Requirements that are not part of the plan are
+       ignored. Threads are used rather than processes as plugins share the seeker and the open
+       archives, and spend most of their time in sqlite and file I/O, which release the GIL.'''
+    planned_names = set(plugin.name for plugin, _, _ in planned)
+    pending = list(planned)
+    finished = set()
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for entry in list(pending):
+                plugin = entry[0]
+                requires = set(plugin.requires)
+                if plugin.name != 'lastbuild':
+                    requires.add('lastbuild')
+                if all(name in finished for name in requires & planned_names):
+                    pending.remove(entry)
+                    running[executor.submit(run_plugin, *entry, *run_args)] = plugin
+            if not running:
+                logfunc('Circular requires between plugins {}, running them one by one'.format(
+                    ', '.join(plugin.name for plugin, _, _ in pending)))
+                for entry in pending:
+                    run_plugin(*entry, *run_args)
+                    plugin_done(entry[0])
+                break
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                plugin = running.pop(future)
+                finished.add(plugin.name)
+                plugin_done(plugin)
 
 
 def crunch_artifacts(
         plugins: typing.Sequence[plugin_loader.PluginSpec], extracttype, input_path, out_params, wrap_text,
-        loader: plugin_loader.PluginLoader, casedata, time_offset, profile_filename):
+        loader: plugin_loader.PluginLoader, casedata, time_offset, profile_filename, jobs=1, cache_listing=False,
+        export_format='tsv'):
     start = process_time()
     start_wall = perf_counter()
  
@@ -306,10 +379,18 @@ def crunch_artifacts(
     logfunc('By: Yogesh Khatri   | @SwiftForensics | swiftforensics.com\n')
     logdevinfo()
     
+    OutputParameters.export_format = 'tsv'
+    if export_format == 'parquet':
+        try:
+            from scripts.parquet_export import ParquetSink
+            OutputParameters.export_format = 'parquet'
+        except ImportError as ex:
+            logfunc(f'Parquet export is not available ({ex}), pip install pyarrow to use it. Writing TSV exports instead.')
+
     seeker = None
     try:
         if extracttype == 'fs':
-            seeker = FileSeekerDir(input_path)
+            seeker = FileSeekerDir(input_path, cache_listing)
 
         elif extracttype in ('tar', 'gz'):
             seeker = FileSeekerTar(input_path, out_params.temp_folder)
@@ -318,7 +399,7 @@ def crunch_artifacts(
             seeker = FileSeekerZip(input_path, out_params.temp_folder)
 
         elif extracttype == 'itunes':
-            seeker = FileSeekerItunes(input_path, out_params.temp_folder)
+            seeker = FileSeekerItunes(input_path, out_params.temp_folder, cache_listing)
 
         else:
             logfunc('Error on argument -o (input type)')
@@ -357,31 +438,43 @@ def crunch_artifacts(
             logfunc('Info.plist not found for iTunes Backup!')
             log.write('Info.plist not found for iTunes Backup!')
 
-    # Search for the files per the arguments
+    # Search for the files of all plugins at once, so the seeker only walks its listing a single time
+    search_regexes_by_plugin = {}
     for plugin in plugins:
         if isinstance(plugin.search, list) or isinstance(plugin.search, tuple):
-            search_regexes = plugin.search
+            search_regexes_by_plugin[plugin.name] = plugin.search
         else:
-            search_regexes = [plugin.search]
-        parsed_modules += 1
-        GuiWindow.SetProgressBar(parsed_modules, len(plugins))
+            search_regexes_by_plugin[plugin.name] = [plugin.search]
+    logfunc('Searching for artifact files...')
+    # Files of lazy plugins are only left out when the seeker can read them from the archive later on
+    found_by_regex = seeker.search_many(
+        [regex for plugin in plugins if not (plugin.lazy_files and seeker.streams_members)
+         for regex in search_regexes_by_plugin[plugin.name]])
+
+    # Work out which plugins have files to parse, before running (or even importing) any of them
+    planned = []  # (plugin, files_found, category_folder)
+    skipped = []
+    for plugin in plugins:
+        search_regexes = search_regexes_by_plugin[plugin.name]
         files_found = []
         log.write(f'<b>For {plugin.name} module</b>')
         for artifact_search_regex in search_regexes:
-            found = seeker.search(artifact_search_regex)
+            if plugin.lazy_files:
+                found = seeker.search_lazy(artifact_search_regex)
+            else:
+                found = found_by_regex[artifact_search_regex]
             if not found:
                 log.write(f'<ul><li>No file found for regex <i>{artifact_search_regex}</i></li></ul>')
             else:
                 log.write(f'<ul><li>{len(found)} {"files" if len(found) > 1 else "file"} for regex <i>{artifact_search_regex}</i> located at:')
                 for pathh in found:
+                    pathh = str(pathh)
                     if pathh.startswith('\\\\?\\'):
                         pathh = pathh[4:]
                     log.write(f'<ul><li>{pathh}</li></ul>')
                 log.write(f'</li></ul>')
                 files_found.extend(found)
         if files_found:
-            logfunc()
-            logfunc('{} [{}] artifact started'.format(plugin.name, plugin.module_name))
             category_folder = os.path.join(out_params.report_folder_base, plugin.category)
             if not os.path.exists(category_folder):
                 try:
@@ -390,17 +483,40 @@ def crunch_artifacts(
                     logfunc('Error creating {} report directory at path {}'.format(plugin.name, category_folder))
                     logfunc('Error was {}'.format(str(ex)))
                     continue  # cannot do work
-            try:
-                plugin.method(files_found, category_folder, seeker, wrap_text, time_offset)
-            except Exception as ex:
-                logfunc('Reading {} artifact had errors!'.format(plugin.name))
-                logfunc('Error was {}'.format(str(ex)))
-                logfunc('Exception Traceback: {}'.format(traceback.format_exc()))
-                continue  # nope
+            planned.append((plugin, files_found, category_folder))
+        else:
+            skipped.append(plugin)
+
+    if skipped:
+        log.write(f'<br><b>Skipped {len(skipped)} modules with no files found:</b><ul>')
+        for plugin in skipped:
+            log.write(f'<li>{plugin.name} [{plugin.module_name}]</li>')
+        log.write('</ul>')
+    logfunc(f'{len(planned)} modules have files to parse, {len(skipped)} modules skipped (no files found)')
+    progress_maximum = max(len(planned), 1) # a progress bar maximum of 0 is not accepted
+    GuiWindow.SetProgressBar(parsed_modules, progress_maximum)
+
+    def plugin_done(plugin):
+        nonlocal parsed_modules
+        parsed_modules += 1
+        GuiWindow.SetProgressBar(parsed_modules, progress_maximum)
 
-            logfunc('{} [{}] artifact completed'.format(plugin.name, plugin.module_name))
+    run_args = (seeker, wrap_text, time_offset)
+    if jobs > 1:
+        logfunc(f'Running artifact plugins with {jobs} jobs')
+        run_plugins_parallel(planned, jobs, run_args, plugin_done)
+    else:
+        for plugin, files_found, category_folder in planned:
+            run_plugin(plugin, files_found, category_folder, *run_args)
+            plugin_done(plugin)
 
     log.close()
+    PlistCache.clear()
+    ResultStore.close_all()
+    TimelineSink.close_all()
+    TsvSink.close_all()
+    if OutputParameters.export_format == 'parquet':
+        ParquetSink.close_all()
 
     logfunc('')
     logfunc('Processes completed.')
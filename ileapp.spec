@@ -6,7 +6,7 @@ a = Analysis(['ileapp.py'],
              pathex=['.\\scripts\\artifacts'],
              binaries=[],
              datas=[('.\\scripts', '.\\scripts')],
-             hiddenimports=['simplekml'],
+             hiddenimports=[],
              hookspath=['./'],
              runtime_hooks=[],
              excludes=[],
@@ -1,5 +1,9 @@
+import ast
+import json
+import os
 import pathlib
 import dataclasses
+import threading
 import typing
 import importlib.util
 
@@ -7,6 +11,10 @@ import importlib.util
 # a bit long-winded to make compatible with PyInstaller
 PLUGINPATH = pathlib.Path(__file__).resolve().parent / pathlib.Path("scripts/artifacts")
 
+# The artifact definitions of every plugin, read from the sources without importing them (see _scan_plugin)
+MANIFEST_NAME = "_plugin_manifest.json"
+MANIFEST_VERSION = 1
+
 
 @dataclasses.dataclass(frozen=True)
 class PluginSpec:
@@ -15,6 +23,94 @@ class PluginSpec:
     category: str
     search: str
     method: typing.Callable  # todo define callable signature
+    lazy_files: bool = False  # files_found holds path objects read straight from archives (see search_lazy)
+    requires: typing.Sequence[str] = ()  # names of plugins that must complete before this one runs (--jobs)
+
+
+class LazyPluginFunction:
+    """Stands in for a plugin's function; the plugin module is only imported the first time it is called"""
+    _modules: dict[pathlib.Path, typing.Any] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path: pathlib.Path, func_name: str):
+        self.path = path
+        self.func_name = func_name
+
+    def resolve(self) -> typing.Callable:
+        with LazyPluginFunction._lock:
+            mod = LazyPluginFunction._modules.get(self.path)
+            if mod is None:
+                mod = LazyPluginFunction._modules[self.path] = PluginLoader.load_module(self.path)
+        return getattr(mod, self.func_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path.stem}.{self.func_name})"
+
+
+def _literal(node: ast.AST, allow_name: bool = False):
+    """literal_eval of node; a bare name (a v1 plugin function) is returned as its string when allow_name"""
+    if allow_name and isinstance(node, ast.Name):
+        return node.id
+    return ast.literal_eval(node)
+
+
+def _scan_plugin(py_file: pathlib.Path) -> typing.Optional[dict]:
+    """Reads the artifact definitions of a plugin from its syntax tree. Returns
+    {"version": 1 or 2, "artifacts": [...]} ("artifacts" is empty if the module defines none), or None if
+    they are not plain literals and the module has to be imported to read them."""
+    source = py_file.read_bytes()
+    try:
+        tree = ast.parse(source, str(py_file))
+    except SyntaxError:
+        return None
+    assigned = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            if node.targets[0].id in ("__artifacts_v2__", "__artifacts__"):
+                assigned[node.targets[0].id] = node.value
+    if not assigned:
+        return None if b"__artifacts" in source else {"version": 2, "artifacts": []}
+
+    # same precedence as reading the attributes of the imported module in PluginLoader._load_plugins
+    version = 2 if "__artifacts_v2__" in assigned else 1
+    artifacts_node = assigned.get("__artifacts_v2__") or assigned.get("__artifacts__")
+    if not isinstance(artifacts_node, ast.Dict):
+        return None
+    if not artifacts_node.keys and len(assigned) > 1:
+        return None  # an empty __artifacts_v2__ next to __artifacts__, leave that to the import
+    artifacts = []
+    try:
+        for key_node, value_node in zip(artifacts_node.keys, artifacts_node.values):
+            if key_node is None:
+                return None  # ** unpacking
+            name = _literal(key_node)
+            if version == 2:
+                if not isinstance(value_node, ast.Dict) or None in value_node.keys:
+                    return None
+                fields = {_literal(key): value for key, value in zip(value_node.keys, value_node.values)}
+                artifact = {
+                    "category": _literal(fields["category"]) if "category" in fields else None,
+                    "search": _literal(fields["paths"]) if "paths" in fields else None,
+                    "function": _literal(fields["function"], True) if "function" in fields else None,
+                    "lazy_files": _literal(fields["lazy_files"]) if "lazy_files" in fields else False,
+                    "requires": list(_literal(fields["requires"])) if "requires" in fields else [],
+                }
+            else:
+                if not isinstance(value_node, ast.Tuple) or len(value_node.elts) != 3:
+                    return None
+                category, search, function = value_node.elts
+                artifact = {"category": _literal(category), "search": _literal(search),
+                            "function": _literal(function, True), "lazy_files": False, "requires": []}
+            if not isinstance(artifact["function"], str):
+                return None
+            artifact["name"] = name
+            artifacts.append(artifact)
+    except (ValueError, TypeError, SyntaxError):
+        return None
+    return {"version": version, "artifacts": artifacts}
 
 
 class PluginLoader:
@@ -32,23 +128,84 @@ class PluginLoader:
         loader.exec_module(mod)
         return mod
 
-    def _load_plugins(self):
+    @staticmethod
+    def load_module(path: pathlib.Path):
+        spec = importlib.util.spec_from_file_location(path.stem, path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        return mod
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._plugin_path / MANIFEST_NAME, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("manifest_version") == MANIFEST_VERSION:
+                return manifest["modules"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        return {}
+
+    def _write_manifest(self, modules: dict):
+        manifest_path = self._plugin_path / MANIFEST_NAME
+        temp_path = manifest_path.with_suffix(".tmp")
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"manifest_version": MANIFEST_VERSION, "modules": modules}, f, indent=1)
+            os.replace(temp_path, manifest_path)
+        except OSError:
+            pass  # read only install, the sources are scanned again next time
+
+    def _manifest_entries(self):
+        """Yields (py_file, entry) for every plugin source, entry being the manifest data of the module.
+        Entries for new or changed sources (by mtime and size) are rebuilt and the manifest file updated."""
+        modules = self._read_manifest()
+        updated = {}
+        changed = False
         for py_file in self._plugin_path.glob("*.py"):
-            mod = PluginLoader.load_module_lazy(py_file)
-            mod_artifacts = getattr(mod, '__artifacts_v2__', None) or getattr(mod, '__artifacts__', None)
-            if mod_artifacts is None:
-                continue  # no artifacts defined in this plugin
+            stat_result = py_file.stat()
+            entry = modules.get(py_file.name)
+            if entry is None or entry.get("mtime_ns") != stat_result.st_mtime_ns or entry.get("size") != stat_result.st_size:
+                entry = {"mtime_ns": stat_result.st_mtime_ns, "size": stat_result.st_size, "scan": _scan_plugin(py_file)}
+                changed = True
+            updated[py_file.name] = entry
+            yield py_file, entry
+        if changed or len(updated) != len(modules):
+            self._write_manifest(updated)
+
+    def _load_plugins(self):
+        for py_file, entry in self._manifest_entries():
+            scan = entry["scan"]
+            if scan is None:
+                # artifacts are not plain literals, the module has to be imported to read them
+                mod = PluginLoader.load_module_lazy(py_file)
+                mod_artifacts = getattr(mod, '__artifacts_v2__', None) or getattr(mod, '__artifacts__', None)
+                if mod_artifacts is None:
+                    continue  # no artifacts defined in this plugin
+
+                version = 2 if '__artifacts_v2__' in dir(mod) else 1  # determine the version
 
-            version = 2 if '__artifacts_v2__' in dir(mod) else 1  # determine the version
+                for name, artifact in mod_artifacts.items():
+                    category, search, func_name = (
+                    artifact.get('category'), artifact.get('paths'), artifact.get('function')) if version == 2 else artifact
+                    func = getattr(mod, func_name) if version == 2 and isinstance(func_name, str) else func_name
+                    lazy_files = artifact.get('lazy_files', False) if version == 2 else False
+                    requires = tuple(artifact.get('requires', ())) if version == 2 else ()
+                    self._add_plugin(PluginSpec(name, py_file.stem, category, search, func, lazy_files, requires))
+                continue
 
-            for name, artifact in mod_artifacts.items():
-                category, search, func_name = (
-                artifact.get('category'), artifact.get('paths'), artifact.get('function')) if version == 2 else artifact
-                func = getattr(mod, func_name) if version == 2 and isinstance(func_name, str) else func_name
-                if name in self._plugins:
-                    raise KeyError("Duplicate plugin")
-                self._plugins[name] = PluginSpec(name, py_file.stem, category, search, func)
+            for artifact in scan["artifacts"]:
+                search = artifact["search"]
+                if isinstance(search, list):
+                    search = tuple(search)
+                self._add_plugin(PluginSpec(
+                    artifact["name"], py_file.stem, artifact["category"], search,
+                    LazyPluginFunction(py_file, artifact["function"]), artifact["lazy_files"],
+                    tuple(artifact["requires"])))
 
+    def _add_plugin(self, plugin: PluginSpec):
+        if plugin.name in self._plugins:
+            raise KeyError("Duplicate plugin")
+        self._plugins[plugin.name] = plugin
 
     @property
     def plugins(self) -> typing.Iterable[PluginSpec]:
@@ -62,4 +219,3 @@ class PluginLoader:
 
     def __len__(self):
         return len(self._plugins)
-
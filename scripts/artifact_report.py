@@ -1,15 +1,24 @@
 import html
+import json
 import os
+import re
+from urllib.parse import quote
 from scripts.html_parts import *
 from scripts.ilapfuncs import is_platform_windows
+from scripts.report import register_report_page
 from scripts.version_info import ileapp_version
 
 class ArtifactHtmlReport:
+    max_inline_rows = 10000 # larger tables are written to paged data files instead of the html
+    rows_per_data_file = 20000
+    render_chunk_rows = 1000 # rows rendered (escaped) and written at a time
 
     def __init__(self, artifact_name, artifact_category=''):
         self.report_file = None
         self.report_file_path = ''
         self.script_code = ''
+        self.paged_table_code = ''
+        self.paged_table_count = 0
         self.artifact_name = artifact_name
         self.artifact_category = artifact_category # unused
 
@@ -19,11 +28,13 @@ class ArtifactHtmlReport:
 
     def start_artifact_report(self, report_folder, artifact_file_name, artifact_description=''):
         '''Creates the report HTML file and writes the artifact name as a heading'''
-        self.report_file = open(os.path.join(report_folder, f'{artifact_file_name}.temphtml'), 'w', encoding='utf8')
+        self.report_file_path = os.path.join(report_folder, f'{artifact_file_name}.temphtml')
+        self.report_file = open(self.report_file_path, 'w', encoding='utf8')
+        register_report_page(self.report_file_path)
         self.report_file.write(page_header.format(f'iLEAPP - {self.artifact_name} report'))
         self.report_file.write(body_start.format(f'iLEAPP {ileapp_version}'))
         self.report_file.write(body_sidebar_setup)
-        self.report_file.write(body_sidebar_dynamic_data_placeholder) # placeholder for sidebar data
+        self.report_file.write(body_sidebar_nav_script + nav_bar_script) # sidebar data, shared by all pages
         self.report_file.write(body_sidebar_trailer)
         self.report_file.write(body_main_header)
         self.report_file.write(body_main_data_title.format(f'{self.artifact_name} report', artifact_description))
@@ -56,7 +67,9 @@ class ArtifactHtmlReport:
             ----------
             data_headers   : List/Tuple of table column names
 
-            data_list      : List/Tuple of lists/tuples which contain rows of data
+            data_list      : List/Tuple (or any iterable, like a generator) of lists/tuples which contain rows of data.
+                             Tables of more than max_inline_rows rows are written to paged data files
+                             that are loaded by the browser, instead of to the html itself
 
             source_path    : Source path of data
 
@@ -79,7 +92,29 @@ class ArtifactHtmlReport:
         if (not self.report_file):
             raise ValueError('Output report file is closed/unavailable!')
 
-        num_entries = len(data_list)
+        inline_rows = [] # lists of cell texts
+        num_entries = 0
+        data_key = ''
+        for chunk in self._render_chunks(data_list, data_headers, html_escape, html_no_escape):
+            num_entries += len(chunk)
+            if not data_key:
+                room = self.max_inline_rows - len(inline_rows)
+                inline_rows.extend(chunk[:room])
+                chunk = chunk[room:]
+                if not chunk:
+                    continue
+                # too many rows for the html, the rest goes to data files
+                data_key = self._new_paged_table()
+                page, page_number = inline_rows, 0
+                inline_rows = []
+            page.extend(chunk)
+            while len(page) >= self.rows_per_data_file:
+                page_number += 1
+                self._write_data_file(data_key, page_number, page[:self.rows_per_data_file])
+                page = page[self.rows_per_data_file:]
+        if data_key and page:
+            self._write_data_file(data_key, page_number + 1, page)
+
         if write_total:
             self.write_minor_header(f'Total number of entries: {num_entries}', 'h6')
         if write_location:
@@ -94,27 +129,19 @@ class ArtifactHtmlReport:
         if table_responsive:
             self.report_file.write("<div class='table-responsive'>")
 
-        table_head = '<table id="{}" class="table table-striped table-bordered table-xsm" cellspacing="0" {}>' \
-                     '<thead>'.format(table_id, (f'style="{table_style}"') if table_style else '')
+        table_head = '<table id="{}" {}class="table table-striped table-bordered table-xsm" cellspacing="0" {}>' \
+                     '<thead>'.format(table_id, f'data-rows="{data_key}" ' if data_key else '',
+                                      (f'style="{table_style}"') if table_style else '')
         self.report_file.write(table_head)
         self.report_file.write(
             '<tr>' + ''.join(('<th class="th-sm">{}</th>'.format(html.escape(str(x))) for x in data_headers)) + '</tr>')
         self.report_file.write('</thead><tbody>')
 
-        if html_escape:
-            for row in data_list:
-                if html_no_escape:
-                    self.report_file.write('<tr>' + ''.join(('<td>{}</td>'.format(html.escape(
-                        str(x) if x not in [None, 'N/A'] else '')) if h not in html_no_escape else '<td>{}</td>'.format(
-                        str(x) if x not in [None, 'N/A'] else '') for x, h in zip(row, data_headers))) + '</tr>')
-                else:
-                    self.report_file.write('<tr>' + ''.join(
-                        ('<td>{}</td>'.format(html.escape(str(x) if x not in [None, 'N/A'] else '')) for x in
-                         row)) + '</tr>')
-        else:
-            for row in data_list:
-                self.report_file.write('<tr>' + ''.join( ('<td>{}</td>'.format(str(x) if x not in [None, 'N/A'] else '') for x in row) ) + '</tr>')
-        
+        for start in range(0, len(inline_rows), self.render_chunk_rows):
+            self.report_file.write(''.join(
+                '<tr><td>' + '</td><td>'.join(cells) + '</td></tr>' if cells else '<tr></tr>'
+                for cells in inline_rows[start:start + self.render_chunk_rows]))
+
         self.report_file.write('</tbody>')
         if cols_repeated_at_bottom:
             self.report_file.write('<tfoot><tr>' + ''.join(
@@ -123,6 +150,88 @@ class ArtifactHtmlReport:
         if table_responsive:
             self.report_file.write("</div>")
 
+    @classmethod
+    def _render_chunks(cls, data_list, data_headers, html_escape, html_no_escape):
+        '''Yields the rows of data_list in chunks of render_chunk_rows, each row as the sequence of its cell
+           texts (what goes between <td> and </td>). None and 'N/A' are shown as empty cells. With
+           html_no_escape, rows are cut to the number of headers and the listed columns are not escaped.'''
+        width = len(data_headers) if html_escape and html_no_escape else None
+        raw_columns = set(index for index, header in enumerate(data_headers) if header in html_no_escape) if width else set()
+        chunk = []
+        for row in data_list:
+            chunk.append(row if isinstance(row, (tuple, list)) else tuple(row))
+            if len(chunk) == cls.render_chunk_rows:
+                yield cls._render_chunk(chunk, width, html_escape, raw_columns)
+                chunk = []
+        if chunk:
+            yield cls._render_chunk(chunk, width, html_escape, raw_columns)
+
+    @classmethod
+    def _render_chunk(cls, chunk, width, html_escape, raw_columns):
+        '''Renders a chunk of rows column by column, when all of them have the same number of cells'''
+        row_width = len(chunk[0])
+        if len(set(map(len, chunk))) != 1:
+            return [cls._render_row(row, width, html_escape, raw_columns) for row in chunk]
+        if width is not None:
+            row_width = min(row_width, width)
+        if not row_width:
+            return [() for _ in chunk]
+        columns = []
+        for index, column in zip(range(row_width), zip(*chunk)):
+            if None in column or 'N/A' in column:
+                texts = ['' if x is None or x == 'N/A' else str(x) for x in column]
+            else:
+                texts = list(map(str, column))
+            if html_escape and index not in raw_columns:
+                texts = cls._escape_texts(texts)
+            columns.append(texts)
+        return list(zip(*columns))
+
+    @staticmethod
+    def _render_row(row, width, html_escape, raw_columns):
+        cells = ['' if x is None or x == 'N/A' else str(x) for x in row]
+        if width is not None:
+            del cells[width:]
+        if html_escape:
+            return [cell if index in raw_columns else html.escape(cell) for index, cell in enumerate(cells)]
+        return cells
+
+    @staticmethod
+    def _escape_texts(texts):
+        '''html escapes a column of texts with a single html.escape call. The texts are joined with an
+           ASCII separator (left alone by html.escape); if the data itself contains it, the texts are
+           escaped one by one.'''
+        joined = '\x1e'.join(texts)
+        escaped = html.escape(joined)
+        if len(escaped) == len(joined):
+            return texts # nothing to escape
+        escaped = escaped.split('\x1e')
+        if len(escaped) != len(texts):
+            return [html.escape(text) for text in texts]
+        return escaped
+
+    def _data_folder(self):
+        '''Folder of the data files, next to the report file'''
+        return self.report_file_path[:-len('.temphtml')] + '_data'
+
+    def _new_paged_table(self):
+        '''Sets up a table of this report that has its rows in data files, returns its key'''
+        self.paged_table_count += 1
+        data_key = re.sub(r'\W', '_', os.path.basename(self._data_folder())) + f'_{self.paged_table_count}'
+        os.makedirs(self._data_folder(), exist_ok=True)
+        self.paged_table_code += paged_table_script.format(data_key)
+        return data_key
+
+    def _write_data_file(self, data_key, page_number, page):
+        '''Writes a page of rows (lists of cell texts) to a data file, loaded by the report with a script tag'''
+        file_name = f'{data_key}_{page_number}.js'
+        with open(os.path.join(self._data_folder(), file_name), 'w', encoding='utf8') as f:
+            f.write(paged_table_data.format(data_key, json.dumps(page, check_circular=False)))
+        # report pages end up in the report base folder (see report.generate_report), next to the category folders
+        data_folder, data_folder_name = os.path.split(self._data_folder())
+        src = quote(f'{os.path.basename(data_folder)}/{data_folder_name}/{file_name}')
+        self.paged_table_code += f'    <script src="{src}" charset="utf-8"></script>\n'
+
     def add_section_heading(self, heading, size='h2'):
         heading = html.escape(heading)
         data = '<div class="d-flex justify-content-between flex-wrap flex-md-nowrap align-items-center pt-3 pb-2 mb-3 border-bottom">' \
@@ -145,7 +254,7 @@ class ArtifactHtmlReport:
 
     def end_artifact_report(self):
         if self.report_file:
-            self.report_file.write(body_main_trailer + body_end + self.script_code + page_footer)
+            self.report_file.write(body_main_trailer + body_end + self.paged_table_code + self.script_code + page_footer)
             self.report_file.close()
             self.report_file = None
 
@@ -1,29 +1,23 @@
-import biplist
 import pathlib
-import plistlib
-import sys
 
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, is_platform_windows
+from scripts.plists import open_plist
 
 
 def get_appGrouplisting(files_found, report_folder, seeker, wrap_text, timezone_offset):
     data_list = []       
     for file_found in files_found:
         file_found = str(file_found)
-        with open(file_found, "rb") as fp:
-            if sys.version_info >= (3, 9):
-                plist = plistlib.load(fp)
-            else:
-                plist = biplist.readPlist(fp)
-            bundleid = plist['MCMMetadataIdentifier']
+        plist = open_plist(file_found)
+        bundleid = plist['MCMMetadataIdentifier']
             
-            p = pathlib.Path(file_found)
-            appgroupid = p.parent.name
-            fileloc = str(p.parents[1])
-            typedir = str(p.parents[1].name)
+        p = pathlib.Path(file_found)
+        appgroupid = p.parent.name
+        fileloc = str(p.parents[1])
+        typedir = str(p.parents[1].name)
             
-            data_list.append((bundleid, typedir, appgroupid, fileloc))
+        data_list.append((bundleid, typedir, appgroupid, fileloc))
         
     if len(data_list) > 0:
         filelocdesc = 'Path column in the report'
@@ -1,27 +1,26 @@
 import datetime
 import os
-import plistlib
 
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, logdevinfo, tsv, is_platform_windows 
+from scripts.plists import load_plist
 
 def get_applelocationd(files_found, report_folder, seeker, wrap_text, timezone_offset):
     data_list = []
     file_found = str(files_found[0])
-    with open(file_found, "rb") as fp:
-        pl = plistlib.load(fp)
-        for key, val in pl.items():
+    pl = load_plist(file_found)
+    for key, val in pl.items():
             
-            if key == 'LocationServicesEnabledIn8.0':
-                data_list.append(('Location Services Enabled', val))
-                logdevinfo(f"<b>Location Services Enabled: </b>{val}")
+        if key == 'LocationServicesEnabledIn8.0':
+            data_list.append(('Location Services Enabled', val))
+            logdevinfo(f"<b>Location Services Enabled: </b>{val}")
             
-            elif key == 'LastSystemVersion':
-                data_list.append(('Last System Version', val))
-                logdevinfo(f"<b>Last System Version: </b>{val}")
+        elif key == 'LastSystemVersion':
+            data_list.append(('Last System Version', val))
+            logdevinfo(f"<b>Last System Version: </b>{val}")
                 
-            else:
-                data_list.append((key, val ))
+        else:
+            data_list.append((key, val ))
                 
     if len(data_list) > 0:
         report = ArtifactHtmlReport('Settings - com.apple.locationd.plist')
@@ -17,7 +17,6 @@ __artifacts_v2__ = {
 import os
 import json
 import re
-import plistlib
 import shutil
 import sqlite3
 import textwrap
@@ -26,6 +25,7 @@ from pathlib import Path
 from base64 import b64encode
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, timeline, open_sqlite_db_readonly, convert_ts_int_to_utc, convert_utc_human_to_timezone, media_to_html
+from scripts.plists import open_plist
 from scripts.filetype import image_match
 
 # format timestamp
@@ -649,15 +649,13 @@ def get_burner_cache(files_found, report_folder, seeker, wrap_text, timezone_off
     cache_files = []
     for file_foundm in files_found:
         if file_foundm.endswith('.com.apple.mobile_container_manager.metadata.plist'):
-            with open(file_foundm, 'rb') as f:
-                pl = plistlib.load(f)
-                if pl['MCMMetadataIdentifier'] == 'com.adhoclabs.burner':
-                    fulldir = (os.path.dirname(file_foundm))
-                    identifier = (os.path.basename(fulldir))
+            pl = open_plist(file_foundm)
+            if pl['MCMMetadataIdentifier'] == 'com.adhoclabs.burner':
+                fulldir = (os.path.dirname(file_foundm))
+                identifier = (os.path.basename(fulldir))
                     
-                    # fsCachedData
-                    cache_files = seeker.search(f'*/{identifier}/Library/Caches/com.adhoclabs.burner/fsCachedData/**')
-                f.close()
+                # fsCachedData
+                cache_files = seeker.search(f'*/{identifier}/Library/Caches/com.adhoclabs.burner/fsCachedData/**')
 
     for file_found in files_found:
         file_found = str(file_found)
@@ -5,8 +5,8 @@ import datetime
 import scripts.artifacts.artGlobals
 
 from packaging import version
-from scripts.artifact_report import ArtifactHtmlReport
-from scripts.ilapfuncs import logfunc, logdevinfo, kmlgen, timeline, tsv, is_platform_windows 
+from scripts.ilapfuncs import logfunc, logdevinfo, is_platform_windows
+from scripts.results_store import store_results
 
 
 def get_cacheRoutesGmap(files_found, report_folder, seeker, wrap_text, timezone_offset):
@@ -29,20 +29,10 @@ def get_cacheRoutesGmap(files_found, report_folder, seeker, wrap_text, timezone_
                 except:
                     pass    
             
-    if len(data_list) > 0:
-        description = 'Google Maps Cache Routes'
-        report = ArtifactHtmlReport('Locations')
-        report.start_artifact_report(report_folder, 'Google Maps Cache Routes', description)
-        report.add_script()
-        data_headers = ('Timestamp','Latitude','Longitude','Source File')
-        report.write_artifact_data_table(data_headers, data_list, file_found)
-        report.end_artifact_report()
-        
-        tsvname = 'Google Maps Cache Routes'
-        tsv(report_folder, data_headers, data_list, tsvname)
-    
-        kmlactivity = 'Google Maps Cache Routes'
-        kmlgen(report_folder, kmlactivity, data_list, data_headers)
+    data_headers = ('Timestamp','Latitude','Longitude','Source File')
+    store_results(report_folder, 'Locations', data_headers, data_list, file_found,
+                  report_file_name='Google Maps Cache Routes', description='Google Maps Cache Routes',
+                  tsvname='Google Maps Cache Routes', kmlactivity='Google Maps Cache Routes')
 
 __artifacts__ = {
     "cacheroutesgmap": (
@@ -1,9 +1,9 @@
 import os
-import plistlib
 import sqlite3
 
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, logdevinfo, tsv, is_platform_windows 
+from scripts.plists import load_plist
 
 def get_celWireless(files_found, report_folder, seeker, wrap_text, timezone_offset):
     data_list = []
@@ -13,8 +13,7 @@ def get_celWireless(files_found, report_folder, seeker, wrap_text, timezone_offs
             basename == "com.apple.commcenter.device_specific_nobackup.plist"
             or basename == "com.apple.commcenter.plist"
         ):
-            p = open(filepath, "rb")
-            plist = plistlib.load(p)
+            plist = load_plist(filepath)
             for key, val in plist.items():
                 data_list.append((key, val, filepath))
                 if key == "ReportedPhoneNumber":
@@ -1,30 +1,29 @@
 import datetime
 import os
-import plistlib
 
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, logdevinfo, tsv, is_platform_windows 
+from scripts.plists import load_plist
 
 def get_deviceDatam(files_found, report_folder, seeker, wrap_text, timezone_offset):
     
     data_list = []
     file_found = str(files_found[0])
-    with open(file_found, "rb") as fp:
-        pl = plistlib.load(fp)
-        for key, val in pl.items():
+    pl = load_plist(file_found)
+    for key, val in pl.items():
             
-            if key == 'imeis':
-                imeis = val
-                data_list.append(('IMEIs', imeis ))
-                logdevinfo(f"<b>IMEIs: </b>{imeis}")
+        if key == 'imeis':
+            imeis = val
+            data_list.append(('IMEIs', imeis ))
+            logdevinfo(f"<b>IMEIs: </b>{imeis}")
             
-            elif key == 'ReportedPhoneNumber':
-                reportedphonenum = val
-                data_list.append(('Reported Phone Number', val ))
-                logdevinfo(f"<b>Reported Phone Number: </b>{val}")
+        elif key == 'ReportedPhoneNumber':
+            reportedphonenum = val
+            data_list.append(('Reported Phone Number', val ))
+            logdevinfo(f"<b>Reported Phone Number: </b>{val}")
                 
-            else:
-                data_list.append((key, val ))
+        else:
+            data_list.append((key, val ))
                 
     report = ArtifactHtmlReport('Device Data')
     report.start_artifact_report(report_folder, 'Device Data')
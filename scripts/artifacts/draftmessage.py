@@ -42,7 +42,7 @@ def get_draftmessage(files_found, report_folder, seeker, wrap_text, timezone_off
         report.end_artifact_report()
         
         tsvname = f'Drafts - Native Messages'
-        tsv(report_folder, data_headers, data_list, tsvname) # TODO: _csv.Error: need to escape, but no escapechar set
+        tsv(report_folder, data_headers, data_list, tsvname)
         
         tlactivity = f'Drafts - Native Messages'
         timeline(report_folder, tlactivity, data_list, data_headers)
@@ -9,7 +9,8 @@ __artifacts_v2__ = {
         "category": "IOS Build",
         "notes": "",
         "paths": ('*LastBuildInfo.plist',),
-        "function": "get_lastBuild"
+        "function": "get_lastBuild",
+        "lazy_files": True
     }
 }
 
@@ -24,8 +25,8 @@ from scripts.ilapfuncs import logfunc, logdevinfo, tsv, is_platform_windows
 def get_lastBuild(files_found, report_folder, seeker, wrap_text, time_offset):
     versionnum = 0
     data_list = []
-    file_found = str(files_found[0])
-    with open(file_found, "rb") as fp:
+    file_found = files_found[0]
+    with file_found.open("rb") as fp:
         pl = plistlib.load(fp)
         for key, val in pl.items():
             data_list.append((key, val))
@@ -46,7 +47,7 @@ def get_lastBuild(files_found, report_folder, seeker, wrap_text, time_offset):
     report.start_artifact_report(report_folder, 'Build Information')
     report.add_script()
     data_headers = ('Key','Values' )     
-    report.write_artifact_data_table(data_headers, data_list, file_found)
+    report.write_artifact_data_table(data_headers, data_list, str(file_found))
     report.end_artifact_report()
     
     tsvname = 'Last Build'
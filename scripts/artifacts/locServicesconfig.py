@@ -1,8 +1,8 @@
 import os
-import plistlib
 import datetime
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, timeline, is_platform_windows, open_sqlite_db_readonly
+from scripts.plists import load_plist
 
 def convertcocoa(timevalue):
   if timevalue == '':
@@ -22,16 +22,13 @@ def get_locServicesconfig(files_found, report_folder, seeker, wrap_text, timezon
     
     for file_found in files_found:
       if file_found.endswith('clients.plist'):
-        with open(file_found,'rb') as f :
-          clientsplist = plistlib.load(f)
+        clientsplist = load_plist(file_found)
           
       if file_found.endswith('com.apple.locationd.plist'):
-        with open(file_found,'rb') as f :
-          locationdplist = plistlib.load(f)
+        locationdplist = load_plist(file_found)
           
       if file_found.endswith('com.apple.routined.plist'):
-        with open(file_found,'rb') as f :
-          routinedplist = plistlib.load(f)
+        routinedplist = load_plist(file_found)
           
           
     for key, value in clientsplist.items():
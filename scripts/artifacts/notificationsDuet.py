@@ -153,7 +153,7 @@ def get_notificationsDuet(files_found, report_folder, seeker, wrap_text, timezon
                 report.end_artifact_report()
                 
                 tsvname = f'Notifications Duet SEGB v2 - {filename}'
-                tsv(report_folder, data_headers, data_list, tsvname) # TODO: _csv.Error: need to escape, but no escapechar set
+                tsv(report_folder, data_headers, data_list, tsvname)
             else:
                 logfunc(f'No data available for Notifications Duet SEGB v2 on {filename}')
                 
@@ -421,7 +421,7 @@ def get_notificationsDuet(files_found, report_folder, seeker, wrap_text, timezon
                 report.end_artifact_report()
                 
                 tsvname = f'Notifications Duet - {filename}'
-                tsv(report_folder, data_headers, data_list, tsvname) # TODO: _csv.Error: need to escape, but no escapechar set
+                tsv(report_folder, data_headers, data_list, tsvname)
             else:
                 logfunc(f'No data available for Notifications Duet')
     
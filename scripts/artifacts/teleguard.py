@@ -1,23 +1,22 @@
 import sqlite3
 import json
-import plistlib
 import os
 import base64
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, timeline, open_sqlite_db_readonly, media_to_html
+from scripts.plists import open_plist
 
 def get_teleguard(files_found, report_folder, seeker, wrap_text, time_offset):
     
     #datos =  seeker.search('**/*com.apple.mobile_container_manager.metadata.plist')
     for file_foundm in files_found:
         if file_foundm.endswith('.com.apple.mobile_container_manager.metadata.plist'):
-            with open(file_foundm, 'rb') as f:
-                pl = plistlib.load(f)
-                if pl['MCMMetadataIdentifier'] == 'ch.swisscows.messenger.teleguardapp':
-                    fulldir = (os.path.dirname(file_foundm))
-                    identifier = (os.path.basename(fulldir))
-                    mediafilepaths = seeker.search(f'*/{identifier}/Library/Caches/images/**')
-                    break
+            pl = open_plist(file_foundm)
+            if pl['MCMMetadataIdentifier'] == 'ch.swisscows.messenger.teleguardapp':
+                fulldir = (os.path.dirname(file_foundm))
+                identifier = (os.path.basename(fulldir))
+                mediafilepaths = seeker.search(f'*/{identifier}/Library/Caches/images/**')
+                break
                     
     for file_found in files_found:
         if file_found.endswith('teleguard_database.db'):
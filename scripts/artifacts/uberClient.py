@@ -27,6 +27,7 @@ from pathlib import Path
 from scripts import ccl_leveldb
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, timeline, open_sqlite_db_readonly, convert_ts_int_to_utc, convert_utc_human_to_timezone
+from scripts.plists import open_plist
 
 # format timestamp
 def FormatTimestamp(utc, timezone_offset, divisor=1.0):
@@ -549,39 +550,37 @@ def get_locations(ldb_path, report_folder, timezone_offset):
     data_list = []
 
     leveldb_records = ccl_leveldb.RawLevelDb(ldb_path)
-    for record in leveldb_records.iterate_records_raw():
-        # key "UBLocationNode.__DEFAULT_INDEX"
-        if record.user_key.decode() == 'UBLocationNode.__DEFAULT_INDEX':
-            # location
-            try:
-                plist = load_plist_from_string(record.value)
-            except Exception:
-                pass
-            else:
-                if bool(plist.get('_sample')):
-                    sample_location = plist['_sample']['_location']
-                    if bool(sample_location):                        
-                        # timestamp
-                        timestamp_real = sample_location['kCLLocationCodingKeyTimestamp'] + 978307200.0
-                        timestamp = FormatTimestamp(timestamp_real, timezone_offset)
-                        # latitude
-                        latitude = sample_location['kCLLocationCodingKeyCoordinateLatitude']
-                        # longitude
-                        longitude = sample_location['kCLLocationCodingKeyCoordinateLongitude']
-                        # horizontal accuracy
-                        horz_accuracy = sample_location['kCLLocationCodingKeyHorizontalAccuracy']
-                        # altitude
-                        altitude = sample_location['kCLLocationCodingKeyAltitude']
-                        # vertical accuracy
-                        vert_accuracy = sample_location['kCLLocationCodingKeyVerticalAccuracy']
-                        # course
-                        course = sample_location['kCLLocationCodingKeyCourse']
-                        # speed
-                        speed = sample_location['kCLLocationCodingKeySpeed']
-                        # location
-                        location = f'{str(Path(record.origin_file).name)} (seq no: {hex(record.seq)})'
+    for record in leveldb_records.find_records(b'UBLocationNode.__DEFAULT_INDEX'):
+        # location
+        try:
+            plist = load_plist_from_string(record.value)
+        except Exception:
+            pass
+        else:
+            if bool(plist.get('_sample')):
+                sample_location = plist['_sample']['_location']
+                if bool(sample_location):                        
+                    # timestamp
+                    timestamp_real = sample_location['kCLLocationCodingKeyTimestamp'] + 978307200.0
+                    timestamp = FormatTimestamp(timestamp_real, timezone_offset)
+                    # latitude
+                    latitude = sample_location['kCLLocationCodingKeyCoordinateLatitude']
+                    # longitude
+                    longitude = sample_location['kCLLocationCodingKeyCoordinateLongitude']
+                    # horizontal accuracy
+                    horz_accuracy = sample_location['kCLLocationCodingKeyHorizontalAccuracy']
+                    # altitude
+                    altitude = sample_location['kCLLocationCodingKeyAltitude']
+                    # vertical accuracy
+                    vert_accuracy = sample_location['kCLLocationCodingKeyVerticalAccuracy']
+                    # course
+                    course = sample_location['kCLLocationCodingKeyCourse']
+                    # speed
+                    speed = sample_location['kCLLocationCodingKeySpeed']
+                    # location
+                    location = f'{str(Path(record.origin_file).name)} (seq no: {hex(record.seq)})'
 
-                        data_list.append((timestamp, latitude, longitude, horz_accuracy, altitude, vert_accuracy, course, speed, record.state.name, location))
+                    data_list.append((timestamp, latitude, longitude, horz_accuracy, altitude, vert_accuracy, course, speed, record.state.name, location))
 
     # locations
     if len(data_list) > 0:
@@ -636,13 +635,11 @@ def get_uber_client(files_found, report_folder, seeker, wrap_text, timezone_offs
 
     for file_found in files_found:
         if file_found.endswith('.com.apple.mobile_container_manager.metadata.plist'):
-            with open(file_found, 'rb') as f:
-                pl = plistlib.load(f)
-                if pl['MCMMetadataIdentifier'] == 'com.ubercab.UberClient':
-                    fulldir = (os.path.dirname(file_found))
-                    identifier = (os.path.basename(fulldir))
-                    break
-                f.close()
+            pl = open_plist(file_found)
+            if pl['MCMMetadataIdentifier'] == 'com.ubercab.UberClient':
+                fulldir = (os.path.dirname(file_found))
+                identifier = (os.path.basename(fulldir))
+                break
 
     if bool(identifier):
         # */Library/Application Support/PersistentStorage/BootstrapStore/RealtimeRider.StreamModelKey/**
@@ -17,7 +17,6 @@ __artifacts_v2__ = {
 
 import os
 import re
-import plistlib
 import pathlib
 import shutil
 import sqlite3
@@ -26,6 +25,7 @@ import datetime
 
 from scripts.artifact_report import ArtifactHtmlReport
 from scripts.ilapfuncs import logfunc, tsv, timeline, kmlgen, open_sqlite_db_readonly, convert_ts_int_to_utc, convert_utc_human_to_timezone
+from scripts.plists import open_plist
 
 # format location
 def FormatLocation(location, value, tableName, key):
@@ -565,33 +565,32 @@ def get_waze(files_found, report_folder, seeker, wrap_text, timezone_offset):
     #datos =  seeker.search('**/*com.apple.mobile_container_manager.metadata.plist')
     for file_foundm in files_found:
         if file_foundm.endswith('.com.apple.mobile_container_manager.metadata.plist'):
-            with open(file_foundm, 'rb') as f:
-                pl = plistlib.load(f)
-                if pl['MCMMetadataIdentifier'] == 'com.waze.iphone':
-                    fulldir = (os.path.dirname(file_foundm))
-                    identifier = (os.path.basename(fulldir))
+            pl = open_plist(file_foundm)
+            if pl['MCMMetadataIdentifier'] == 'com.waze.iphone':
+                fulldir = (os.path.dirname(file_foundm))
+                identifier = (os.path.basename(fulldir))
                     
-                    # user
-                    path_list = seeker.search(f'*/{identifier}/Documents/user', True)
-                    if len(path_list) > 0:
-                        get_account(path_list[0], report_folder, timezone_offset)
-
-                    # session
-                    path_list = seeker.search(f'*/{identifier}/Documents/session', True)
-                    if len(path_list) > 0:
-                        get_session(path_list[0], report_folder, timezone_offset)
-
-                    # tts.db
-                    path_list = seeker.search(f'*/{identifier}/Library/Caches/tts/tts.db', True)
-                    if len(path_list) > 0:
-                        get_tts(path_list[0], report_folder, timezone_offset)
-
-                    # spdlog.*logdata
-                    path_list = seeker.search(f'*/{identifier}/Documents/spdlog.*logdata')
-                    if len(path_list) > 0:
-                        get_gps_quality(path_list, report_folder, timezone_offset)
-
-                    break
+                # user
+                path_list = seeker.search(f'*/{identifier}/Documents/user', True)
+                if len(path_list) > 0:
+                    get_account(path_list[0], report_folder, timezone_offset)
+
+                # session
+                path_list = seeker.search(f'*/{identifier}/Documents/session', True)
+                if len(path_list) > 0:
+                    get_session(path_list[0], report_folder, timezone_offset)
+
+                # tts.db
+                path_list = seeker.search(f'*/{identifier}/Library/Caches/tts/tts.db', True)
+                if len(path_list) > 0:
+                    get_tts(path_list[0], report_folder, timezone_offset)
+
+                # spdlog.*logdata
+                path_list = seeker.search(f'*/{identifier}/Documents/spdlog.*logdata')
+                if len(path_list) > 0:
+                    get_gps_quality(path_list, report_folder, timezone_offset)
+
+                break
 
     for file_found in files_found:
         # user.db
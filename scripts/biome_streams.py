@@ -0,0 +1,199 @@
+'''Biome streams (Library/Biome/streams/<public|restricted>/<stream>/local/<segment file>), read the
+   same way for all the biome* artifacts. A stream artifact is a BiomeStream, which only says how
+   the decoded protobuf of a record becomes a row:
+
+       backlight_stream = BiomeStream('Biome Backlight Public', ('Timestamp', 'State'), backlight_row, backlight_typedef)
+
+       def get_biomeBacklight(files_found, report_folder, seeker, wrap_text, timezone_offset):
+           backlight_stream.write_reports(files_found, report_folder, timezone_offset)
+
+   Segment files are SEGB v1 or v2 files, read once through a memory map. The written records are
+   decoded with the compiled decoder of the stream typedef (see protobuf_decoders), only decoding
+   the field paths the stream lists in fields when it does, and their rows stored in batches in
+   the results database (see results_store), which writes one html report, TSV and timeline per
+   segment file.
+'''
+import mmap
+import os
+import struct
+
+from collections import namedtuple
+from datetime import timezone
+
+from scripts.ccl import ccl_segb1
+from scripts.ccl import ccl_segb2
+from scripts.ilapfuncs import logfunc
+from scripts.protobuf_decoders import compile_typedef
+from scripts.results_store import store_results
+
+# offset of the data in the file, offset of the v2 trailer entry ('' for v1), 'Written', 'Deleted' or
+# 'Unknown', the UTC record times (v2 records have one) and the protobuf data of the record
+SegbRecord = namedtuple('SegbRecord', ('offset', 'metadata_offset', 'state', 'timestamp1', 'timestamp2', 'data'))
+
+V2_RECORD_HEADER_LENGTH = 8 # crc and unknown int ahead of the protobuf data of a v2 record
+
+
+def utf8_in_extended_ascii(input_string, *, raise_on_unexpected=False):
+    """Returns a tuple of bool (whether mis-encoded utf-8 is present) and str (the converted string)"""
+    output = []  # individual characters, join at the end
+    is_in_multibyte = False  # True if we're currently inside a utf-8 multibyte character
+    multibytes_expected = 0
+    multibyte_buffer = []
+    mis_encoded_utf8_present = False
+
+    def handle_bad_data(index, character):
+        if not raise_on_unexpected: # not raising, so we dump the buffer into output and append this character
+            output.extend(multibyte_buffer)
+            multibyte_buffer.clear()
+            output.append(character)
+            nonlocal is_in_multibyte
+            is_in_multibyte = False
+            nonlocal multibytes_expected
+            multibytes_expected = 0
+        else:
+            raise ValueError(f"Expected multibyte continuation at index: {index}")
+
+    for idx, c in enumerate(input_string):
+        code_point = ord(c)
+        if code_point <= 0x7f or code_point > 0xf4:  # ASCII Range data or higher than you get for mis-encoded utf-8:
+            if not is_in_multibyte:
+                output.append(c)  # not in a multibyte, valid ascii-range data, so we append
+            else:
+                handle_bad_data(idx, c)
+        else:  # potentially utf-8
+            if (code_point & 0xc0) == 0x80:  # continuation byte
+                if is_in_multibyte:
+                    multibyte_buffer.append(c)
+                else:
+                    handle_bad_data(idx, c)
+            else:  # start-byte
+                if not is_in_multibyte:
+                    assert multibytes_expected == 0
+                    assert len(multibyte_buffer) == 0
+                    while (code_point & 0x80) != 0:
+                        multibytes_expected += 1
+                        code_point <<= 1
+                    multibyte_buffer.append(c)
+                    is_in_multibyte = True
+                else:
+                    handle_bad_data(idx, c)
+
+        if is_in_multibyte and len(multibyte_buffer) == multibytes_expected:  # output utf-8 character if complete
+            utf_8_character = bytes(ord(x) for x in multibyte_buffer).decode("utf-8")
+            output.append(utf_8_character)
+            multibyte_buffer.clear()
+            is_in_multibyte = False
+            multibytes_expected = 0
+            mis_encoded_utf8_present = True
+
+    if multibyte_buffer:  # if we have left-over data
+        handle_bad_data(len(input_string), "")
+
+    return mis_encoded_utf8_present, "".join(output)
+
+
+def segment_files(files_found):
+    '''Yields (path, file name) of the stream segment files in files_found, leaving out hidden
+       files, folders and tombstones'''
+    for file_found in files_found:
+        file_found = str(file_found)
+        filename = os.path.basename(file_found)
+        if filename.startswith('.') or not os.path.isfile(file_found) or 'tombstone' in file_found:
+            continue
+        yield file_found, filename
+
+
+def _state_name(raw_state):
+    try:
+        return ccl_segb2.EntryState(raw_state).name
+    except ValueError:
+        return 'Unknown'
+
+
+def read_segb_file(path, deleted=True):
+    '''Yields a SegbRecord for every record of a SEGB v1 or v2 file, in file order, or only for the
+       written ones when deleted is False. A v1 record is taken as deleted when its data was zeroed.
+       The file is memory mapped and the record states are read ahead of any record data, so the
+       data of records left out is never copied.'''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    columns = None
+    try:
+        if mapped[:4] == ccl_segb2.MAGIC:
+            columns = ccl_segb2.read_segb2_columns(mapped)
+            for index, raw_state in enumerate(columns.states):
+                if not deleted and raw_state != ccl_segb2.EntryState.Written:
+                    continue
+                start = columns.data_start_offsets[index]
+                yield SegbRecord(start, columns.metadata_offsets[index], _state_name(raw_state),
+                                 ccl_segb2.decode_cocoa_time(columns.timestamps[index]).replace(tzinfo=timezone.utc), '',
+                                 mapped[start + V2_RECORD_HEADER_LENGTH:columns.data_end_offsets[index]])
+        else:
+            columns = ccl_segb1.read_segb1_columns(mapped)
+            for index, start in enumerate(columns.data_start_offsets):
+                end = columns.data_end_offsets[index]
+                state = 'Written' if end > start and mapped[start] != 0 else 'Deleted'
+                if not deleted and state != 'Written':
+                    continue
+                yield SegbRecord(start, '', state,
+                                 ccl_segb1.decode_cocoa_time(columns.timestamps1[index]).replace(tzinfo=timezone.utc),
+                                 ccl_segb1.decode_cocoa_time(columns.timestamps2[index]).replace(tzinfo=timezone.utc),
+                                 mapped[start:end])
+    finally:
+        if columns is not None:
+            columns.release()
+        mapped.close()
+
+
+class BiomeStream:
+    '''The artifact of a Biome stream. row(protostuff, record, timezone_offset) returns the row of a
+       written record (None leaves the record out), protostuff being its protobuf decoded with
+       typedef (decoded without one when typedef is None), holding only the field paths in fields
+       when they are given. With keep_deleted, row is also called for the other records, with
+       protostuff None.'''
+    def __init__(self, name, data_headers, row, typedef=None, description='', html_no_escape=(), keep_deleted=False,
+                 fields=None):
+        self.name = name
+        self.data_headers = data_headers
+        self.row = row
+        self.typedef = typedef
+        self.description = description
+        self.html_no_escape = html_no_escape
+        self.keep_deleted = keep_deleted
+        self.fields = fields
+        self._decoder = None
+
+    def decode(self, data):
+        if self._decoder is None:
+            self._decoder = compile_typedef(self.typedef, self.fields)
+        return self._decoder(data)
+
+    def records(self, path):
+        '''Yields (record, protostuff) for the records of a segment file, the written ones decoded'''
+        try:
+            for record in read_segb_file(path, deleted=self.keep_deleted):
+                if record.state == 'Written':
+                    yield record, self.decode(record.data)
+                elif self.keep_deleted:
+                    yield record, None
+        except (OSError, ValueError, struct.error) as ex:
+            logfunc(f'Error reading {self.name} segment file {path}: {ex}')
+
+    def rows(self, path, timezone_offset):
+        for record, protostuff in self.records(path):
+            row = self.row(protostuff, record, timezone_offset)
+            if row is not None:
+                yield row
+
+    def write_reports(self, files_found, report_folder, timezone_offset):
+        '''Writes a report, TSV and timeline named '{name} - {segment file name}' for each segment
+           file with data'''
+        for file_found, filename in segment_files(files_found):
+            report_name = f'{self.name} - {filename}'
+            row_count = store_results(report_folder, self.name, self.data_headers, self.rows(file_found, timezone_offset),
+                                      file_found, report_file_name=report_name, description=self.description,
+                                      tsvname=report_name, tlactivity=report_name, html_no_escape=self.html_no_escape)
+            if not row_count:
+                logfunc(f'No data available for {self.name}')
@@ -1,5 +1,8 @@
 from __future__ import annotations
+import array
+import contextlib
 import datetime
+import mmap
 import struct
 import typing
 import dataclasses
@@ -28,7 +31,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-__version__ = "0.2"
+__version__ = "0.3"
 __description__ = "A python module to read SEGB v1 files found on iOS, macOS etc."
 __contact__ = "Alex Caithness"
 
@@ -36,6 +39,7 @@ MAGIC = b"SEGB"
 HEADER_LENGTH = 56
 RECORD_HEADER_LENGTH = 32
 ALIGNMENT_BYTES_LENGTH = 8
+RECORD_HEADER_FORMAT = struct.Struct("<i4xdd")
 COCOA_EPOCH = datetime.datetime(2001, 1, 1, 0, 0, 0)
 
 
@@ -156,15 +160,125 @@ def read_segb1_stream(stream: typing.BinaryIO) -> typing.Iterable[Segb1Entry]:
             stream.seek(ALIGNMENT_BYTES_LENGTH - remainder, os.SEEK_CUR)
 
 
+class Segb1Columns:
+    """
+    The records of SEGB v1 data held in a buffer, as columns in the order the records are stored. The columns are read
+    from the record headers alone, so records can be selected by timestamp before any record data is touched.
+
+    data_start_offsets, data_end_offsets: the extent of each record's data in the buffer
+    timestamps1, timestamps2: each record's raw Cocoa timestamps (see decode_cocoa_time)
+    """
+    def __init__(self, buffer, data_start_offsets: array.array, data_end_offsets: array.array,
+                 timestamps1: array.array, timestamps2: array.array):
+        self._view = memoryview(buffer)
+        self.data_start_offsets = data_start_offsets
+        self.data_end_offsets = data_end_offsets
+        self.timestamps1 = timestamps1
+        self.timestamps2 = timestamps2
+
+    def __len__(self):
+        return len(self.data_start_offsets)
+
+    def data(self, index: int) -> memoryview:
+        """
+        Returns the data of a record as a view into the buffer, without copying it. The view is only valid while the
+        buffer is.
+
+        :param index: the index of the record
+        :return: a memoryview of the record's data
+        """
+        return self._view[self.data_start_offsets[index]:self.data_end_offsets[index]]
+
+    def entries(self) -> typing.Iterable[Segb1Entry]:
+        """
+        Yields a Segb1Entry (holding a copy of the record data) for each record
+        """
+        view = self._view
+        for start, end, timestamp1, timestamp2 in zip(
+                self.data_start_offsets, self.data_end_offsets, self.timestamps1, self.timestamps2):
+            yield Segb1Entry(decode_cocoa_time(timestamp1), decode_cocoa_time(timestamp2), start, view[start:end].tobytes())
+
+    def release(self):
+        """
+        Releases the view of the buffer; views returned by data() must be released as well before an mmap buffer can be
+        closed
+        """
+        self._view.release()
+
+
+def read_segb1_columns(buffer) -> Segb1Columns:
+    """
+    Reads the record headers of SEGB v1 data into a Segb1Columns object
+
+    :param buffer: an object supporting the buffer protocol (bytes, mmap.mmap...) holding the SEGB data from its start
+    :return: a Segb1Columns object for the records
+    """
+    data_start_offsets = array.array("q")
+    data_end_offsets = array.array("q")
+    timestamps1 = array.array("d")
+    timestamps2 = array.array("d")
+
+    view = memoryview(buffer)
+    try:
+        if len(view) < HEADER_LENGTH or view[HEADER_LENGTH - 4:HEADER_LENGTH] != MAGIC:
+            raise ValueError(f"Unexpected file magic. Expected: {MAGIC.hex()}; got: {view[HEADER_LENGTH - 4:HEADER_LENGTH].hex()}")
+
+        end_of_data_offset, = struct.unpack_from("<I", view)
+        buffer_length = len(view)
+        offset = HEADER_LENGTH
+        while offset < end_of_data_offset:
+            record_length, timestamp1_raw, timestamp2_raw = RECORD_HEADER_FORMAT.unpack_from(view, offset)
+            offset += RECORD_HEADER_LENGTH
+            # a negative length reads to the end of the data, as a stream read would
+            end_offset = buffer_length if record_length < 0 else min(offset + record_length, buffer_length)
+
+            data_start_offsets.append(offset)
+            data_end_offsets.append(end_offset)
+            timestamps1.append(timestamp1_raw)
+            timestamps2.append(timestamp2_raw)
+
+            # align to 8 bytes
+            offset = end_offset + (-end_offset % ALIGNMENT_BYTES_LENGTH)
+    finally:
+        view.release()
+
+    return Segb1Columns(buffer, data_start_offsets, data_end_offsets, timestamps1, timestamps2)
+
+
+@contextlib.contextmanager
+def map_segb1_file(path: pathlib.Path | os.PathLike | str) -> typing.Iterator[Segb1Columns]:
+    """
+    Maps a SEGB v1 file into memory and gives a Segb1Columns object for its records. Views of record data are only
+    valid inside the with block.
+
+    :param path: the path of the file to be mapped
+    :return: a context manager giving a Segb1Columns object
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty file: {path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    columns = None
+    try:
+        columns = read_segb1_columns(mapped)
+        yield columns
+    finally:
+        if columns is not None:
+            columns.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # record views are still referenced, the map is closed once they are garbage collected
+
+
 def read_segb1_file(path: pathlib.Path | os.PathLike | str) -> typing.Iterable[Segb1Entry]:
     """
-    Reads SEGB v1 data from a file and yields an iterable of Segb1Entry objects
+    Reads SEGB v1 data from a file (through a memory map) and yields an iterable of Segb1Entry objects
     :param path: the path of the file to be opened
     :return: an iterable of Segb1Entry objects
     """
-    path = pathlib.Path(path)
-    with path.open("rb") as f:
-        yield from read_segb1_stream(f)
+    with map_segb1_file(path) as columns:
+        yield from columns.entries()
 
 
 if __name__ == '__main__':
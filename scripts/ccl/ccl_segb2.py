@@ -25,6 +25,9 @@ SOFTWARE.
 # Thank you for posting the research!
 
 from __future__ import annotations
+import array
+import contextlib
+import mmap
 import os
 import pathlib
 import struct
@@ -33,12 +36,13 @@ import dataclasses
 import typing
 import datetime
 
-__version__ = "0.3"
+__version__ = "0.4"
 __description__ = "A python module to read SEGB v2 files found on iOS, macOS etc."
 __contact__ = "Alex Caithness"
 
 HEADER_LENGTH = 32
 TRAILER_ENTRY_LENGTH = 16
+TRAILER_ENTRY_FORMAT = "<2id"
 MAGIC = b"SEGB"
 COCOA_EPOCH = datetime.datetime(2001, 1, 1, 0, 0, 0)
 
@@ -144,6 +148,121 @@ def file_matches_segbv2_signature(path: pathlib.Path | os.PathLike | str) -> boo
         return stream_matches_segbv2_signature(f)
 
 
+class Segb2Columns:
+    """
+    The records of SEGB v2 data held in a buffer, as columns in the order the records are stored. The columns are read
+    from the trailer alone, so records can be selected by state or timestamp before any record data is touched.
+
+    data_start_offsets, data_end_offsets: the extent of each record's data in the buffer
+    metadata_offsets: the offset of each record's trailer entry
+    states: each record's raw state (see EntryState)
+    timestamps: each record's raw Cocoa timestamp (see decode_cocoa_time)
+    """
+    def __init__(self, buffer, data_start_offsets: array.array, data_end_offsets: array.array,
+                 metadata_offsets: array.array, states: array.array, timestamps: array.array):
+        self._view = memoryview(buffer)
+        self.data_start_offsets = data_start_offsets
+        self.data_end_offsets = data_end_offsets
+        self.metadata_offsets = metadata_offsets
+        self.states = states
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.states)
+
+    def data(self, index: int) -> memoryview:
+        """
+        Returns the data of a record as a view into the buffer, without copying it. The view is only valid while the
+        buffer is.
+
+        :param index: the index of the record
+        :return: a memoryview of the record's data
+        """
+        return self._view[self.data_start_offsets[index]:self.data_end_offsets[index]]
+
+    def entries(self) -> typing.Iterable[Segb2Entry]:
+        """
+        Yields a Segb2Entry (holding a copy of the record data) for each record
+        """
+        view = self._view
+        for start, end, metadata_offset, state, timestamp in zip(
+                self.data_start_offsets, self.data_end_offsets, self.metadata_offsets, self.states, self.timestamps):
+            metadata = EntryMetadata(metadata_offset, end - HEADER_LENGTH, EntryState(state), decode_cocoa_time(timestamp))
+            yield Segb2Entry(metadata, start, view[start:end].tobytes())
+
+    def release(self):
+        """
+        Releases the view of the buffer; views returned by data() must be released as well before an mmap buffer can be
+        closed
+        """
+        self._view.release()
+
+
+def read_segb2_columns(buffer) -> Segb2Columns:
+    """
+    Reads the trailer of SEGB v2 data into a Segb2Columns object
+
+    :param buffer: an object supporting the buffer protocol (bytes, mmap.mmap...) holding the SEGB data from its start
+    :return: a Segb2Columns object for the records
+    """
+    view = memoryview(buffer)
+    try:
+        if len(view) < HEADER_LENGTH:
+            raise ValueError(f"Data too short for a SEGB v2 header: {len(view)} bytes")
+        magic_number, entries_count, creation_timestamp_raw, unknown_padding = struct.unpack_from("<4sid16s", view)
+        if magic_number != MAGIC:
+            raise ValueError(f"Unexpected file magic. Expected: {MAGIC.hex()}; got: {magic_number.hex()}")
+
+        trailer_offset = len(view) - TRAILER_ENTRY_LENGTH * entries_count
+        if entries_count < 0 or trailer_offset < HEADER_LENGTH:
+            raise ValueError(f"Trailer of {entries_count} entries does not fit in {len(view)} bytes")
+
+        # records are stored in the order of their end offset (relative to the start of entry area)
+        trailer = sorted(
+            (end_offset, metadata_offset, state, timestamp)
+            for metadata_offset, (end_offset, state, timestamp) in zip(
+                range(trailer_offset, len(view), TRAILER_ENTRY_LENGTH),
+                struct.iter_unpack(TRAILER_ENTRY_FORMAT, view[trailer_offset:])))
+    finally:
+        view.release()
+
+    end_offsets, metadata_offsets, states, timestamps = zip(*trailer) if trailer else ((), (), (), ())
+    data_end_offsets = array.array("q", (HEADER_LENGTH + end_offset for end_offset in end_offsets))
+    # each record starts at the end of the previous one, aligned to 4 bytes
+    data_start_offsets = array.array("q", [HEADER_LENGTH])
+    data_start_offsets.extend(HEADER_LENGTH + end_offset + (-end_offset % 4) for end_offset in end_offsets[:-1])
+    del data_start_offsets[len(end_offsets):]
+
+    return Segb2Columns(buffer, data_start_offsets, data_end_offsets, array.array("q", metadata_offsets),
+                        array.array("i", states), array.array("d", timestamps))
+
+
+@contextlib.contextmanager
+def map_segb2_file(path: pathlib.Path | os.PathLike | str) -> typing.Iterator[Segb2Columns]:
+    """
+    Maps a SEGB v2 file into memory and gives a Segb2Columns object for its records. Views of record data are only
+    valid inside the with block.
+
+    :param path: the path of the file to be mapped
+    :return: a context manager giving a Segb2Columns object
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty file: {path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    columns = None
+    try:
+        columns = read_segb2_columns(mapped)
+        yield columns
+    finally:
+        if columns is not None:
+            columns.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # record views are still referenced, the map is closed once they are garbage collected
+
+
 def read_segb2_stream(stream: typing.BinaryIO) -> typing.Iterable[Segb2Entry]:
     """
     Reads SEGB v2 data from a stream and yields an iterable of Segb2Entry objects
@@ -162,14 +281,15 @@ def read_segb2_stream(stream: typing.BinaryIO) -> typing.Iterable[Segb2Entry]:
     # To read the trailer we can just calculate its size and seek from end:
     trailer_reverse_offset = TRAILER_ENTRY_LENGTH * entries_count
     stream.seek(-trailer_reverse_offset, os.SEEK_END)
+    trailer_offset = stream.tell()
+    trailer_raw = stream.read(trailer_reverse_offset)
 
-    for _ in range(entries_count):
-        meta_offset = stream.tell()
-        trailer_entry_raw = stream.read(TRAILER_ENTRY_LENGTH)
-        entry_end_offset, entry_state_raw, entry_timestamp_raw = struct.unpack("<2id", trailer_entry_raw)
+    for index, (entry_end_offset, entry_state_raw, entry_timestamp_raw) in enumerate(
+            struct.iter_unpack(TRAILER_ENTRY_FORMAT, trailer_raw)):
         trailer_list.append(
             EntryMetadata(
-                meta_offset, entry_end_offset, EntryState(entry_state_raw), decode_cocoa_time(entry_timestamp_raw)))
+                trailer_offset + index * TRAILER_ENTRY_LENGTH, entry_end_offset, EntryState(entry_state_raw),
+                decode_cocoa_time(entry_timestamp_raw)))
 
     # To read the records, in order, get to the end of the header:
     stream.seek(HEADER_LENGTH, os.SEEK_SET)
@@ -193,13 +313,12 @@ def read_segb2_stream(stream: typing.BinaryIO) -> typing.Iterable[Segb2Entry]:
 
 def read_segb2_file(path: pathlib.Path | os.PathLike | str) -> typing.Iterable[Segb2Entry]:
     """
-    Reads SEGB v2 data from a file and yields an iterable of Segb2Entry objects
+    Reads SEGB v2 data from a file (through a memory map) and yields an iterable of Segb2Entry objects
     :param path: the path of the file to be opened
     :return: an iterable of Segb1Entry objects
     """
-    path = pathlib.Path(path)
-    with path.open("rb") as f:
-        yield from read_segb2_stream(f)
+    with map_segb2_file(path) as columns:
+        yield from columns.entries()
 
 
 if __name__ == '__main__':
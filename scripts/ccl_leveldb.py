@@ -28,12 +28,13 @@ import io
 import pathlib
 import dataclasses
 import enum
-from collections import namedtuple
+from bisect import bisect_left
+from collections import namedtuple, OrderedDict
 from types import MappingProxyType
 
 import scripts.ccl_simplesnappy as ccl_simplesnappy
 
-__version__ = "0.4"
+__version__ = "0.5"
 __description__ = "A module for reading LevelDB databases"
 __contact__ = "Alex Caithness"
 
@@ -203,6 +204,7 @@ class LdbFile:
     BLOCK_TRAILER_SIZE = 5
     FOOTER_SIZE = 48
     MAGIC = 0xdb4775248b80fb57
+    BLOCK_CACHE_SIZE = 64  # decompressed blocks kept per file, least recently used dropped first
 
     def __init__(self, file: pathlib.Path):
         if not file.exists():
@@ -221,9 +223,24 @@ class LdbFile:
         if magic != LdbFile.MAGIC:
             raise ValueError(f"Invalid magic number in {file}")
 
+        self._block_cache = OrderedDict()  # block offset -> Block
         self._index = self._read_index()
+        # the user key part of each index key: each is at least the user key of the last entry of its block
+        self._index_user_keys = [key[:-8] if len(key) >= 8 else key for key, handle in self._index]
 
     def _read_block(self, handle: BlockHandle):
+        block = self._block_cache.get(handle.offset)
+        if block is not None:
+            self._block_cache.move_to_end(handle.offset)
+            return block
+
+        block = self._read_block_uncached(handle)
+        self._block_cache[handle.offset] = block
+        if len(self._block_cache) > LdbFile.BLOCK_CACHE_SIZE:
+            self._block_cache.popitem(last=False)
+        return block
+
+    def _read_block_uncached(self, handle: BlockHandle):
         # block is the size in the blockhandle plus the trailer
         # the trailer is 5 bytes long.
         # idx  size  meaning
@@ -239,13 +256,12 @@ class LdbFile:
 
         is_compressed = trailer[0] != 0
         if is_compressed:
-            with io.BytesIO(raw_block) as buff:
-                raw_block = ccl_simplesnappy.decompress(buff)
+            raw_block = ccl_simplesnappy.decompress_bytes(raw_block)
 
         return Block(raw_block, is_compressed, self, handle.offset)
 
     def _read_index(self) -> typing.Tuple[typing.Tuple[bytes, BlockHandle], ...]:
-        index_block = self._read_block(self._index_handle)
+        index_block = self._read_block_uncached(self._index_handle)
         # key is earliest key, value is BlockHandle to that data block
         return tuple((entry.key, BlockHandle.from_bytes(entry.value))
                      for entry in index_block)
@@ -253,14 +269,31 @@ class LdbFile:
     def __iter__(self) -> typing.Iterable[Record]:
         """Iterate Records in this Table file"""
         for block_key, handle in self._index:
-            block = self._read_block(handle)
+            # read without the cache: a full iteration would only push out the blocks cached for lookups
+            block = self._read_block_uncached(handle)
             for entry in block:
-                yield Record.ldb_record(
-                    entry.key, entry.value, self.path,
-                    block.offset if block.was_compressed else block.offset + entry.block_offset,
-                    block.was_compressed)
+                yield self._record(block, entry)
+
+    def _record(self, block: Block, entry: RawBlockEntry) -> Record:
+        return Record.ldb_record(
+            entry.key, entry.value, self.path,
+            block.offset if block.was_compressed else block.offset + entry.block_offset,
+            block.was_compressed)
+
+    def find_records(self, user_key: bytes) -> typing.Iterable[Record]:
+        """Iterate the Records of user_key in this Table file, in file order. Only the blocks which the index says
+        can hold user_key are read, so the keys of the table must be ordered bytewise (LevelDB's default comparator)"""
+        for block_index in range(bisect_left(self._index_user_keys, user_key), len(self._index)):
+            block = self._read_block(self._index[block_index][1])
+            for entry in block:
+                entry_user_key = entry.key[:-8] if len(entry.key) >= 8 else entry.key
+                if entry_user_key == user_key:
+                    yield self._record(block, entry)
+                elif entry_user_key > user_key:
+                    return
 
     def close(self):
+        self._block_cache.clear()
         self._f.close()
 
 
@@ -285,6 +318,7 @@ class LogFile:
         self.file_no = int(file.stem, 16)
 
         self._f = file.open("rb")
+        self._key_index = None  # user key -> Records, built by the first find_records
 
     def _get_raw_blocks(self) -> typing.Iterable[bytes]:
         self._f.seek(0)
@@ -366,7 +400,18 @@ class LogFile:
 
                     yield Record.log_record(key, value, seq + i, state, self.path, start_offset)
 
+    def find_records(self, user_key: bytes) -> typing.Iterable[Record]:
+        """Iterate the Records of user_key in this Log file, in file order. The file is read once, on the first call,
+        and its Records kept by key"""
+        if self._key_index is None:
+            key_index = {}
+            for record in self:
+                key_index.setdefault(record.user_key, []).append(record)
+            self._key_index = key_index
+        yield from self._key_index.get(user_key, ())
+
     def close(self):
+        self._key_index = None
         self._f.close()
 
 
@@ -457,6 +502,7 @@ class ManifestFile:
     but the data within the batches follow their own format.
 
     Main use is to identify the level of files, use `file_to_level` property to look up levels based on file no.
+    `comparator` is the name of the comparator ordering the keys of the database, None if not recorded.
 
     See:
     https://github.com/google/leveldb/blob/master/db/version_edit.h
@@ -475,7 +521,10 @@ class ManifestFile:
         self.path = path
 
         self.file_to_level = {}
+        self.comparator = None
         for edit in self:
+            if edit.comparator is not None:
+                self.comparator = edit.comparator
             if edit.new_files:
                 for nf in edit.new_files:
                     self.file_to_level[nf.file_no] = nf.level
@@ -538,6 +587,7 @@ class ManifestFile:
 
 class RawLevelDb:
     DATA_FILE_PATTERN = r"[0-9]{6}\.(ldb|log|sst)"
+    BYTEWISE_COMPARATOR = "leveldb.BytewiseComparator"
 
     def __init__(self, in_dir: os.PathLike):
 
@@ -559,6 +609,7 @@ class RawLevelDb:
                     latest_manifest = (manifest_no, file)
 
         self.manifest = ManifestFile(latest_manifest[1]) if latest_manifest[1] is not None else None
+        self.comparator = self.manifest.comparator if self.manifest else None
 
     def __enter__(self):
         return self
@@ -574,6 +625,22 @@ class RawLevelDb:
         for file_containing_records in sorted(self._files, reverse=reverse, key=lambda x: x.file_no):
             yield from file_containing_records
 
+    def find_records(self, user_key: bytes, *, reverse=False) -> typing.Iterable[Record]:
+        """Iterate the Records of user_key (live and deleted), in the order of iterate_records_raw.
+        Table files are searched through their index when the manifest gives the bytewise comparator, and scanned
+        otherwise (e.g. IndexedDB's idb_cmp1 orders keys differently); log files are read once and their Records kept
+        by key."""
+        use_index = self.comparator == RawLevelDb.BYTEWISE_COMPARATOR
+        for file_containing_records in sorted(self._files, reverse=reverse, key=lambda x: x.file_no):
+            if use_index or isinstance(file_containing_records, LogFile):
+                yield from file_containing_records.find_records(user_key)
+            else:
+                yield from (record for record in file_containing_records if record.user_key == user_key)
+
+    def get_record(self, user_key: bytes) -> typing.Optional[Record]:
+        """Returns the Record of user_key with the highest sequence number (which may be a deletion), or None"""
+        return max(self.find_records(user_key), key=lambda record: record.seq, default=None)
+
     def close(self):
         for file in self._files:
             file.close()
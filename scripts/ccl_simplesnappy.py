@@ -22,17 +22,31 @@ SOFTWARE.
 
 import sys
 import struct
-import io
 import typing
 import enum
 
-__version__ = "0.1"
+__version__ = "0.2"
 __description__ = "Pure Python reimplementation of Google's Snappy decompression"
 __contact__ = "Alex Caithness"
 
 
 DEBUG = False
 
+# Snappy decompression in C, when cramjam or python-snappy is installed. The pure Python decompression is used
+# otherwise, and for the data the native decompression rejects so that the errors are the same either way.
+try:
+    import cramjam
+    _native_decompress = lambda data: bytes(cramjam.snappy.decompress_raw(data))
+    BACKEND = "cramjam"
+except ImportError:
+    try:
+        import snappy
+        _native_decompress = snappy.uncompress  # AttributeError for packages named snappy that are not python-snappy
+        BACKEND = "python-snappy"
+    except (ImportError, AttributeError):
+        _native_decompress = None
+        BACKEND = "python"
+
 
 def log(msg):
     if DEBUG:
@@ -101,92 +115,99 @@ def read_byte(stream: typing.BinaryIO) -> typing.Optional[int]:
     return None
 
 
-def decompress(data: typing.BinaryIO) -> bytes:
-    """Decompresses the snappy compressed data stream"""
-    uncompressed_length = read_le_varint(data)
-    log(f"Uncompressed length: {uncompressed_length}")
+def _read_varint_at(data, pos: int) -> typing.Tuple[typing.Optional[int], int]:
+    """Reads an unsigned varint at pos in data, returns (value, position after it), value None if data ends first"""
+    result = 0
+    for i in range(10):
+        if pos >= len(data):
+            return None, pos
+        tmp = data[pos]
+        pos += 1
+        result |= ((tmp & 0x7f) << (i * 7))
+        if (tmp & 0x80) == 0:
+            break
+    return result, pos
 
-    out = io.BytesIO()
 
-    while True:
-        start_offset = data.tell()
-        log(f"Reading tag at offset {start_offset}")
-        type_byte = read_byte(data)
-        if type_byte is None:
-            break
+def _decompress_python(data) -> bytes:
+    """Decompresses snappy compressed data held in memory (bytes or a buffer). The output is built in a bytearray,
+    literals and backreferences being copied as whole slices."""
+    uncompressed_length, pos = _read_varint_at(data, 0)
+    log(f"Uncompressed length: {uncompressed_length}")
 
-        log(f"Type Byte is {type_byte:02x}")
+    out = bytearray()
+    end = len(data)
 
+    while pos < end:
+        type_byte = data[pos]
+        pos += 1
         tag = type_byte & 0x03
 
-        log(f"Element Type is: {ElementType(tag)}")
-
         if tag == ElementType.Literal:
-            if ((type_byte & 0xFC) >> 2) < 60:  # embedded in tag
-                length = 1 + ((type_byte & 0xFC) >> 2)
-                log(f"Literal length is embedded in type byte and is {length}")
-            elif ((type_byte & 0xFC) >> 2) == 60:  # 8 bit
-                length = 1 + read_byte(data)
-                log(f"Literal length is 8bit and is {length}")
-            elif ((type_byte & 0xFC) >> 2) == 61:  # 16 bit
-                length = 1 + read_uint16(data)
-                log(f"Literal length is 16bit and is {length}")
-            elif ((type_byte & 0xFC) >> 2) == 62:  # 16 bit
-                length = 1 + read_uint24(data)
-                log(f"Literal length is 24bit and is {length}")
-            elif ((type_byte & 0xFC) >> 2) == 63:  # 16 bit
-                length = 1 + read_uint32(data)
-                log(f"Literal length is 32bit and is {length}")
-            else:
-                raise ValueError()  # cannot ever happen
-
-            literal_data = data.read(length)
-            if len(literal_data) < length:
+            length = type_byte >> 2
+            if length < 60:  # embedded in tag
+                length += 1
+            else:  # 60 to 63 for a 8, 16, 24 or 32 bit length
+                length_size = length - 59
+                if pos + length_size > end:
+                    raise ValueError("Couldn't read literal length")
+                length = 1 + int.from_bytes(data[pos: pos + length_size], "little")
+                pos += length_size
+
+            if pos + length > end:
                 raise ValueError("Couldn't read enough literal data")
 
-            out.write(literal_data)
+            out += data[pos: pos + length]
+            pos += length
 
         else:
             if tag == ElementType.CopyOneByte:
+                if pos >= end:
+                    raise ValueError("Couldn't read backreference offset")
                 length = ((type_byte & 0x1C) >> 2) + 4
-                offset = ((type_byte & 0xE0) << 3) | read_byte(data)
-            elif tag == ElementType.CopyTwoByte:
-                length = 1 + ((type_byte & 0xFC) >> 2)
-                offset = read_uint16(data)
-            elif tag == ElementType.CopyFourByte:
-                length = 1 + ((type_byte & 0xFC) >> 2)
-                offset = read_uint32(data)
-            else:
-                raise ValueError()  # cannot ever happen
+                offset = ((type_byte & 0xE0) << 3) | data[pos]
+                pos += 1
+            else:  # CopyTwoByte or CopyFourByte
+                offset_size = 2 if tag == ElementType.CopyTwoByte else 4
+                if pos + offset_size > end:
+                    raise ValueError("Couldn't read backreference offset")
+                length = 1 + (type_byte >> 2)
+                offset = int.from_bytes(data[pos: pos + offset_size], "little")
+                pos += offset_size
 
             if offset == 0:
                 raise ValueError("Offset cannot be 0")
 
-            actual_offset = out.tell() - offset
-            log(f"Current Outstream Length: {out.tell()}")
-            log(f"Backreference length: {length}")
-            log(f"Backreference relative offset: {offset}")
-            log(f"Backreference absolute offset: {actual_offset}")
-
-            # have to read incrementally because you might have to read data that you've just written
-            # this is probably a really slow way of doing this.
-            # for i in range(length):
-            #     out.write(out.getbuffer()[actual_offset + i: actual_offset + i + 1].tobytes())
-            # new method for doing the same:
-            buffer = out.getbuffer()[actual_offset: actual_offset + length].tobytes()
-            condition = (offset - length) <= 0
-            if condition:
-                buffer = (buffer * length)[:length]
-                # better safe than sorry, this way we're sure to extend it
-                # as much as needed without doing some extra calculations
-            out.write(buffer)
-
-    result = out.getvalue()
-    if uncompressed_length != len(result):
+            actual_offset = len(out) - offset
+            if actual_offset < 0:
+                raise ValueError("Backreference before the start of the uncompressed data")
+
+            if offset >= length:
+                out += out[actual_offset: actual_offset + length]
+            else:
+                # the copy overlaps the data it writes: the last offset bytes repeat
+                out += (out[actual_offset:] * (length // offset + 1))[:length]
+
+    if uncompressed_length != len(out):
         raise ValueError("Wrong data length in uncompressed data")
         # TODO: allow a partial / potentially bad result via a flag in the function call?
 
-    return result
+    return bytes(out)
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    """Decompresses snappy compressed data held in memory, in C when cramjam or python-snappy is installed"""
+    if _native_decompress is not None:
+        try:
+            return _native_decompress(data)
+        except Exception:
+            pass  # decompressed again below for the error
+    return _decompress_python(data)
+
+
+def decompress(data: typing.BinaryIO) -> bytes:
+    """Decompresses the snappy compressed data stream"""
+    return decompress_bytes(data.read())
 
 
 def main(path):
@@ -8,22 +8,13 @@ page_header = \
         <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
         <meta http-equiv="x-ua-compatible" content="ie=edge">
         <title>{0}</title>
-        <!-- Dark mode -->
-        <link rel="stylesheet" href="_elements/dark-mode.css">
         <!-- Font Awesome -->
         <link rel="stylesheet" href="https://use.fontawesome.com/releases/v5.11.2/css/all.css">
         <!-- Google Fonts Roboto -->
         <link rel="stylesheet" href="https://fonts.googleapis.com/css?family=Roboto:300,400,500,700&display=swap">
-        <!-- Bootstrap core CSS -->
-        <link rel="stylesheet" href="_elements/MDB-Free_4.13.0/css/bootstrap.min.css">
-        <!-- Material Design Bootstrap - TOGGLE THIS FOR ALTERNATE DESIGN!-->
-        <link rel="stylesheet" href="_elements/MDB-Free_4.13.0/css/mdb.min.css">
-        <!-- Your custom styles (optional) -->
-        <link rel="stylesheet" href="_elements/dashboard.css">
-        <link rel="stylesheet" href="_elements/chats.css">
-        
-        <!-- MDBootstrap Datatables  -->
-        <link rel="stylesheet" href="_elements/MDB-Free_4.13.0/css/addons/datatables.min.css" rel="stylesheet">
+        <!-- Dark mode, Bootstrap, Material Design Bootstrap, custom styles and MDBootstrap Datatables
+             (bundled by report.py, see report_css_assets) -->
+        <link rel="stylesheet" href="_elements/ileapp.css">
 
         <!-- Icons -->
         <!--script src="https://unpkg.com/feather-icons/dist/feather.min.js"></script-->
@@ -111,6 +102,20 @@ body_sidebar_dynamic_data = \
                         </li>
 """
 body_sidebar_dynamic_data_placeholder = '<!--__INSERT-NAV-BAR-DATA-HERE__-->'
+# Sidebar of artifact pages, shared by all pages through _elements/nav.js (written by report.generate_report)
+body_sidebar_nav_script = '<script src="_elements/nav.js"></script>'
+# Content of _elements/nav.js, variable {0} is the sidebar html as a JS string
+# The link to the current page is marked active, like report.mark_item_active does
+nav_bar_data_script = \
+"""(function() {{
+    var nav = {0};
+    var link = '" href="' + decodeURIComponent(window.location.pathname.split('/').pop()) + '"';
+    var pos = nav.indexOf(link);
+    if (pos >= 0)
+        nav = nav.slice(0, pos) + ' active' + nav.slice(pos);
+    document.write(nav);
+}})();
+"""
 body_sidebar_trailer = \
 """
                     </ul>
@@ -261,17 +266,9 @@ body_end = \
 """
     <!-- End your project here-->
 
-    <!-- jQuery -->
-    <script type="text/javascript" src="_elements/MDB-Free_4.13.0/js/jquery.min.js"></script>
-    <!-- Bootstrap tooltips -->
-    <script type="text/javascript" src="_elements/MDB-Free_4.13.0/js/popper.min.js"></script>
-    <!-- Bootstrap core JavaScript -->
-    <script type="text/javascript" src="_elements/MDB-Free_4.13.0/js/bootstrap.js"></script>
-    <!-- MDB core JavaScript -->
-    <script type="text/javascript" src="_elements/MDB-Free_4.13.0/js/mdb.min.js"></script>
-    <!-- Your custom scripts -->
-    <!-- MDBootstrap Datatables  -->
-    <script type="text/javascript" src="_elements/MDB-Free_4.13.0/js/addons/datatables.min.js"></script>
+    <!-- jQuery, Bootstrap tooltips, Bootstrap core, MDB core and MDBootstrap Datatables JavaScript
+         (bundled by report.py, see report_js_assets) -->
+    <script type="text/javascript" src="_elements/ileapp.js"></script>
     <script>
         feather.replace()
     </script>
@@ -306,6 +303,33 @@ nav_bar_script_footer = \
         });
     </script>
 """
+# Loads the rows of a paged table (see ArtifactHtmlReport.write_artifact_data_table) after the table is
+# initialized by whichever script does it, rows are only rendered to html when displayed (deferRender)
+# Variable {0} is the data-rows attribute of the table
+paged_table_script = \
+"""
+    <script>
+        $.fn.dataTable.defaults.deferRender = true;
+        $('table[data-rows="{0}"]').on('init.dt', function() {{
+            var table = $(this).DataTable();
+            (window.ileappTableData['{0}'] || []).forEach(function(rows) {{
+                table.rows.add(rows);
+            }});
+            table.draw();
+        }});
+        $(window).on('load', function() {{
+            var element = $('table[data-rows="{0}"]');
+            if (!$.fn.dataTable.isDataTable(element)) {{
+                element.DataTable();
+            }}
+        }});
+    </script>
+"""
+# Variables {0} is the data-rows attribute of the table, {1} a list of rows
+paged_table_data = \
+"""window.ileappTableData = window.ileappTableData || {{}};
+(window.ileappTableData['{0}'] = window.ileappTableData['{0}'] || []).push({1});
+"""
 default_responsive_table_script = \
 """
     <script>
@@ -1,18 +1,23 @@
 # common standard imports
+import atexit
 import codecs
 import csv
 from datetime import *
+import logging
 import os
+import queue
 import re
 import shutil
 import sqlite3
 import sys
-from functools import lru_cache
+import threading
+from functools import lru_cache, wraps
 from pathlib import Path
+from time import monotonic
+from xml.sax.saxutils import escape as xml_escape
 
 # common third party imports
 import pytz
-import simplekml
 from bs4 import BeautifulSoup
 from scripts.filetype import guess_mime
 
@@ -28,11 +33,22 @@ thumbnail_root = '**/Media/PhotoData/Thumbnails/**/'
 media_root = '**/Media/'
 thumb_size = 256, 256
 
+# Plugins may run on several threads (--jobs), the shared log and export files are written under this lock
+_output_lock = threading.RLock()
+
+def _serialized(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _output_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
 class OutputParameters:
     '''Defines the parameters that are common for '''
     # static parameters
     nl = '\n'
     screen_output_file_path = ''
+    export_format = 'tsv' # 'parquet' writes _Parquet Exports instead of _TSV Exports (see scripts/parquet_export.py)
 
     def __init__(self, output_folder):
         now = datetime.now()
@@ -270,124 +286,408 @@ class GuiWindow:
     def SetProgressBar(n, total):
         if GuiWindow.window_handle:
             progress_bar = GuiWindow.window_handle.nametowidget('!progressbar')
-            progress_bar.config(value=n)
+            progress_bar.config(value=n, maximum=total)
 
 
-def logfunc(message=""):
-    def redirect_logs(string):
-        log_text.insert('end', string)
-        log_text.see('end')
-        log_text.update()
+class Logger:
+    '''Writes the log files of a run (Screen Output.html, DeviceInfo.html) from a background thread,
+       so logging a message never waits for the disk. The files are kept open and flushed whenever
+       the queue runs empty. Console text is printed right away by the thread logging it, so it stays
+       in order with the plugins' own output. Messages below level are dropped.
 
-    if GuiWindow.window_handle:
-        log_text = GuiWindow.window_handle.nametowidget('logs_frame.log_text')
-        sys.stdout.write = redirect_logs
+       In the GUI, logged and printed text is collected and added to the log window at most every
+       gui_interval seconds; the window is only updated from the main (Tk) thread.
+    '''
+    level = logging.INFO
+    gui_interval = 0.1 # seconds
+    _queue = queue.Queue()
+    _thread = None
+    _files = {} # path -> open file
+    _lock = threading.Lock()
+    _gui_text = []
+    _gui_updated = 0.0
+    _gui_update_scheduled = False
+
+    @classmethod
+    def write(cls, path, text, console_text=None):
+        '''Queues text to be appended to the file at path, and shows console_text on the console or
+           in the GUI log window'''
+        with cls._lock:
+            if cls._thread is None:
+                cls._thread = threading.Thread(target=cls._write_queued, name='Logger', daemon=True)
+                cls._thread.start()
+                atexit.register(cls.close)
+        if console_text is not None:
+            if GuiWindow.window_handle:
+                cls._gui_write(console_text + '\n')
+            else:
+                print(console_text)
+        cls._queue.put((path, text))
 
-    with open(OutputParameters.screen_output_file_path, 'a', encoding='utf8') as a:
-        print(message)
-        a.write(message + '<br>' + OutputParameters.nl)
+    @classmethod
+    def _write_queued(cls):
+        while True:
+            path, text = cls._queue.get()
+            try:
+                log_file = cls._files.get(path)
+                if log_file is None:
+                    log_file = cls._files[path] = open(path, 'a', encoding='utf8')
+                log_file.write(text)
+                if cls._queue.empty():
+                    for log_file in cls._files.values():
+                        log_file.flush()
+            except (OSError, ValueError) as ex:
+                print(f'Error writing log {path}: {ex}')
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    def flush(cls):
+        '''Waits until all queued messages are written to the log files'''
+        cls._queue.join()
+        cls._update_gui()
+
+    @classmethod
+    def close(cls):
+        cls._queue.join()
+        for log_file in cls._files.values():
+            log_file.close()
+        cls._files.clear()
+
+    @classmethod
+    def _gui_write(cls, text):
+        '''Stands in for sys.stdout.write in the GUI, so printed text goes to the log window too'''
+        with cls._lock:
+            cls._gui_text.append(text)
+        if threading.current_thread() is not threading.main_thread():
+            return # picked up by the next update from the main thread
+        if monotonic() - cls._gui_updated >= cls.gui_interval:
+            cls._update_gui()
+        elif not cls._gui_update_scheduled:
+            cls._gui_update_scheduled = True
+            GuiWindow.window_handle.after(int(cls.gui_interval * 1000), cls._update_gui)
+
+    @classmethod
+    def _update_gui(cls):
+        cls._gui_update_scheduled = False
+        window = GuiWindow.window_handle
+        if not window or threading.current_thread() is not threading.main_thread():
+            return
+        with cls._lock:
+            text = ''.join(cls._gui_text)
+            cls._gui_text.clear()
+        if text:
+            log_text = window.nametowidget('logs_frame.log_text')
+            log_text.insert('end', text)
+            log_text.see('end')
+        cls._gui_updated = monotonic()
+        window.update()
+
+
+def logfunc(message="", level=logging.INFO):
+    '''Logs message to the console (or GUI) and to Screen Output.html, level is one of the logging
+       module levels (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR)'''
+    if level < Logger.level:
+        return
+    if GuiWindow.window_handle and sys.stdout.write != Logger._gui_write:
+        sys.stdout.write = Logger._gui_write
+    Logger.write(OutputParameters.screen_output_file_path, message + '<br>' + OutputParameters.nl, message)
 
 
 def logdevinfo(message=""):
-    with open(OutputParameters.screen_output_file_path_devinfo, 'a', encoding='utf8') as b:
-        b.write(message + '<br>' + OutputParameters.nl)
+    Logger.write(OutputParameters.screen_output_file_path_devinfo, message + '<br>' + OutputParameters.nl)
+
+
+def flush_logs():
+    '''Waits until everything logged so far is in the log files'''
+    Logger.flush()
+
+class TsvSink:
+    '''Keeps the _TSV Exports files of a run open with large write buffers, instead of opening a
+       file for every tsv() call. At most max_open_files are kept open, the least recently used is
+       closed first (it is simply opened again in append mode if needed). Closed at the end of the
+       run with close_all.
+    '''
+    max_open_files = 64
+    buffer_size = 1024 * 1024
+    _files = {} # path -> open file, least recently used first
+    _lock = threading.RLock()
+    # Before python 3.11 the csv module treats NUL as the (unset) escapechar, so a NUL in a field fails
+    # with "need to escape, but no escapechar set". There a NUL is written as the four characters \x00
+    # (like backslashreplace writes characters that can't be encoded), so the value visibly differs
+    # from the source instead of silently losing the character.
+    _escape_nul = sys.version_info < (3, 11)
+
+    @classmethod
+    def write(cls, path, data_headers, data_list):
+        with cls._lock:
+            tsvfile = cls._files.pop(path, None)
+            if tsvfile is None:
+                if len(cls._files) >= cls.max_open_files:
+                    cls._files.pop(next(iter(cls._files))).close()
+                # utf-8-sig only writes the BOM at the start of the file, not when appending to it
+                tsvfile = open(path, 'a', encoding='utf-8-sig', errors='backslashreplace', newline='',
+                               buffering=cls.buffer_size)
+            cls._files[path] = tsvfile
+            tsv_writer = csv.writer(tsvfile, delimiter='\t')
+            tsv_writer.writerow(data_headers)
+            if cls._escape_nul:
+                data_list = ([x.replace('\0', '\\x00') if isinstance(x, str) else x for x in row] for row in data_list)
+            tsv_writer.writerows(data_list)
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for tsvfile in cls._files.values():
+                tsvfile.close()
+            cls._files.clear()
+
+def unique_column_names(data_headers):
+    '''Column names for data_headers, made unique as several columns of an artifact can have the same header'''
+    names = []
+    for header in data_headers:
+        name = str(header)
+        number = 2
+        while name in names:
+            name = f'{header}_{number}'
+            number += 1
+        names.append(name)
+    return names
 
 def tsv(report_folder, data_headers, data_list, tsvname):
+    '''Appends data_list (any iterable of rows, like a generator) to _TSV Exports/{tsvname}.tsv,
+       or to _Parquet Exports/{tsvname}.parquet with --export parquet'''
     report_folder = report_folder.rstrip('/')
     report_folder = report_folder.rstrip('\\')
     report_folder_base, tail = os.path.split(report_folder)
+    if OutputParameters.export_format == 'parquet':
+        from scripts.parquet_export import ParquetSink
+        ParquetSink.write(os.path.join(report_folder_base, '_Parquet Exports', tsvname + '.parquet'),
+                          data_headers, data_list)
+        return
     tsv_report_folder = os.path.join(report_folder_base, '_TSV Exports')
+    os.makedirs(tsv_report_folder, exist_ok=True)
+
+    TsvSink.write(os.path.join(tsv_report_folder, tsvname +'.tsv'), data_headers, data_list)
+
+class TimelineSink:
+    '''Writes the timeline events of a run to _Timeline/tl.db over a single connection. timeline() can
+       be called from any thread, it queues the rows and a writer thread inserts them in large
+       batches and transactions. Indexes are created and the WAL checkpointed when the sink is closed
+       at the end of the run (close_all).
+    '''
+    commit_rows = 100000 # rows per transaction
+    _sinks = {} # tl.db path -> sink
+    _sinks_lock = threading.Lock()
+
+    def __init__(self, tl_report_folder):
+        os.makedirs(tl_report_folder, exist_ok=True)
+        self.db_path = os.path.join(tl_report_folder, 'tl.db')
+        self._queue = queue.Queue(maxsize=64) # lists of rows, bounded so producers can't outrun the writer
+        self._error = None
+        self._thread = threading.Thread(target=self._write, name='TimelineSink', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_folder(cls, tl_report_folder):
+        with cls._sinks_lock:
+            sink = cls._sinks.get(tl_report_folder)
+            if sink is None:
+                sink = cls._sinks[tl_report_folder] = cls(tl_report_folder)
+            return sink
+
+    @classmethod
+    def close_all(cls):
+        with cls._sinks_lock:
+            sinks = list(cls._sinks.values())
+            cls._sinks.clear()
+        for sink in sinks:
+            sink.close()
+
+    def add(self, rows):
+        '''Queues a list of (key, activity, datalist) rows'''
+        if rows:
+            self._queue.put(rows)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            logfunc(f'Error writing timeline to {self.db_path}: {self._error}')
+
+    def _write(self):
+        try:
+            db = sqlite3.connect(self.db_path)
+            cursor = db.cursor()
+            cursor.execute('''PRAGMA journal_mode = WAL''')
+            cursor.execute('''PRAGMA synchronous = OFF''') # the file is checkpointed when the run ends
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS data(key TEXT, activity TEXT, datalist TEXT)
+                """
+            )
+            db.commit()
+        except sqlite3.Error as ex:
+            self._error = ex
+            db = None
+        uncommitted = 0
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                break
+            if self._error is not None:
+                continue # keep draining the queue so plugins are not blocked
+            try:
+                cursor.executemany("INSERT INTO data VALUES(?,?,?)", rows)
+                uncommitted += len(rows)
+                if uncommitted >= self.commit_rows:
+                    db.commit()
+                    uncommitted = 0
+            except sqlite3.Error as ex:
+                self._error = ex
+        if db is None:
+            return
+        try:
+            db.commit()
+            cursor.execute('''CREATE INDEX IF NOT EXISTS data_key ON data(key)''')
+            cursor.execute('''CREATE INDEX IF NOT EXISTS data_activity ON data(activity)''')
+            db.commit()
+            cursor.execute('''PRAGMA wal_checkpoint(TRUNCATE)''')
+        except sqlite3.Error as ex:
+            self._error = ex
+        db.close()
 
-    if os.path.isdir(tsv_report_folder):
-        pass
-    else:
-        os.makedirs(tsv_report_folder)
-    
-    
-    with codecs.open(os.path.join(tsv_report_folder, tsvname +'.tsv'), 'a', 'utf-8-sig') as tsvfile:
-        tsv_writer = csv.writer(tsvfile, delimiter='\t')
-        tsv_writer.writerow(data_headers)
-        for i in data_list:
-            tsv_writer.writerow(i)
-            
 def timeline(report_folder, tlactivity, data_list, data_headers):
     report_folder = report_folder.rstrip('/')
     report_folder = report_folder.rstrip('\\')
     report_folder_base, tail = os.path.split(report_folder)
     tl_report_folder = os.path.join(report_folder_base, '_Timeline')
 
-    if os.path.isdir(tl_report_folder):
-        tldb = os.path.join(tl_report_folder, 'tl.db')
-        db = sqlite3.connect(tldb)
-        cursor = db.cursor()
-        cursor.execute('''PRAGMA synchronous = EXTRA''')
-        cursor.execute('''PRAGMA journal_mode = WAL''')
-        db.commit()
-    else:
-        os.makedirs(tl_report_folder)
-        # create database
-        tldb = os.path.join(tl_report_folder, 'tl.db')
-        db = sqlite3.connect(tldb, isolation_level = 'exclusive')
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE data(key TEXT, activity TEXT, datalist TEXT)
-            """
+    sink = TimelineSink.for_folder(tl_report_folder)
+    activity = tlactivity.upper()
+    parquet_folder = None
+    if OutputParameters.export_format == 'parquet':
+        from scripts.parquet_export import ParquetSink
+        parquet_folder = os.path.join(report_folder_base, '_Parquet Exports', '_Timeline')
+    rows = []
+    for data in data_list:
+        modifiedList = list(map(lambda x, y: x.upper() + ': ' +  str(y), data_headers, data))
+        rows.append((str(data[0]), activity, str(modifiedList)))
+        if len(rows) == 10000:
+            sink.add(rows)
+            if parquet_folder:
+                ParquetSink.write_timeline(parquet_folder, activity, [(key, datalist) for key, _, datalist in rows])
+            rows = []
+    sink.add(rows)
+    if parquet_folder:
+        ParquetSink.write_timeline(parquet_folder, activity, [(key, datalist) for key, _, datalist in rows])
+
+kml_header = \
+"""<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">
+    <Document id="1">
+        <open>1</open>
+"""
+kml_placemark = \
+"""        <Placemark id="{1}">
+            <name>{2}</name>
+            <description>{3}</description>
+            <Point id="{0}">
+                <coordinates>{4},{5},0.0</coordinates>
+            </Point>
+        </Placemark>
+"""
+kml_footer = \
+"""    </Document>
+</kml>
+"""
+
+_geohash_alphabet = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(latitude, longitude, precision=9):
+    '''Returns the geohash of a point, points close to each other share a long prefix'''
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    code = []
+    bits = bit_count = 0
+    even = True
+    while len(code) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            code.append(_geohash_alphabet[bits])
+            bits = bit_count = 0
+    return ''.join(code)
+
+def _open_latlong_db(latlongdb):
+    '''Opens _latlong.db, creating its tables when needed. Points are indexed in an R*Tree (data_rtree,
+       by the rowid of data) or, where SQLite is built without R*Tree, by geohash (data_geohash).
+       Returns (db, name of the index table)'''
+    db = sqlite3.connect(latlongdb)
+    cursor = db.cursor()
+    cursor.execute('''PRAGMA journal_mode = WAL''')
+    cursor.execute(
+    """
+    CREATE TABLE IF NOT EXISTS data(key TEXT, latitude TEXT, longitude TEXT, activity TEXT)
+    """
         )
-        db.commit()
-    
-    a = 0
-    length = (len(data_list))
-    while a < length: 
-        modifiedList = list(map(lambda x, y: x.upper() + ': ' +  str(y), data_headers, data_list[a]))
-        cursor.executemany("INSERT INTO data VALUES(?,?,?)", [(str(data_list[a][0]), tlactivity.upper(), str(modifiedList))])
-        a += 1
+    try:
+        cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS data_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)''')
+        index_table = 'data_rtree'
+    except sqlite3.OperationalError:
+        cursor.execute('''CREATE TABLE IF NOT EXISTS data_geohash(id INTEGER PRIMARY KEY, geohash TEXT)''')
+        cursor.execute('''CREATE INDEX IF NOT EXISTS data_geohash_index ON data_geohash(geohash)''')
+        index_table = 'data_geohash'
     db.commit()
-    db.close()
+    return db, index_table
 
+@_serialized
 def kmlgen(report_folder, kmlactivity, data_list, data_headers):
+    '''Writes the points of data_list (any iterable of rows with Latitude and Longitude, and optionally
+       Timestamp columns) to _KML Exports/{kmlactivity}.kml as they are read, and adds them to the
+       _latlong.db index of all locations in a single transaction'''
     report_folder = report_folder.rstrip('/')
     report_folder = report_folder.rstrip('\\')
     report_folder_base, tail = os.path.split(report_folder)
     kml_report_folder = os.path.join(report_folder_base, '_KML Exports')
-    if os.path.isdir(kml_report_folder):
-        latlongdb = os.path.join(kml_report_folder, '_latlong.db')
-        db = sqlite3.connect(latlongdb)
-        cursor = db.cursor()
-        cursor.execute('''PRAGMA synchronous = EXTRA''')
-        cursor.execute('''PRAGMA journal_mode = WAL''')
-        db.commit()
-    else:
-        os.makedirs(kml_report_folder)
-        latlongdb = os.path.join(kml_report_folder, '_latlong.db')
-        db = sqlite3.connect(latlongdb)
-        cursor = db.cursor()
-        cursor.execute(
-        """
-        CREATE TABLE data(key TEXT, latitude TEXT, longitude TEXT, activity TEXT)
-        """
-            )
-        db.commit()
-    
-    kml = simplekml.Kml(open=1)
-    
-    a = 0
-    length = (len(data_list))
-    while a < length:
-        modifiedDict = dict(zip(data_headers, data_list[a]))
-        times = modifiedDict.get('Timestamp','N/A')
-        lon = modifiedDict['Longitude']
-        lat = modifiedDict['Latitude']
-        if lat:
-            pnt = kml.newpoint()
-            pnt.name = times
-            pnt.description = f"Timestamp: {times} - {kmlactivity}"
-            pnt.coords = [(lon, lat)]
-            cursor.execute("INSERT INTO data VALUES(?,?,?,?)", (times, lat, lon, kmlactivity))
-        a += 1
+    os.makedirs(kml_report_folder, exist_ok=True)
+    db, index_table = _open_latlong_db(os.path.join(kml_report_folder, '_latlong.db'))
+    cursor = db.cursor()
+
+    with open(os.path.join(kml_report_folder, f'{kmlactivity}.kml'), 'w', encoding='utf-8') as kml:
+        kml.write(kml_header)
+        element_id = 1
+        for row in data_list:
+            modifiedDict = dict(zip(data_headers, row))
+            times = modifiedDict.get('Timestamp','N/A')
+            lon = modifiedDict['Longitude']
+            lat = modifiedDict['Latitude']
+            if lat:
+                kml.write(kml_placemark.format(element_id + 1, element_id + 2, xml_escape(str(times)),
+                                               xml_escape(f"Timestamp: {times} - {kmlactivity}"),
+                                               xml_escape(str(lon)), xml_escape(str(lat))))
+                element_id += 2
+                cursor.execute("INSERT INTO data VALUES(?,?,?,?)", (times, lat, lon, kmlactivity))
+                try:
+                    lat_value, lon_value = float(lat), float(lon)
+                except (TypeError, ValueError):
+                    continue # not indexed
+                if index_table == 'data_rtree':
+                    cursor.execute("INSERT INTO data_rtree VALUES(?,?,?,?,?)",
+                                   (cursor.lastrowid, lat_value, lat_value, lon_value, lon_value))
+                else:
+                    cursor.execute("INSERT INTO data_geohash VALUES(?,?)",
+                                   (cursor.lastrowid, geohash(lat_value, lon_value)))
+        kml.write(kml_footer)
     db.commit()
     db.close()
-    kml.save(os.path.join(kml_report_folder, f'{kmlactivity}.kml'))
     
 ''' Returns string of printable characters. Replacing non-printable characters
 with '.', or CHR(46)
@@ -0,0 +1,196 @@
+'''Keeps the file listings of processed extractions in the user's cache folder, so that processing
+   the same extraction again (another profile, another timezone, a re-run after a plugin fix)
+   does not have to walk the whole input tree or query Manifest.db again.
+
+   A listing is stored against the absolute input path and a fingerprint of the input. Before a
+   stored listing is used, a sample of the folders and files it contains is checked against the
+   file system; any difference makes the listing stale and the input is scanned again.
+'''
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+from array import array
+
+from scripts.ilapfuncs import logfunc, is_platform_windows, is_platform_macos
+
+# Bump when the layout of a stored listing changes, older listings are then ignored
+CACHE_VERSION = 1
+
+
+def user_cache_folder():
+    '''Returns the per-user folder the listings are stored in'''
+    if is_platform_windows():
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif is_platform_macos():
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'iLEAPP')
+
+
+def _pack_strings(strings):
+    return zlib.compress('\0'.join(strings).encode('utf8', 'surrogateescape'), 1)
+
+
+def _unpack_strings(blob, count):
+    if not count:
+        return []
+    return zlib.decompress(blob).decode('utf8', 'surrogateescape').split('\0')
+
+
+def _pack_numbers(numbers):
+    return zlib.compress(array('q', numbers).tobytes(), 1)
+
+
+def _unpack_numbers(blob):
+    numbers = array('q')
+    numbers.frombytes(zlib.decompress(blob))
+    return numbers
+
+
+class DirListing:
+    '''Listing of a folder: paths relative to the folder in depth-first order, with their sizes,
+       modification times (ns) and whether they are folders'''
+    def __init__(self, relative_paths=None, sizes=None, mtimes=None, is_dir=None):
+        self.relative_paths = relative_paths if relative_paths is not None else []
+        self.sizes = sizes if sizes is not None else array('q')
+        self.mtimes = mtimes if mtimes is not None else array('q')
+        self.is_dir = is_dir if is_dir is not None else bytearray()
+
+    def append(self, relative_path, stat_result, is_dir):
+        self.relative_paths.append(relative_path)
+        self.sizes.append(stat_result.st_size)
+        self.mtimes.append(stat_result.st_mtime_ns)
+        self.is_dir.append(is_dir)
+
+    def __len__(self):
+        return len(self.relative_paths)
+
+
+class ListingCache:
+    '''SQLite database of stored listings, one row per input'''
+    sample_size = 64  # folders and files checked against the file system before a listing is used
+
+    def __init__(self, cache_folder=None):
+        self.cache_folder = cache_folder or user_cache_folder()
+        self.db_path = os.path.join(self.cache_folder, 'listings.db')
+
+    def _connect(self):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS listing(
+            key TEXT PRIMARY KEY, version INTEGER, root TEXT, fingerprint TEXT, created REAL,
+            count INTEGER, paths BLOB, sizes BLOB, mtimes BLOB, is_dir BLOB, file_ids BLOB)
+            '''
+        )
+        return db
+
+    @staticmethod
+    def _key(kind, root):
+        return kind + ':' + hashlib.sha1(os.path.abspath(root).encode('utf8', 'surrogateescape')).hexdigest()
+
+    def _load_row(self, key, fingerprint):
+        if not os.path.exists(self.db_path):
+            return None
+        db = self._connect()
+        try:
+            return db.execute(
+                'SELECT count, paths, sizes, mtimes, is_dir, file_ids FROM listing WHERE key=? AND version=? AND fingerprint=?',
+                (key, CACHE_VERSION, fingerprint)).fetchone()
+        finally:
+            db.close()
+
+    def _save_row(self, key, root, fingerprint, count, paths, sizes=None, mtimes=None, is_dir=None, file_ids=None):
+        db = self._connect()
+        try:
+            with db:
+                db.execute('INSERT OR REPLACE INTO listing VALUES(?,?,?,?,?,?,?,?,?,?,?)',
+                           (key, CACHE_VERSION, os.path.abspath(root), fingerprint, time.time(), count,
+                            paths, sizes, mtimes, is_dir, file_ids))
+        finally:
+            db.close()
+
+    @staticmethod
+    def _dir_fingerprint(directory):
+        stat_result = os.stat(directory)
+        return f'{stat_result.st_dev}:{stat_result.st_ino}:{stat_result.st_mtime_ns}'
+
+    def _sample_matches(self, directory, listing):
+        '''Checks the top level folders and an evenly spread sample of the other entries against
+           the file system. A folder's mtime changes when entries are added to or removed from it,
+           a file's size or mtime when it is written to.'''
+        count = len(listing)
+        step = max(1, count // self.sample_size)
+        sample = set(range(0, count, step))
+        sample.update(index for index, relative_path in enumerate(listing.relative_paths)
+                      if listing.is_dir[index] and os.sep not in relative_path)
+        for index in sample:
+            try:
+                stat_result = os.stat(os.path.join(directory, listing.relative_paths[index]), follow_symlinks=False)
+            except OSError:
+                return False
+            if stat_result.st_mtime_ns != listing.mtimes[index]:
+                return False
+            if not listing.is_dir[index] and stat_result.st_size != listing.sizes[index]:
+                return False
+        return True
+
+    def load_dir(self, directory):
+        '''Returns the stored DirListing of directory, or None if there is none or it is stale'''
+        try:
+            row = self._load_row(self._key('dir', directory), self._dir_fingerprint(directory))
+            if row is None:
+                return None
+            count, paths, sizes, mtimes, is_dir, _ = row
+            listing = DirListing(_unpack_strings(paths, count), _unpack_numbers(sizes), _unpack_numbers(mtimes),
+                                 bytearray(zlib.decompress(is_dir)))
+            if len(listing) != count or not self._sample_matches(directory, listing):
+                logfunc('Cached file listing is out of date, the input will be scanned again')
+                return None
+            return listing
+        except (OSError, sqlite3.Error, zlib.error, ValueError) as ex:
+            logfunc(f'Could not read the cached file listing from {self.db_path} ' + str(ex))
+        return None
+
+    def save_dir(self, directory, listing):
+        try:
+            self._save_row(self._key('dir', directory), directory, self._dir_fingerprint(directory), len(listing),
+                           _pack_strings(listing.relative_paths), _pack_numbers(listing.sizes),
+                           _pack_numbers(listing.mtimes), zlib.compress(bytes(listing.is_dir), 1))
+        except (OSError, sqlite3.Error) as ex:
+            logfunc(f'Could not save the file listing to {self.db_path} ' + str(ex))
+
+    @staticmethod
+    def _manifest_fingerprint(manifest_path):
+        stat_result = os.stat(manifest_path)
+        return f'{stat_result.st_size}:{stat_result.st_mtime_ns}'
+
+    def load_itunes(self, directory):
+        '''Returns the stored {path: fileID} of the iTunes backup in directory, or None'''
+        manifest_path = os.path.join(directory, 'Manifest.db')
+        try:
+            row = self._load_row(self._key('itunes', directory), self._manifest_fingerprint(manifest_path))
+            if row is None:
+                return None
+            count, paths, _, _, _, file_ids = row
+            paths = _unpack_strings(paths, count)
+            file_ids = _unpack_strings(file_ids, count)
+            if len(paths) != count or len(file_ids) != count:
+                return None
+            return dict(zip(paths, file_ids))
+        except (OSError, sqlite3.Error, zlib.error, ValueError) as ex:
+            logfunc(f'Could not read the cached file listing from {self.db_path} ' + str(ex))
+        return None
+
+    def save_itunes(self, directory, all_files):
+        manifest_path = os.path.join(directory, 'Manifest.db')
+        try:
+            self._save_row(self._key('itunes', directory), directory, self._manifest_fingerprint(manifest_path),
+                           len(all_files), _pack_strings(all_files.keys()), file_ids=_pack_strings(all_files.values()))
+        except (OSError, sqlite3.Error) as ex:
+            logfunc(f'Could not save the file listing to {self.db_path} ' + str(ex))
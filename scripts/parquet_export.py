@@ -0,0 +1,208 @@
+'''Writes the artifact data of a run as Parquet files (--export parquet), for loading a whole
+   extraction in pandas, DuckDB or Polars. pyarrow is only needed when this export is selected.
+
+   _Parquet Exports/{tsvname}.parquet gets what tsv() would have written to _TSV Exports, with
+   typed columns: numbers stay numbers, and date/time columns (datetime objects or strings such as
+   '2023-10-27 18:18:29+00:00') become UTC timestamps. Times without an offset are taken as UTC.
+
+   _Parquet Exports/_Timeline is one dataset of all timeline() events, partitioned by activity
+   (activity=<ACTIVITY>/part-<n>.parquet, hive style).
+'''
+import os
+import re
+import threading
+
+from datetime import date, datetime, timezone
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.ilapfuncs import logfunc, unique_column_names
+
+compression = 'zstd'
+chunk_rows = 100000 # rows converted and written per row group
+
+_timestamp_type = pa.timestamp('us', tz='UTC')
+_datetime_pattern = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?( ?(Z|[+-]\d{2}:?\d{2}))?')
+_missing = (None, '', 'N/A') # written as null in the typed (non string) columns
+
+timeline_schema = pa.schema([
+    ('timestamp', _timestamp_type),
+    ('key', pa.string()),
+    ('datalist', pa.string()),
+])
+
+
+def _to_utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_datetime(value):
+    '''Returns the UTC datetime of a string like '2023-10-27 18:18:29-0400', or None'''
+    value = value.strip()
+    if not _datetime_pattern.fullmatch(value):
+        return None
+    value = value.replace(' ', 'T', 1).replace(' ', '')
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    elif value[-5] in '+-' and value[-3] != ':':
+        value = value[:-2] + ':' + value[-2:]
+    try:
+        return _to_utc(datetime.fromisoformat(value))
+    except ValueError:
+        return None
+
+
+def _string(value):
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _column(values, as_text=False):
+    '''Returns a pyarrow array of values with the narrowest type that holds all of them'''
+    if as_text:
+        return pa.array([_string(value) for value in values], pa.string())
+    present = [value for value in values if value not in _missing]
+    kinds = set(type(value) for value in present)
+    try:
+        if not kinds:
+            return pa.array([_string(value) for value in values], pa.string())
+        if kinds == {bool}:
+            return pa.array([None if value in _missing else value for value in values], pa.bool_())
+        if kinds == {int}:
+            return pa.array([None if value in _missing else value for value in values], pa.int64())
+        if kinds <= {int, float} and float in kinds:
+            return pa.array([None if value in _missing else float(value) for value in values], pa.float64())
+        if kinds <= {bytes, bytearray}:
+            return pa.array([None if value in _missing else bytes(value) for value in values], pa.binary())
+        if all(issubclass(kind, datetime) for kind in kinds):
+            return pa.array([None if value in _missing else _to_utc(value) for value in values], _timestamp_type)
+        if kinds == {date}:
+            return pa.array([None if value in _missing else value for value in values], pa.date32())
+        if kinds == {str}:
+            parsed = {value: parse_datetime(value) for value in set(present)}
+            if None not in parsed.values():
+                return pa.array([None if value in _missing else parsed[value] for value in values], _timestamp_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        pass # ints over 64 bits and the like, kept as text
+    return pa.array([_string(value) for value in values], pa.string())
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ParquetFile:
+    '''A Parquet file being written. The schema is taken from the first rows written to it; when
+       later rows don't fit it (a column of numbers that now holds text), they go to a new part
+       file, {name}_part2.parquet, rather than being dropped.'''
+    def __init__(self, path):
+        self.path = path
+        self.part = 1
+        self.writer = None
+
+    def text_columns(self):
+        '''Names of the columns already written as text, later values of them are kept as text too'''
+        if self.writer is None:
+            return set()
+        return set(field.name for field in self.writer.schema if field.type == pa.string())
+
+    def _open(self, schema):
+        path = self.path
+        if self.part > 1:
+            path = f'{os.path.splitext(path)[0]}_part{self.part}.parquet'
+        self.writer = pq.ParquetWriter(path, schema, compression=compression)
+
+    def write(self, table):
+        if self.writer is not None and not table.schema.equals(self.writer.schema):
+            try:
+                table = table.cast(self.writer.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, ValueError):
+                self.close()
+                self.part += 1
+        if self.writer is None:
+            self._open(table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ParquetSink:
+    '''The Parquet files of a run, kept open until close_all at the end of the run so every tsv() or
+       timeline() call adds row groups to the same file'''
+    _files = {} # path -> _ParquetFile
+    _lock = threading.RLock()
+
+    @classmethod
+    def _file(cls, path):
+        parquet_file = cls._files.get(path)
+        if parquet_file is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            parquet_file = cls._files[path] = _ParquetFile(path)
+        return parquet_file
+
+    @classmethod
+    def write(cls, path, data_headers, data_list):
+        '''Adds data_list (any iterable of rows) to the Parquet file path'''
+        names = unique_column_names(data_headers)
+        width = len(names)
+        for chunk in _chunks(data_list, chunk_rows):
+            columns = [[] for _ in names]
+            for row in chunk:
+                row = list(row)[:width]
+                row.extend([None] * (width - len(row)))
+                for column, value in zip(columns, row):
+                    column.append(value)
+            with cls._lock:
+                text_columns = cls._file(path).text_columns()
+            table = pa.Table.from_arrays(
+                [_column(column, name in text_columns) for name, column in zip(names, columns)], names)
+            with cls._lock:
+                try:
+                    cls._file(path).write(table)
+                except (OSError, pa.ArrowException) as ex:
+                    logfunc(f'Error writing Parquet export {path}: {ex}')
+                    return
+
+    @classmethod
+    def write_timeline(cls, tl_folder, activity, rows):
+        '''Adds (key, datalist) rows of activity to the partitioned timeline dataset in tl_folder'''
+        if not rows:
+            return
+        keys = [key for key, _ in rows]
+        timestamps = [parse_datetime(key) for key in keys]
+        table = pa.Table.from_arrays(
+            [pa.array(timestamps, _timestamp_type), pa.array(keys, pa.string()),
+             pa.array([datalist for _, datalist in rows], pa.string())], schema=timeline_schema)
+        path = os.path.join(tl_folder, 'activity=' + quote(activity, safe=''), 'part-0.parquet')
+        with cls._lock:
+            try:
+                cls._file(path).write(table)
+            except (OSError, pa.ArrowException) as ex:
+                logfunc(f'Error writing Parquet timeline {path}: {ex}')
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for parquet_file in cls._files.values():
+                try:
+                    parquet_file.close()
+                except (OSError, pa.ArrowException) as ex:
+                    logfunc(f'Error closing Parquet export {parquet_file.path}: {ex}')
+            cls._files.clear()
@@ -0,0 +1,451 @@
+'''Plist files read once for the run, shared by the artifact plugins.
+
+       plist = open_plist(file_found)
+       bundle_id = plist['MCMMetadataIdentifier']
+
+   open_plist parses a file the first time it is asked for and keeps the result for the run, by
+   path, modification time and size, so plists that several plugins read (container metadata,
+   com.apple.* preferences) are parsed once. Binary plists are not decoded up front: their dicts
+   and arrays come as PlistDict and PlistArray, read-only views whose keys and values are decoded
+   from the object table when first accessed. Files from mmap_size up are memory mapped rather
+   than read. XML plists are parsed whole by plistlib.
+
+   The objects open_plist returns are shared, don't change them. load_plist returns the plain
+   dicts and lists plistlib.load gives, a copy of its own for each call.
+
+   open_keyed_archive reads NSKeyedArchiver plists the same way: the archived objects are only
+   looked up and converted (NSDictionary, NSArray, NSString, NSDate...) when accessed, where
+   ccl_bplist.deserialise_NsKeyedArchiver and nska_deserialize convert the whole object graph.
+'''
+import datetime
+import mmap
+import os
+import plistlib
+import struct
+import threading
+
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from uuid import UUID
+
+mmap_size = 1024 * 1024 # files from this size up are memory mapped
+cache_size = 256 * 1024 * 1024 # bytes of plist files kept parsed, least recently used ones dropped first
+
+_undefined = object()
+_int_formats = {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}
+_cocoa_epoch = datetime.datetime(2001, 1, 1)
+_scalar_types = {str, int, float, bool, bytes, type(None), datetime.datetime, plistlib.UID}
+
+
+class BinaryPlist:
+    '''A binary plist held in a buffer (bytes or mmap). Objects are decoded from the object table
+       when first asked for and kept. Errors are raised as plistlib.InvalidFileException, when
+       the object is decoded.'''
+    def __init__(self, buffer):
+        try:
+            if buffer[:8] != b'bplist00':
+                raise ValueError('Not a binary plist')
+            offset_size, self._ref_size, object_count, top_object, offset_table_offset = struct.unpack_from(
+                '>6xBBQQQ', buffer, len(buffer) - 32)
+            self._buffer = buffer
+            self._offsets = self._read_ints(offset_table_offset, object_count, offset_size)
+        except (IndexError, struct.error, OverflowError, ValueError):
+            raise plistlib.InvalidFileException()
+        self._objects = {} # ref -> decoded object
+        self.root = self.object(top_object)
+
+    def _read_ints(self, offset, count, size):
+        if size in _int_formats:
+            return struct.unpack_from(f'>{count}{_int_formats[size]}', self._buffer, offset)
+        data = self._buffer[offset:offset + size * count]
+        if not size or len(data) != size * count:
+            raise ValueError('Truncated integers')
+        return tuple(int.from_bytes(data[index:index + size], 'big') for index in range(0, size * count, size))
+
+    def _read_size(self, token_low, offset):
+        '''Returns (size of the object, offset of its contents)'''
+        if token_low == 0xF:
+            size_length = 1 << (self._buffer[offset] & 0x3)
+            return struct.unpack_from('>' + _int_formats[size_length], self._buffer, offset + 1)[0], offset + 1 + size_length
+        return token_low, offset
+
+    def _read_sized(self, token_low, offset, multiplier=1):
+        size, offset = self._read_size(token_low, offset)
+        data = self._buffer[offset:offset + size * multiplier]
+        if len(data) != size * multiplier:
+            raise ValueError('Truncated object')
+        return data
+
+    def object(self, ref):
+        '''Returns the object ref of the object table, decoding it on first use'''
+        result = self._objects.get(ref, _undefined)
+        if result is _undefined:
+            try:
+                result = self._decode(ref)
+            except (IndexError, struct.error, OverflowError, ValueError):
+                raise plistlib.InvalidFileException()
+            self._objects[ref] = result
+        return result
+
+    def _decode(self, ref):
+        buffer = self._buffer
+        offset = self._offsets[ref]
+        token = buffer[offset]
+        token_high, token_low = token & 0xF0, token & 0x0F
+        offset += 1
+
+        if token == 0x00:
+            return None
+        if token == 0x08:
+            return False
+        if token == 0x09:
+            return True
+        if token == 0x0f:
+            return b''
+        if token_high == 0x10: # int
+            return int.from_bytes(buffer[offset:offset + (1 << token_low)], 'big', signed=token_low >= 3)
+        if token == 0x22: # real
+            return struct.unpack_from('>f', buffer, offset)[0]
+        if token == 0x23: # real
+            return struct.unpack_from('>d', buffer, offset)[0]
+        if token == 0x33: # date
+            return _cocoa_epoch + datetime.timedelta(seconds=struct.unpack_from('>d', buffer, offset)[0])
+        if token_high == 0x40: # data
+            return bytes(self._read_sized(token_low, offset))
+        if token_high == 0x50: # ascii string
+            return bytes(self._read_sized(token_low, offset)).decode('ascii')
+        if token_high == 0x60: # utf-16 string
+            return bytes(self._read_sized(token_low, offset, 2)).decode('utf-16be')
+        if token_high == 0x80: # UID
+            return plistlib.UID(int.from_bytes(buffer[offset:offset + 1 + token_low], 'big'))
+        if token_high == 0xA0: # array
+            size, offset = self._read_size(token_low, offset)
+            return PlistArray(self, self._read_ints(offset, size, self._ref_size))
+        if token_high == 0xD0: # dict
+            size, offset = self._read_size(token_low, offset)
+            key_refs = self._read_ints(offset, size, self._ref_size)
+            value_refs = self._read_ints(offset + size * self._ref_size, size, self._ref_size)
+            return PlistDict(self, key_refs, value_refs)
+        raise ValueError(f'Unknown object type {token:#x}')
+
+
+class PlistDict(Mapping):
+    '''A dict of a binary plist. The keys are decoded on first access, each value when it is first
+       looked up.'''
+    def __init__(self, plist, key_refs, value_refs):
+        self._plist = plist
+        self._key_refs = key_refs
+        self._value_refs = value_refs
+        self._index = None # key -> value ref
+
+    def _refs(self):
+        if self._index is None:
+            try:
+                self._index = {self._plist.object(key): value for key, value in zip(self._key_refs, self._value_refs)}
+            except TypeError: # unhashable key
+                raise plistlib.InvalidFileException()
+        return self._index
+
+    def __getitem__(self, key):
+        return self._plist.object(self._refs()[key])
+
+    def __contains__(self, key):
+        return key in self._refs()
+
+    def __iter__(self):
+        return iter(self._refs())
+
+    def __len__(self):
+        return len(self._key_refs)
+
+    def __repr__(self):
+        return repr(to_python(self))
+
+
+class PlistArray(Sequence):
+    '''An array of a binary plist, its items decoded when first looked up'''
+    def __init__(self, plist, refs):
+        self._plist = plist
+        self._refs = refs
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._plist.object(ref) for ref in self._refs[index]]
+        return self._plist.object(self._refs[index])
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __eq__(self, other):
+        if isinstance(other, (PlistArray, list, tuple, ArchivedArray)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(to_python(self))
+
+
+class KeyedArchive:
+    '''NSKeyedArchiver data, from the root of its plist. top maps the names of the archived top
+       objects ('root' mostly) to them. Objects are converted the way ccl_bplist's
+       NSKeyedArchiver_common_objects_convertor does, when accessed: NSDictionary, NSArray and
+       NSSet come as ArchivedDict and ArchivedArray, NSString as str, NSDate as datetime (None
+       for distantPast), NSUUID as str and $null as None. Other objects come as ArchivedObject,
+       a mapping of their keys but $class, with the name of their class.'''
+    def __init__(self, plist):
+        if not isinstance(plist, Mapping) or '$objects' not in plist or '$top' not in plist:
+            raise ValueError('Not an NSKeyedArchiver plist')
+        self._objects = plist['$objects']
+        self._resolved = {} # $objects index -> converted object
+        self.top = ArchivedObject(self, plist['$top'], None)
+
+    @property
+    def root(self):
+        '''The 'root' top object, or the first one when there is no 'root' '''
+        if 'root' in self.top:
+            return self.top['root']
+        return self.top[next(iter(self.top))]
+
+    def resolve(self, value):
+        '''Returns the object a value of an archived object stands for'''
+        if isinstance(value, plistlib.UID):
+            index = value.data
+            result = self._resolved.get(index, _undefined)
+            if result is _undefined:
+                result = self._objects[index]
+                result = None if result == '$null' else self._convert(result)
+                self._resolved[index] = result
+            return result
+        return self._convert(value)
+
+    def class_name(self, archived):
+        '''Returns the $classname of an archived object (a mapping with $class), None without one'''
+        class_uid = archived.get('$class')
+        if not isinstance(class_uid, plistlib.UID):
+            return None
+        archived_class = self._objects[class_uid.data]
+        return archived_class.get('$classname') if isinstance(archived_class, Mapping) else None
+
+    def _convert(self, value):
+        if isinstance(value, Mapping):
+            class_name = self.class_name(value)
+            if class_name in ('NSDictionary', 'NSMutableDictionary'):
+                if 'NS.keys' in value and 'NS.objects' in value:
+                    return ArchivedDict(self, value['NS.keys'], value['NS.objects'])
+            elif class_name in ('NSArray', 'NSMutableArray', 'NSSet', 'NSMutableSet'):
+                if 'NS.objects' in value:
+                    return ArchivedArray(self, value['NS.objects'])
+            elif class_name in ('NSString', 'NSMutableString'):
+                if 'NS.string' in value:
+                    return value['NS.string']
+            elif class_name == 'NSDate':
+                if 'NS.time' in value:
+                    return _convert_date(value['NS.time'])
+            elif class_name == 'NSUUID':
+                if 'NS.uuidbytes' in value:
+                    try:
+                        return str(UUID(bytes=value['NS.uuidbytes'])).upper()
+                    except (TypeError, ValueError):
+                        return None
+            return ArchivedObject(self, value, class_name)
+        if isinstance(value, (PlistArray, list)):
+            return ArchivedArray(self, value)
+        return value
+
+
+def _convert_date(seconds):
+    if seconds == -63114076800.0: # distantPast
+        return None
+    try:
+        return _cocoa_epoch + datetime.timedelta(seconds=seconds)
+    except (OverflowError, ValueError, TypeError):
+        return None
+
+
+class ArchivedObject(Mapping):
+    '''An archived object, its values resolved when looked up'''
+    def __init__(self, archive, archived, class_name):
+        self._archive = archive
+        self._archived = archived
+        self.class_name = class_name
+
+    def __getitem__(self, key):
+        if key == '$class':
+            raise KeyError(key)
+        return self._archive.resolve(self._archived[key])
+
+    def __contains__(self, key):
+        return key != '$class' and key in self._archived
+
+    def __iter__(self):
+        return (key for key in self._archived if key != '$class')
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return repr(to_python(self))
+
+
+class ArchivedDict(Mapping):
+    '''An archived NSDictionary. The keys are resolved on first access, each value when it is first
+       looked up.'''
+    def __init__(self, archive, keys, values):
+        self._archive = archive
+        self._keys = keys
+        self._values = values
+        self._index = None # key -> archived value
+
+    def _lookup(self):
+        if self._index is None:
+            resolve = self._archive.resolve
+            index = {}
+            for key, value in zip(self._keys, self._values):
+                key = resolve(key)
+                try:
+                    index[key] = value
+                except TypeError: # not hashable
+                    index[str(key)] = value
+            self._index = index
+        return self._index
+
+    def __getitem__(self, key):
+        return self._archive.resolve(self._lookup()[key])
+
+    def __contains__(self, key):
+        return key in self._lookup()
+
+    def __iter__(self):
+        return iter(self._lookup())
+
+    def __len__(self):
+        return len(self._lookup())
+
+    def __repr__(self):
+        return repr(to_python(self))
+
+
+class ArchivedArray(Sequence):
+    '''An archived NSArray or NSSet, its items resolved when looked up'''
+    def __init__(self, archive, items):
+        self._archive = archive
+        self._items = items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._archive.resolve(item) for item in self._items[index]]
+        return self._archive.resolve(self._items[index])
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, (ArchivedArray, PlistArray, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(to_python(self))
+
+
+def to_python(value, _converted=None):
+    '''Returns value with the PlistDict, PlistArray and archived objects in it as plain dicts and
+       lists (objects referenced more than once, cycles included, become the same dict or list)'''
+    value_type = type(value)
+    if value_type in _scalar_types:
+        return value
+    if _converted is None:
+        _converted = {}
+    result = _converted.get(id(value))
+    if result is not None:
+        return result
+    if value_type is PlistDict:
+        result = _converted[id(value)] = {}
+        plist_object, decoded = value._plist.object, value._plist._objects
+        for key, ref in value._refs().items():
+            item = decoded.get(ref, _undefined)
+            if item is _undefined:
+                item = plist_object(ref)
+            result[key] = item if type(item) in _scalar_types else to_python(item, _converted)
+    elif value_type is PlistArray:
+        result = _converted[id(value)] = []
+        plist_object, decoded = value._plist.object, value._plist._objects
+        for ref in value._refs:
+            item = decoded.get(ref, _undefined)
+            if item is _undefined:
+                item = plist_object(ref)
+            result.append(item if type(item) in _scalar_types else to_python(item, _converted))
+    elif isinstance(value, Mapping):
+        result = _converted[id(value)] = {}
+        for key, item in value.items():
+            result[key] = to_python(item, _converted)
+    elif isinstance(value, (ArchivedArray, list)):
+        result = _converted[id(value)] = []
+        result.extend(to_python(item, _converted) for item in value)
+    else:
+        return value
+    return result
+
+
+class PlistCache:
+    '''The plists parsed in the run, by path. An entry is used while the file keeps its
+       modification time and size.'''
+    _entries = OrderedDict() # path -> (mtime_ns, size, root object), least recently used first
+    _cached_bytes = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, path):
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        with cls._lock:
+            entry = cls._entries.get(path)
+            if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                cls._entries.move_to_end(path)
+                return entry[2]
+        root = _parse_plist(path, stat.st_size)
+        if stat.st_size <= cache_size:
+            with cls._lock:
+                old_entry = cls._entries.pop(path, None)
+                if old_entry is not None:
+                    cls._cached_bytes -= old_entry[1]
+                cls._entries[path] = (stat.st_mtime_ns, stat.st_size, root)
+                cls._cached_bytes += stat.st_size
+                while cls._cached_bytes > cache_size:
+                    cls._cached_bytes -= cls._entries.popitem(last=False)[1][1]
+        return root
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._cached_bytes = 0
+
+
+def _parse_plist(path, size):
+    with open(path, 'rb') as f:
+        if size >= mmap_size:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+    if buffer[:8] == b'bplist00':
+        return BinaryPlist(buffer).root
+    return plistlib.loads(buffer[:])
+
+
+def open_plist(path):
+    '''Returns the root object of the plist file at path, parsed once for the run. Dicts and arrays
+       of binary plists come as PlistDict and PlistArray. Raises what plistlib.load raises for
+       files that are not plists; the objects returned are shared, don't change them.'''
+    return PlistCache.get(path)
+
+
+def load_plist(path):
+    '''Returns the root object of the plist file at path as plistlib.load gives it, from the plist
+       parsed for the run'''
+    return to_python(open_plist(path))
+
+
+def open_keyed_archive(path):
+    '''Returns a KeyedArchive of the NSKeyedArchiver plist file at path, parsed once for the run'''
+    return KeyedArchive(open_plist(path))
@@ -0,0 +1,331 @@
+'''Protobuf decoders compiled from blackboxprotobuf typedefs, for decoding many records of the same
+   message (Biome stream records and the like) without blackboxprotobuf walking and copying the
+   typedef for each of them:
+
+       protostuff = decode_message(data, typedef)
+
+   gives the values blackboxprotobuf.decode_message(data, typedef) gives (the types it returns are
+   not built). The decoder of a typedef is compiled on first use and kept for the run, typedefs
+   are taken to be constants.
+
+   With fields, only the listed field paths are decoded, in the same pass over the data. The other
+   fields are skipped without being decoded, which saves most of the work on large records:
+
+       protostuff = decode_message(data, typedef, fields=[('4', '3'), ('5',)])
+
+   gives {'4': {'3': url}, '5': guid}. A field of a path that the typedef doesn't give as a message
+   is decoded whole.
+
+   Anything the compiled decoders don't handle (typedefs with groups, packed or alternative types,
+   fields of an unexpected wire type, malformed data) is decoded by blackboxprotobuf, so the
+   values and errors are always those of blackboxprotobuf.
+'''
+import struct
+
+import blackboxprotobuf
+
+_compiled = {} # (id(typedef), fields) -> (typedef, decoder), the typedef is kept so its id is not reused
+
+_varint, _fixed64, _length_delimited, _start_group, _end_group, _fixed32 = range(6)
+_message = -1 # a length delimited field without typedef that decoded as a message
+
+_struct_types = {
+    'fixed32': (_fixed32, struct.Struct('<I')),
+    'sfixed32': (_fixed32, struct.Struct('<i')),
+    'float': (_fixed32, struct.Struct('<f')),
+    'fixed64': (_fixed64, struct.Struct('<Q')),
+    'sfixed64': (_fixed64, struct.Struct('<q')),
+    'double': (_fixed64, struct.Struct('<d')),
+}
+_typedef_keys = {'type', 'name', 'message_typedef'}
+
+_unpack_fixed32 = _struct_types['fixed32'][1].unpack_from
+_unpack_fixed64 = _struct_types['fixed64'][1].unpack_from
+
+
+class _Unsupported(Exception):
+    '''Data the compiled decoders leave to blackboxprotobuf'''
+
+
+def _read_uvarint(buf, pos):
+    result = buf[pos]
+    pos += 1
+    if result < 0x80:
+        return result, pos
+    result &= 0x7f
+    shift = 7
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result & 0xffffffffffffffff, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError('Too many bytes when decoding varint')
+
+
+def _read_varint(buf, pos):
+    result, pos = _read_uvarint(buf, pos)
+    if result > 0x7fffffffffffffff:
+        result -= 0x10000000000000000
+    return result, pos
+
+
+def _read_svarint(buf, pos):
+    result, pos = _read_uvarint(buf, pos)
+    return (result >> 1) ^ -(result & 1), pos
+
+
+def _read_length(buf, pos):
+    length, pos = _read_varint(buf, pos)
+    if length < 0:
+        raise _Unsupported('Negative length')
+    return pos, pos + length
+
+
+def _read_bytes(buf, pos):
+    pos, end = _read_length(buf, pos)
+    return buf[pos:end], end
+
+
+def _read_str(buf, pos):
+    pos, end = _read_length(buf, pos)
+    return buf[pos:end].decode('utf-8', 'backslashreplace'), end
+
+
+def _decode_anonymous(buf, pos, end, group=False):
+    '''Decodes a message without typedef, guessing the types the way blackboxprotobuf does'''
+    output = {}
+    learned = {}
+    while pos < end:
+        tag, pos = _read_uvarint(buf, pos)
+        wire_type = tag & 7
+        key = str(tag >> 3)
+        if key in output:
+            value, pos = _read_repeat(buf, pos, wire_type, learned[key])
+            values = output[key]
+            if type(values) is list:
+                values.append(value)
+            else:
+                output[key] = [values, value]
+            continue
+        if wire_type == _end_group:
+            if not group:
+                raise ValueError('Found END_GROUP before START_GROUP')
+            return output, pos
+        value, pos = _read_guessed(buf, pos, wire_type)
+        output[key] = value
+        learned[key] = _message if type(value) is dict and wire_type == _length_delimited else wire_type
+    if pos > end:
+        raise ValueError('Invalid Message Length')
+    if group:
+        raise ValueError('Got START_GROUP with no END_GROUP')
+    return output, pos
+
+
+def _read_guessed(buf, pos, wire_type):
+    '''Reads a field that is not in the typedef'''
+    if wire_type == _varint:
+        return _read_varint(buf, pos)
+    if wire_type == _length_delimited:
+        # a message if it decodes as one, bytes otherwise
+        try:
+            start, end = _read_length(buf, pos)
+            return _decode_anonymous(buf, start, end)
+        except _Unsupported:
+            raise
+        except Exception:
+            return _read_bytes(buf, pos)
+    if wire_type == _fixed32:
+        return _unpack_fixed32(buf, pos)[0], pos + 4
+    if wire_type == _fixed64:
+        return _unpack_fixed64(buf, pos)[0], pos + 8
+    if wire_type == _start_group:
+        return _decode_anonymous(buf, pos, len(buf), True)
+    raise ValueError(f'Unknown wire type {wire_type}')
+
+
+def _read_repeat(buf, pos, wire_type, learned_type):
+    '''Reads a repeat of a field that is not in the typedef. blackboxprotobuf reads it as the type
+       it guessed for the first one, learned_type (the wire type, or _message).'''
+    if learned_type == _message or learned_type == _start_group:
+        raise _Unsupported('Repeated message without typedef') # decoded with the typedef learned from the first
+    if wire_type != learned_type:
+        raise ValueError(f'Invalid wiretype {wire_type}, expected {learned_type}')
+    if wire_type == _length_delimited:
+        return _read_bytes(buf, pos)
+    return _read_guessed(buf, pos, wire_type)
+
+
+def _typed_only(values, typedef):
+    '''Whether the decoded values of a message hold fields of typedef only. blackboxprotobuf decodes
+       the repeats of a message field with the typedef it learned from the earlier ones, which is
+       typedef itself when they had no other fields.'''
+    fields = {field_typedef.get('name') or str(number): field_typedef for number, field_typedef in typedef.items()}
+    for key, value in values.items():
+        field_typedef = fields.get(key)
+        if field_typedef is None:
+            return False
+        if field_typedef['type'] == 'message':
+            message_typedef = field_typedef.get('message_typedef') or {}
+            for message_values in value if type(value) is list else (value,):
+                if not _typed_only(message_values, message_typedef):
+                    return False
+    return True
+
+
+def _skip(buf, pos, wire_type):
+    if wire_type == _varint:
+        return _read_uvarint(buf, pos)[1]
+    if wire_type == _length_delimited:
+        return _read_length(buf, pos)[1]
+    if wire_type == _fixed32:
+        return pos + 4
+    if wire_type == _fixed64:
+        return pos + 8
+    raise _Unsupported(f'Skipping wire type {wire_type}')
+
+
+def _field_reader(field_typedef, subfields=None):
+    '''Returns (wire type, reader) for a field of the typedef, reader(buf, pos) returning (value, pos)'''
+    if not set(field_typedef) <= _typedef_keys:
+        raise _Unsupported(f'Typedef keys {sorted(field_typedef)}')
+    field_type = field_typedef['type']
+    if field_type == 'message':
+        decode = _message_decoder(field_typedef.get('message_typedef') or {}, subfields)
+        def read_message(buf, pos):
+            pos, end = _read_length(buf, pos)
+            return decode(buf, pos, end)
+        return _length_delimited, read_message
+    if field_type in _struct_types:
+        wire_type, field_struct = _struct_types[field_type]
+        unpack_from, size = field_struct.unpack_from, field_struct.size
+        return wire_type, lambda buf, pos: (unpack_from(buf, pos)[0], pos + size)
+    readers = {'int': (_varint, _read_varint), 'uint': (_varint, _read_uvarint), 'sint': (_varint, _read_svarint),
+               'bytes': (_length_delimited, _read_bytes), 'str': (_length_delimited, _read_str)}
+    if field_type not in readers:
+        raise _Unsupported(f'Type {field_type}')
+    return readers[field_type]
+
+
+def _message_decoder(typedef, fields=None):
+    '''Returns decode(buf, pos, end) -> (values, pos) for a message of typedef. fields maps the field
+       numbers to decode to the field paths wanted under them (see _field_tree), None decodes all
+       fields.'''
+    typed = {} # tag -> (key, reader, typedef of a message field to check repeats against)
+    typed_numbers = set()
+    for number, field_typedef in typedef.items():
+        number = str(number)
+        if not number.isdigit():
+            raise _Unsupported(f'Field number {number}')
+        typed_numbers.add(number)
+        if fields is not None and number not in fields:
+            continue
+        wire_type, reader = _field_reader(field_typedef, fields[number] if fields is not None else None)
+        message_typedef = None
+        if field_typedef['type'] == 'message' and fields is None:
+            message_typedef = field_typedef.get('message_typedef') or {}
+        typed[int(number) << 3 | wire_type] = (field_typedef.get('name') or number, reader, message_typedef)
+    named = any(key not in typed_numbers for key, reader, message_typedef in typed.values())
+
+    def decode(buf, pos, end):
+        output = {}
+        learned = {}
+        while pos < end:
+            tag = buf[pos]
+            if tag < 0x80:
+                pos += 1
+            else:
+                tag, pos = _read_uvarint(buf, pos)
+            field = typed.get(tag)
+            if field is not None:
+                key, reader, message_typedef = field
+                value, pos = reader(buf, pos)
+                if key not in output:
+                    output[key] = value
+                    continue
+                if named:
+                    raise _Unsupported(f'Repeated field {key}')
+                values = output[key]
+                if message_typedef is not None and not _typed_only(
+                        values[-1] if type(values) is list else values, message_typedef):
+                    raise _Unsupported(f'Repeated message {key}')
+            else:
+                key = str(tag >> 3)
+                wire_type = tag & 7
+                if fields is not None and key not in fields:
+                    pos = _skip(buf, pos, wire_type)
+                    continue
+                if key in typed_numbers:
+                    raise _Unsupported(f'Wire type {wire_type} for field {key}')
+                if key not in output:
+                    if wire_type == _end_group:
+                        raise ValueError('Found END_GROUP before START_GROUP')
+                    value, pos = _read_guessed(buf, pos, wire_type)
+                    output[key] = value
+                    learned[key] = _message if type(value) is dict and wire_type == _length_delimited else wire_type
+                    continue
+                value, pos = _read_repeat(buf, pos, wire_type, learned[key])
+                values = output[key]
+            if type(values) is list:
+                values.append(value)
+            else:
+                output[key] = [values, value]
+        if pos > end:
+            raise ValueError('Invalid Message Length')
+        return output, pos
+    return decode
+
+
+def _field_tree(fields):
+    '''{number: {number: ...}} of the field paths, None for the fields wanted whole'''
+    tree = {}
+    for path in fields:
+        if isinstance(path, str):
+            path = (path,)
+        node = tree
+        for number in path[:-1]:
+            number = str(number)
+            if number in node and node[number] is None:
+                break # the whole field is already wanted
+            node = node.setdefault(number, {})
+        else:
+            node[str(path[-1])] = None
+    return tree
+
+
+def compile_typedef(typedef=None, fields=None):
+    '''Returns decode(data) -> values of the messages of typedef (None for messages without typedef),
+       only decoding the field paths in fields (tuples of field numbers) when given'''
+    if typedef is None:
+        typedef = {}
+    fallback_typedef = typedef or None
+    def fall_back(data):
+        if fallback_typedef is None:
+            return blackboxprotobuf.decode_message(data)[0]
+        return blackboxprotobuf.decode_message(data, fallback_typedef)[0]
+
+    try:
+        decode_fields = _message_decoder(typedef, _field_tree(fields) if fields is not None else None)
+    except _Unsupported:
+        return fall_back
+
+    def decode(data):
+        try:
+            return decode_fields(data, 0, len(data))[0]
+        except Exception:
+            return fall_back(data)
+    return decode
+
+
+def decode_message(data, typedef=None, fields=None):
+    '''Returns the values of a protobuf message, as blackboxprotobuf.decode_message(data, typedef)[0]
+       does, decoded with the compiled decoder of typedef'''
+    if fields is not None:
+        fields = tuple(path if isinstance(path, str) else tuple(path) for path in fields)
+    key = (id(typedef), fields)
+    compiled = _compiled.get(key)
+    if compiled is None or compiled[0] is not typedef:
+        compiled = _compiled[key] = (typedef, compile_typedef(typedef, fields))
+    return compiled[1](data)
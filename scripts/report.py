@@ -1,13 +1,19 @@
+import base64
+import hashlib
 import html
+import json
 import os
 import pathlib
+import re
 import shutil
 import sqlite3
 import sys
+import threading
 
 from collections import OrderedDict
 from scripts.html_parts import *
-from scripts.ilapfuncs import logfunc
+from scripts.ilapfuncs import logfunc, flush_logs
+from scripts.listing_cache import user_cache_folder
 from scripts.version_info import ileapp_version, ileapp_contributors
 
 # Icon Mappings Dictionary
@@ -1039,6 +1045,24 @@ def get_search_mode_categories():
 search_set = get_search_mode_categories()
 
 
+_report_pages = [] # .temphtml pages created by ArtifactHtmlReport, see register_report_page
+_report_pages_lock = threading.Lock()
+
+def register_report_page(path):
+    '''Records an artifact page (.temphtml file) as it is created, so generate_report knows the pages of
+       the report without searching the report folder for them'''
+    with _report_pages_lock:
+        _report_pages.append(os.path.abspath(path))
+
+def get_report_pages(reportfolderbase):
+    '''Returns the registered pages under reportfolderbase that exist, ordered by folder then name,
+       and removes them from the registry'''
+    base = os.path.join(os.path.abspath(reportfolderbase), '')
+    with _report_pages_lock:
+        pages = [path for path in _report_pages if path.startswith(base)]
+        _report_pages[:] = [path for path in _report_pages if not path.startswith(base)]
+    return sorted(set(path for path in pages if os.path.exists(path)), key=os.path.split)
+
 def generate_report(reportfolderbase, time_in_secs, time_HMS, extraction_type, image_input_path, casedata):
     control = None
     side_heading = \
@@ -1061,49 +1085,35 @@ def generate_report(reportfolderbase, time_in_secs, time_HMS, extraction_type, i
     # Get all files
     side_list = OrderedDict() # { Category1 : [path1, path2, ..], Cat2:[..] } Dictionary containing paths as values, key=category
 
-    for root, dirs, files in sorted(os.walk(reportfolderbase)):
-        files = sorted(files)
-        for file in files:
-            if file.endswith(".temphtml"):
-                fullpath = (os.path.join(root, file))
-                head, tail = os.path.split(fullpath)
-                p = pathlib.Path(fullpath)
-                SectionHeader = (p.parts[-2])
-                if SectionHeader == '_elements':
-                    pass
-                else:
-                    if control == SectionHeader:
-                        side_list[SectionHeader].append(fullpath)
-                        icon = get_icon_name(SectionHeader, tail.replace(".temphtml", ""))
-                        nav_list_data += list_item.format('', tail.replace(".temphtml", ".html"), icon,
-                                                          tail.replace(".temphtml", ""))
-                    else:
-                        control = SectionHeader
-                        side_list[SectionHeader] = []
-                        side_list[SectionHeader].append(fullpath)
-                        nav_list_data += side_heading.format(SectionHeader)
-                        icon = get_icon_name(SectionHeader, tail.replace(".temphtml", ""))
-                        nav_list_data += list_item.format('', tail.replace(".temphtml", ".html"), icon,
-                                                          tail.replace(".temphtml", ""))
+    for fullpath in get_report_pages(reportfolderbase):
+        head, tail = os.path.split(fullpath)
+        p = pathlib.Path(fullpath)
+        SectionHeader = (p.parts[-2])
+        if SectionHeader == '_elements':
+            pass
+        else:
+            if control == SectionHeader:
+                side_list[SectionHeader].append(fullpath)
+                icon = get_icon_name(SectionHeader, tail.replace(".temphtml", ""))
+                nav_list_data += list_item.format('', tail.replace(".temphtml", ".html"), icon,
+                                                  tail.replace(".temphtml", ""))
+            else:
+                control = SectionHeader
+                side_list[SectionHeader] = []
+                side_list[SectionHeader].append(fullpath)
+                nav_list_data += side_heading.format(SectionHeader)
+                icon = get_icon_name(SectionHeader, tail.replace(".temphtml", ""))
+                nav_list_data += list_item.format('', tail.replace(".temphtml", ".html"), icon,
+                                                  tail.replace(".temphtml", ""))
 
-    # Now that we have all the file paths, start writing the files
+    # Now that we have all the file paths, move the pages to the report folder. Their sidebar is
+    # loaded from _elements/nav.js, so their content is not read or changed here
 
     for category, path_list in side_list.items():
         for path in path_list:
             old_filename = os.path.basename(path)
             filename = old_filename.replace(".temphtml", ".html")
-            # search for it in nav_list_data, then mark that one as 'active' tab
-            active_nav_list_data = mark_item_active(nav_list_data, filename) + nav_bar_script
-            artifact_data = get_file_content(path)
-
-            # Now write out entire html page for artifact
-            f = open(os.path.join(reportfolderbase, filename), 'w', encoding='utf8')
-            artifact_data = insert_sidebar_code(artifact_data, active_nav_list_data, path)
-            f.write(artifact_data)
-            f.close()
-
-            # Now delete .temphtml
-            os.remove(path)
+            os.replace(path, os.path.join(reportfolderbase, filename))
             # If dir is empty, delete it
             try:
                 os.rmdir(os.path.dirname(path))
@@ -1114,30 +1124,96 @@ def generate_report(reportfolderbase, time_in_secs, time_HMS, extraction_type, i
     create_index_html(reportfolderbase, time_in_secs, time_HMS, extraction_type, image_input_path, nav_list_data, casedata)
     elements_folder = os.path.join(reportfolderbase, '_elements')
     os.mkdir(elements_folder)
-    __location__ = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(elements_folder, 'nav.js'), 'w', encoding='utf8') as f:
+        f.write(nav_bar_data_script.format(json.dumps(nav_list_data)))
+    copy_report_assets(elements_folder)
 
-    def copy_no_perm(src, dst, *, follow_symlinks=True):
-        if not os.path.isdir(dst):
-            shutil.copyfile(src, dst)
-        return dst
 
-    try:
-        shutil.copyfile(os.path.join(__location__, "logo.jpg"), os.path.join(elements_folder, "logo.jpg"))
-        shutil.copyfile(os.path.join(__location__, "dashboard.css"), os.path.join(elements_folder, "dashboard.css"))
-        shutil.copyfile(os.path.join(__location__, "feather.min.js"), os.path.join(elements_folder, "feather.min.js"))
-        shutil.copyfile(os.path.join(__location__, "dark-mode.css"), os.path.join(elements_folder, "dark-mode.css"))
-        shutil.copyfile(os.path.join(__location__, "dark-mode-switch.js"),
-                        os.path.join(elements_folder, "dark-mode-switch.js"))
-        shutil.copyfile(os.path.join(__location__, "chats.css"), os.path.join(elements_folder, "chats.css"))
-        shutil.copytree(os.path.join(__location__, "MDB-Free_4.13.0"), os.path.join(elements_folder, 'MDB-Free_4.13.0'),
-                        copy_function=copy_no_perm)
-        
-        
-    except shutil.Error:
-        print("shutil reported an error. Maybe due to recursive directory copying.")
-        if os.path.exists(os.path.join(elements_folder, 'MDB-Free_4.13.0')):
-            print("_elements folder seems fine. Probably nothing to worry about")
+# Stylesheets and scripts of the report pages in load order, concatenated into _elements/ileapp.css and
+# _elements/ileapp.js. Paths are relative to the scripts folder.
+report_css_assets = [
+    'dark-mode.css',
+    'MDB-Free_4.13.0/css/bootstrap.min.css',
+    'MDB-Free_4.13.0/css/mdb.min.css',
+    'dashboard.css',
+    'chats.css',
+    'MDB-Free_4.13.0/css/addons/datatables.min.css',
+]
+report_js_assets = [
+    'MDB-Free_4.13.0/js/jquery.min.js',
+    'MDB-Free_4.13.0/js/popper.min.js',
+    'MDB-Free_4.13.0/js/bootstrap.min.js',
+    'MDB-Free_4.13.0/js/mdb.min.js',
+    'MDB-Free_4.13.0/js/addons/datatables.min.js',
+]
+# Copied as they are, feather.min.js and dark-mode-switch.js run before the end of the page
+report_copied_assets = ['logo.jpg', 'feather.min.js', 'dark-mode-switch.js']
 
+def _css_bundle(scripts_folder):
+    '''Concatenates report_css_assets. Images they refer to are inlined as data URIs, @import rules are
+       moved to the top (they are ignored anywhere else) and comments other than licenses are removed.'''
+    imports = []
+    parts = []
+    for asset in report_css_assets:
+        asset_folder = os.path.dirname(os.path.join(scripts_folder, asset))
+        with open(os.path.join(scripts_folder, asset), 'r', encoding='utf8') as f:
+            css = f.read()
+
+        def inline_image(match):
+            image_path = os.path.normpath(os.path.join(asset_folder, match.group(1)))
+            mime_type = 'image/svg+xml' if image_path.endswith('.svg') else 'image/png'
+            with open(image_path, 'rb') as image:
+                return f'url(data:{mime_type};base64,{base64.b64encode(image.read()).decode("ascii")})'
+
+        css = re.sub(r'url\((\.\./img/[^)"\']+)\)', inline_image, css)
+        css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+        css = re.sub(r'@charset[^;]*;', '', css)
+        imports.extend(re.findall(r'@import[^;]*;', css))
+        css = re.sub(r'@import[^;]*;', '', css)
+        parts.append(re.sub(r'\n\s*', '\n', css).strip())
+    return '@charset "UTF-8";\n' + '\n'.join(imports + parts) + '\n'
+
+def _js_bundle(scripts_folder):
+    '''Concatenates report_js_assets, without their (not shipped) source map references'''
+    parts = []
+    for asset in report_js_assets:
+        with open(os.path.join(scripts_folder, asset), 'r', encoding='utf8') as f:
+            parts.append(re.sub(r'//# sourceMappingURL=\S*', '', f.read()).strip())
+    return '\n;\n'.join(parts) + '\n'
+
+def _write_bundles(folder, scripts_folder):
+    for name, build in (('ileapp.css', _css_bundle), ('ileapp.js', _js_bundle)):
+        temp_path = os.path.join(folder, f'{name}.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf8') as f:
+            f.write(build(scripts_folder))
+        os.replace(temp_path, os.path.join(folder, name))
+
+def get_asset_bundles():
+    '''Returns the folder holding ileapp.css and ileapp.js. They are built once per iLEAPP version
+       (and change of the asset files) in the user cache folder.'''
+    scripts_folder = os.path.dirname(os.path.abspath(__file__))
+    fingerprint = hashlib.sha1()
+    for asset in report_css_assets + report_js_assets:
+        stat_result = os.stat(os.path.join(scripts_folder, asset))
+        fingerprint.update(f'{asset}:{stat_result.st_size}:{stat_result.st_mtime_ns};'.encode('utf8'))
+    bundle_folder = os.path.join(user_cache_folder(), 'report_assets', f'{ileapp_version}_{fingerprint.hexdigest()[:12]}')
+    if not all(os.path.exists(os.path.join(bundle_folder, name)) for name in ('ileapp.css', 'ileapp.js')):
+        os.makedirs(bundle_folder, exist_ok=True)
+        _write_bundles(bundle_folder, scripts_folder)
+    return bundle_folder
+
+def copy_report_assets(elements_folder):
+    '''Puts the stylesheet and script bundles and the other assets of the report pages in elements_folder'''
+    scripts_folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        bundle_folder = get_asset_bundles()
+        for name in ('ileapp.css', 'ileapp.js'):
+            shutil.copyfile(os.path.join(bundle_folder, name), os.path.join(elements_folder, name))
+    except OSError as ex:
+        logfunc(f'Could not use the cached report assets ({ex}), building them for this report')
+        _write_bundles(elements_folder, scripts_folder)
+    for name in report_copied_assets:
+        shutil.copyfile(os.path.join(scripts_folder, name), os.path.join(elements_folder, name))
 
 def get_file_content(path):
     f = open(path, 'r', encoding='utf8')
@@ -1174,6 +1250,7 @@ def create_index_html(reportfolderbase, time_in_secs, time_HMS, extraction_type,
         """
 
     # Get script run log (this will be tab2)
+    flush_logs() # the logs are written in the background
     devinfo_files_path = os.path.join(reportfolderbase, 'Script Logs', 'DeviceInfo.html')
     tab2_content = get_file_content(devinfo_files_path)
 
@@ -0,0 +1,266 @@
+'''Run-level store of artifact results, _Results/results.db in the report folder.
+
+   A plugin hands its rows to store_results once, instead of passing the same data_list to
+   ArtifactHtmlReport, tsv(), timeline() and kmlgen() in turn:
+
+       store_results(report_folder, 'Query Predictions', data_headers, data_list, file_found,
+                     tsvname='Query Predictions', tlactivity='Query Predictions')
+
+   The rows go to a table of their own (one per artifact, columns named after the headers), and
+   the html report, TSV, timeline and KML outputs are written from that table when the run ends
+   (ResultStore.close_all). The database is kept with the report for SQL queries over all results.
+
+   Columns are typed (INTEGER, REAL, TEXT, BLOB, BOOLEAN) from the first rows of the artifact. A
+   column that gets values of other types later on is changed to an untyped column, so the values
+   are always read back as they were stored. Values sqlite can't hold (datetime objects and the
+   like) are stored as their str(), which is how all outputs write them anyway.
+'''
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+
+from scripts.artifact_report import ArtifactHtmlReport
+from scripts.ilapfuncs import logfunc, tsv, timeline, kmlgen, unique_column_names
+
+chunk_rows = 1000 # rows checked and inserted at a time, the column types are taken from the first chunk
+
+
+class _TypeMismatch(Exception):
+    def __init__(self, column):
+        self.column = column
+
+
+def _kind(value):
+    '''Declared column type of a value, '' for values stored as their str()'''
+    if isinstance(value, bool):
+        return 'BOOLEAN'
+    if isinstance(value, int):
+        return 'INTEGER' if -2 ** 63 <= value < 2 ** 63 else ''
+    if isinstance(value, float):
+        return 'REAL' if math.isfinite(value) else '' # sqlite stores NaN as NULL
+    if isinstance(value, str):
+        return 'TEXT'
+    if type(value) is bytes:
+        return 'BLOB'
+    return ''
+
+
+def _store_value(value, kind):
+    '''value as stored in a column of type kind'''
+    if value is None:
+        return None
+    value_kind = _kind(value)
+    if not kind:
+        return value if value_kind in ('INTEGER', 'REAL', 'TEXT', 'BLOB') else str(value)
+    if value_kind != kind:
+        raise _TypeMismatch(kind)
+    return value
+
+
+def _column_kinds(rows, width):
+    kinds = []
+    for column in range(width):
+        value_kinds = set(_kind(row[column]) for row in rows if row[column] is not None)
+        kinds.append(value_kinds.pop() if len(value_kinds) == 1 else '')
+    return kinds
+
+
+def _chunks(rows, width):
+    '''Yields lists of up to chunk_rows rows, each cut or padded with None to width'''
+    chunk = []
+    for row in rows:
+        row = list(row)[:width]
+        row.extend([None] * (width - len(row)))
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ResultStore:
+    '''The results database of a report folder. Plugins may store results from several threads
+       (--jobs), the connection is used under a lock.'''
+    _stores = {} # report folder base -> store
+    _stores_lock = threading.Lock()
+
+    def __init__(self, report_folder_base):
+        self.db_folder = os.path.join(report_folder_base, '_Results')
+        os.makedirs(self.db_folder, exist_ok=True)
+        self.db_path = os.path.join(self.db_folder, 'results.db')
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.execute('''PRAGMA journal_mode = WAL''')
+        self.db.execute('''PRAGMA synchronous = OFF''')
+        self.db.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS artifacts(
+            table_name TEXT PRIMARY KEY, artifact_name TEXT, report_folder TEXT, report_file_name TEXT,
+            description TEXT, source_path TEXT, headers TEXT, column_types TEXT, row_count INTEGER,
+            tsvname TEXT, tlactivity TEXT, kmlactivity TEXT, html_escape INTEGER, html_no_escape TEXT)
+            '''
+        )
+        self.db.commit()
+
+    @classmethod
+    def for_report_folder(cls, report_folder):
+        '''Returns the store of the report a category folder belongs to'''
+        report_folder_base = os.path.dirname(report_folder.rstrip('/').rstrip('\\'))
+        with cls._stores_lock:
+            store = cls._stores.get(report_folder_base)
+            if store is None:
+                store = cls._stores[report_folder_base] = cls(report_folder_base)
+            return store
+
+    @classmethod
+    def close_all(cls):
+        '''Writes the outputs of all stored artifacts and closes the stores'''
+        with cls._stores_lock:
+            stores = list(cls._stores.values())
+            cls._stores.clear()
+        for store in stores:
+            store.write_outputs()
+            store.close()
+
+    def close(self):
+        with self._lock:
+            self.db.commit()
+            self.db.close()
+
+    def _new_table_name(self, artifact_name):
+        base_name = re.sub(r'\W+', '_', artifact_name).strip('_') or 'artifact'
+        table_name, number = base_name, 2
+        while self.db.execute('SELECT 1 FROM sqlite_master WHERE name=? COLLATE NOCASE', (table_name,)).fetchone():
+            table_name, number = f'{base_name}_{number}', number + 1
+        return table_name
+
+    def _create_table(self, table_name, names, kinds):
+        columns = ', '.join(f'{_quote(name)} {kind}'.rstrip() for name, kind in zip(names, kinds))
+        self.db.execute(f'CREATE TABLE {_quote(table_name)}({columns})')
+
+    def _untype_column(self, table_name, names, kinds, column):
+        '''Rebuilds the table with column untyped, booleans already stored in it become 'True'/'False' text'''
+        temp_name = table_name + '_retype'
+        old_kind, kinds[column] = kinds[column], ''
+        if not self.db.in_transaction:
+            self.db.execute('BEGIN') # so a rollback also drops the new table
+        self._create_table(temp_name, names, kinds)
+        selected = [_quote(name) for name in names]
+        if old_kind == 'BOOLEAN':
+            quoted = selected[column]
+            selected[column] = f"CASE {quoted} WHEN 1 THEN 'True' WHEN 0 THEN 'False' ELSE {quoted} END"
+        self.db.execute(f'INSERT INTO {_quote(temp_name)} SELECT {", ".join(selected)} FROM {_quote(table_name)} ORDER BY rowid')
+        self.db.execute(f'DROP TABLE {_quote(table_name)}')
+        self.db.execute(f'ALTER TABLE {_quote(temp_name)} RENAME TO {_quote(table_name)}')
+
+    def _insert_chunk(self, table_name, names, kinds, chunk):
+        insert = f'INSERT INTO {_quote(table_name)} VALUES({",".join("?" * len(names))})'
+        while True:
+            try:
+                values = [[_store_value(value, kind) for value, kind in zip(row, kinds)] for row in chunk]
+                break
+            except _TypeMismatch:
+                # find the first column that does not hold its type, untype it and check the chunk again
+                for column, kind in enumerate(kinds):
+                    if kind and any(value is not None and _kind(value) != kind for value in (row[column] for row in chunk)):
+                        self._untype_column(table_name, names, kinds, column)
+                        break
+        self.db.executemany(insert, values)
+
+    def add(self, report_folder, artifact_name, data_headers, data_list, source_path, report_file_name=None,
+            description='', tsvname=None, tlactivity=None, kmlactivity=None, html_escape=True, html_no_escape=()):
+        '''Stores the rows of data_list (any iterable of rows), returns the number of rows stored.
+           Rows are cut or padded with None to the number of headers. The rows are read from
+           data_list without holding the lock, which is only taken to insert each chunk. When
+           anything fails, nothing of the artifact is kept and the exception is raised again.'''
+        names = unique_column_names(data_headers)
+        width = len(names)
+        row_count = 0
+        table_name = kinds = None
+        try:
+            for chunk in _chunks(data_list, width):
+                with self._lock:
+                    if table_name is None:
+                        kinds = _column_kinds(chunk, width)
+                        new_table_name = self._new_table_name(artifact_name)
+                        self._create_table(new_table_name, names, kinds)
+                        table_name = new_table_name
+                    self._insert_chunk(table_name, names, kinds, chunk)
+                    # other threads commit with the same connection, so no chunk is left pending
+                    self.db.commit()
+                row_count += len(chunk)
+            if not row_count:
+                return 0
+            with self._lock:
+                self.db.execute('INSERT INTO artifacts VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)', (
+                    table_name, artifact_name, report_folder, report_file_name or artifact_name, description,
+                    str(source_path), json.dumps([str(header) for header in data_headers]), json.dumps(kinds),
+                    row_count, tsvname, tlactivity, kmlactivity, int(html_escape), json.dumps(list(html_no_escape))))
+                self.db.commit()
+        except Exception:
+            with self._lock:
+                self.db.rollback()
+                if table_name is not None:
+                    self.db.execute(f'DROP TABLE IF EXISTS {_quote(table_name)}')
+                    self.db.commit()
+            raise
+        return row_count
+
+    def rows(self, table_name):
+        '''Yields the rows of an artifact table as tuples, in the order they were stored'''
+        with self._lock:
+            kinds = json.loads(self.db.execute('SELECT column_types FROM artifacts WHERE table_name=?',
+                                               (table_name,)).fetchone()[0])
+            cursor = self.db.execute(f'SELECT * FROM {_quote(table_name)} ORDER BY rowid')
+        bool_columns = [column for column, kind in enumerate(kinds) if kind == 'BOOLEAN']
+        for row in cursor:
+            if bool_columns:
+                row = list(row)
+                for column in bool_columns:
+                    if row[column] is not None:
+                        row[column] = bool(row[column])
+            yield tuple(row)
+
+    def write_outputs(self):
+        '''Writes the html report, TSV, timeline and KML outputs of every stored artifact'''
+        with self._lock:
+            artifacts = self.db.execute(
+                '''SELECT table_name, artifact_name, report_folder, report_file_name, description, source_path, headers,
+                tsvname, tlactivity, kmlactivity, html_escape, html_no_escape FROM artifacts ORDER BY rowid''').fetchall()
+        for (table_name, artifact_name, report_folder, report_file_name, description, source_path, headers,
+             tsvname, tlactivity, kmlactivity, html_escape, html_no_escape) in artifacts:
+            data_headers = tuple(json.loads(headers))
+            try:
+                report = ArtifactHtmlReport(artifact_name)
+                report.start_artifact_report(report_folder, report_file_name, description)
+                report.add_script()
+                report.write_artifact_data_table(data_headers, self.rows(table_name), source_path,
+                                                 html_escape=bool(html_escape), html_no_escape=json.loads(html_no_escape))
+                report.end_artifact_report()
+                if tsvname:
+                    tsv(report_folder, data_headers, self.rows(table_name), tsvname)
+                if tlactivity:
+                    timeline(report_folder, tlactivity, self.rows(table_name), data_headers)
+                if kmlactivity:
+                    kmlgen(report_folder, kmlactivity, self.rows(table_name), data_headers)
+            except Exception as ex:
+                logfunc(f'Error writing the outputs of {artifact_name} from {self.db_path}: {ex}')
+
+
+def store_results(report_folder, artifact_name, data_headers, data_list, source_path, report_file_name=None,
+                  description='', tsvname=None, tlactivity=None, kmlactivity=None, html_escape=True, html_no_escape=()):
+    '''Stores the rows of an artifact in the results database of the report. Its html report (named
+       report_file_name, artifact_name by default) and, when their names are given, its TSV, timeline
+       and KML exports are written from the database at the end of the run. Returns the number of
+       rows stored; nothing is written for an artifact without rows.'''
+    return ResultStore.for_report_folder(report_folder).add(
+        report_folder, artifact_name, data_headers, data_list, source_path, report_file_name, description,
+        tsvname, tlactivity, kmlactivity, html_escape, html_no_escape)
@@ -1,72 +1,538 @@
 import time as timex
-import fnmatch
+import errno
 import os
+import re
 import tarfile
+import threading
+import types
 
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from scripts.ilapfuncs import *
-from shutil import copyfile
+from shutil import copyfile, copyfileobj
 from zipfile import ZipFile
 
+from bisect import bisect_left
 from fnmatch import _compile_pattern
-from functools import lru_cache
+from functools import lru_cache, wraps
 
 from scripts.builds_ids import get_root_path_from_domain
+from scripts.listing_cache import DirListing, ListingCache
 normcase = lru_cache(maxsize=None)(os.path.normcase)
 
+@lru_cache(maxsize=None)
+def _glob_literals(filepattern):
+    '''Returns (prefix, suffix, segments) for a normcased glob, where prefix and suffix are the
+       literal text before the first and after the last wildcard, and segments are all the literal
+       runs in between. Any string matching the glob must start with prefix, end with suffix and
+       contain every segment. [...] sets are treated as wildcards, so this is never too strict.
+    '''
+    bracket = filepattern.find('[')
+    if bracket >= 0:
+        closing = filepattern.rfind(']')
+        if closing > bracket:
+            filepattern = filepattern[:bracket] + '*' + filepattern[closing + 1:]
+        else:
+            filepattern = filepattern[:bracket] + '*'
+    pieces = re.split(r'[*?]', filepattern)
+    segments = tuple(piece for piece in pieces if piece)
+    return pieces[0], pieces[-1], segments
+
+class _PathIndex:
+    '''Index over a listing of paths, so that a glob only has to be matched against a small set of
+       candidates instead of every path. Paths are bucketed by file name, by extension and, for
+       listings in depth-first order (like the one FileSeekerDir builds), by the names of the
+       folders they are under. Listings without entries for the folders themselves (like the
+       files of an iTunes backup, sorted depth-first) take the folders from the paths, and also
+       index them by their full path, so a glob starting with a literal folder path only has to be
+       matched against the paths under it.
+    '''
+    def __init__(self, paths, directory='', depth_first=False, root='root/', dir_entries=True):
+        self._paths = paths
+        self._root = normcase(root) # prepended to paths before matching
+        self._sep = normcase('/')
+        self._by_name = {}
+        self._by_ext = {}
+        self._dir_ranges = {}
+        self._dir_paths = None if dir_entries else {} # folder path -> (start, end), without dir_entries only
+        self._sorted_names = None
+        self._sorted_dir_names = None
+        self._ancestor_names = set(part for part in normcase(directory).split(self._sep) if part)
+        self._depth_first = depth_first # folder ranges (and name prefixes) can only be used for these
+        if depth_first and not dir_entries:
+            self._build_from_parents()
+        else:
+            self._build(depth_first)
+
+    def _build(self, depth_first):
+        sep = self._sep
+        by_name = self._by_name
+        by_ext = self._by_ext
+        open_dirs = [] # (prefix, name, start) for folders whose subtree is still being listed
+        for index, path in enumerate(self._paths):
+            normalized = os.path.normcase(path)
+            name = normalized.rpartition(sep)[2]
+            by_name.setdefault(name, []).append(index)
+            if '.' in name:
+                by_ext.setdefault(name.rpartition('.')[2], []).append(index)
+            if depth_first:
+                while open_dirs and not normalized.startswith(open_dirs[-1][0]):
+                    self._close_dir(open_dirs.pop(), index)
+                open_dirs.append((normalized + sep, name, index + 1))
+        end = len(self._paths)
+        while open_dirs:
+            self._close_dir(open_dirs.pop(), end)
+
+    def _build_from_parents(self):
+        sep = self._sep
+        by_name = self._by_name
+        by_ext = self._by_ext
+        open_dirs = [] # (path, name, start) for the folders of the previous path, outermost first
+        for index, path in enumerate(self._paths):
+            parts = os.path.normcase(path).split(sep)
+            name = parts[-1]
+            by_name.setdefault(name, []).append(index)
+            if '.' in name:
+                by_ext.setdefault(name.rpartition('.')[2], []).append(index)
+            depth = 0
+            while depth < len(open_dirs) and depth < len(parts) - 1 and open_dirs[depth][1] == parts[depth]:
+                depth += 1
+            while len(open_dirs) > depth:
+                self._close_dir(open_dirs.pop(), index)
+            for depth in range(depth, len(parts) - 1):
+                open_dirs.append((sep.join(parts[:depth + 1]), parts[depth], index))
+        end = len(self._paths)
+        while open_dirs:
+            self._close_dir(open_dirs.pop(), end)
+
+    def _close_dir(self, open_dir, end):
+        path, name, start = open_dir
+        if end > start:
+            self._dir_ranges.setdefault(name, []).append((start, end))
+            if self._dir_paths is not None:
+                self._dir_paths[path] = (start, end)
+
+    def _dir_candidates(self, name):
+        '''Returns sorted, non overlapping (start, end) ranges of paths under folders named name'''
+        if name in self._ancestor_names:
+            return [(0, len(self._paths))]
+        merged = []
+        for start, end in sorted(self._dir_ranges.get(name, [])):
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _prefix_candidates(self, prefix):
+        '''Returns indexes of paths with a file or folder name that starts with prefix'''
+        if any(name.startswith(prefix) for name in self._ancestor_names):
+            return range(len(self._paths))
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._by_name)
+            self._sorted_dir_names = sorted(self._dir_ranges)
+        indexes = set()
+        names = self._sorted_names
+        position = bisect_left(names, prefix)
+        while position < len(names) and names[position].startswith(prefix):
+            indexes.update(self._by_name[names[position]])
+            position += 1
+        names = self._sorted_dir_names
+        position = bisect_left(names, prefix)
+        while position < len(names) and names[position].startswith(prefix):
+            for start, end in self._dir_ranges[names[position]]:
+                indexes.update(range(start, end))
+            position += 1
+        return sorted(indexes)
+
+    def _candidates(self, filepattern):
+        '''Returns the smallest known superset of indexes of paths that can match filepattern'''
+        sep = self._sep
+        prefix, suffix, segments = _glob_literals(filepattern)
+        options = []
+        if self._dir_paths is not None and prefix.startswith(self._root) and sep in prefix[len(self._root):]:
+            # every match is under the folder the literal start of the glob names
+            folder = prefix[len(self._root):].rpartition(sep)[0]
+            options.append([self._dir_paths[folder]] if folder in self._dir_paths else [])
+        if sep in suffix:
+            name = suffix.rpartition(sep)[2]
+            if name:
+                options.append(self._by_name.get(name, []))
+        if '.' in suffix:
+            ext = suffix.rpartition('.')[2]
+            if ext and sep not in ext: # otherwise the last '.' is in a folder name
+                options.append(self._by_ext.get(ext, []))
+        for segment in segments if self._depth_first else ():
+            parts = segment.split(sep)
+            for name in parts[1:-1]:
+                if name:
+                    options.append(self._dir_candidates(name))
+        best = None
+        best_size = len(self._paths)
+        for option in options:
+            if option and isinstance(option[0], tuple):
+                size = sum(end - start for start, end in option)
+            else:
+                size = len(option)
+            if size < best_size:
+                best, best_size = option, size
+        if best_size > 1000 and self._depth_first:
+            # a name followed by a wildcard is the start of a file or folder name
+            for segment in segments[:-1] if suffix else segments:
+                parts = segment.split(sep)
+                if len(parts) > 1 and parts[-1]:
+                    option = self._prefix_candidates(parts[-1])
+                    if len(option) < best_size:
+                        best, best_size = option, len(option)
+        if best is None:
+            return range(len(self._paths))
+        if best and isinstance(best[0], tuple):
+            return (index for start, end in best for index in range(start, end))
+        return best
+
+    def search(self, filepattern, return_on_first_hit=False):
+        '''Returns paths matching filepattern, in listing order'''
+        filepattern = normcase(filepattern)
+        pat = _compile_pattern(filepattern)
+        root = self._root
+        prefix, suffix, segments = _glob_literals(filepattern)
+        longest = max(segments, key=len, default='')
+        paths = self._paths
+        pathlist = []
+        for index in self._candidates(filepattern):
+            item = paths[index]
+            normalized = root + os.path.normcase(item)
+            if not normalized.startswith(prefix) or not normalized.endswith(suffix) or longest not in normalized:
+                continue
+            if pat(normalized) is not None:
+                pathlist.append(item)
+                if return_on_first_hit:
+                    break
+        return pathlist
+
+class _PatternSet:
+    '''Matches paths against many globs at once, so a listing only has to be walked a single time.
+       Each glob is filed under one literal key it requires (a file name, an extension, a folder
+       name or the start of a file/folder name), and a path is only tested against the globs filed
+       under the keys it has, plus the few globs that have no usable key.
+    '''
+    key_length = 3 # length of the file/folder name start used as a key
+
+    def __init__(self, filepatterns):
+        self.filepatterns = list(dict.fromkeys(filepatterns))
+        self._root = normcase('root/')
+        self._sep = normcase('/')
+        self._by_name = {}
+        self._by_ext = {}
+        self._by_dir = {}
+        self._by_name_start = {}
+        self._unkeyed = []
+        for filepattern in self.filepatterns:
+            self._add(filepattern)
+
+    def _add(self, filepattern):
+        sep = self._sep
+        normalized = normcase(filepattern)
+        prefix, suffix, segments = _glob_literals(normalized)
+        entry = (filepattern, _compile_pattern(normalized), prefix, suffix, max(segments, key=len, default=''))
+        name = suffix.rpartition(sep)[2] if sep in suffix else ''
+        ext = suffix.rpartition('.')[2] if '.' in suffix else ''
+        if sep in ext: # the last '.' is in a folder name
+            ext = ''
+        dir_names = [part for segment in segments for part in segment.split(sep)[1:-1] if part]
+        name_starts = [segment.rpartition(sep)[2] for segment in (segments[:-1] if suffix else segments)
+                       if sep in segment and len(segment.rpartition(sep)[2]) >= self.key_length]
+        if name:
+            self._by_name.setdefault(name, []).append(entry)
+        elif ext:
+            self._by_ext.setdefault(ext, []).append(entry)
+        elif dir_names:
+            self._by_dir.setdefault(max(dir_names, key=len), []).append(entry)
+        elif name_starts:
+            self._by_name_start.setdefault(max(name_starts, key=len)[:self.key_length], []).append(entry)
+        else:
+            self._unkeyed.append(entry)
+
+    def match(self, path):
+        '''Returns the globs (as they were given) that path matches'''
+        normalized = self._root + normcase(path)
+        parts = normalized.split(self._sep)
+        name = parts[-1]
+        candidates = list(self._unkeyed)
+        candidates.extend(self._by_name.get(name, ()))
+        if '.' in name:
+            candidates.extend(self._by_ext.get(name.rpartition('.')[2], ()))
+        if self._by_dir:
+            for dir_name in set(parts[1:-1]):
+                candidates.extend(self._by_dir.get(dir_name, ()))
+        if self._by_name_start:
+            for name_start in set(part[:self.key_length] for part in parts[1:]):
+                candidates.extend(self._by_name_start.get(name_start, ()))
+        return [filepattern for filepattern, pat, prefix, suffix, longest in candidates
+                if normalized.startswith(prefix) and normalized.endswith(suffix) and longest in normalized
+                and pat(normalized) is not None]
+
+class ArchiveMemberPath(os.PathLike):
+    '''A file inside a zip or tar archive, read straight from the archive without being copied
+       to the temp folder first. open() and read_bytes() stream the member; anything that needs a
+       real file (os.fspath(), open(path), sqlite3) extracts it on first use, together with its
+       -wal/-shm/-journal siblings so SQLite databases open with all their data.
+    '''
+    sqlite_siblings = ('-wal', '-shm', '-journal')
+
+    def __init__(self, seeker, member_name):
+        self._seeker = seeker
+        self.member_name = member_name
+
+    @property
+    def name(self):
+        return os.path.basename(self.member_name.rstrip('/'))
+
+    def open(self, mode='rb'):
+        if mode not in ('r', 'rb'):
+            raise ValueError(f'{self.member_name} can only be opened for reading in binary mode')
+        return self._seeker._open_member(self.member_name)
+
+    def read_bytes(self):
+        with self.open() as f:
+            return f.read()
+
+    def materialize(self):
+        '''Extracts the member (if not done yet) and returns the path of the copy'''
+        for sibling in self.sqlite_siblings:
+            if self._seeker._has_member(self.member_name + sibling):
+                self._seeker._materialize(self.member_name + sibling)
+        return self._seeker._materialize(self.member_name)
+
+    def __fspath__(self):
+        path = self.materialize()
+        if path is None:
+            raise FileNotFoundError(f'Could not extract {self.member_name}')
+        return path
+
+    def __str__(self):
+        return self.member_name
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.member_name!r})'
+
+def _synchronized(method):
+    '''Runs the seeker method under the seeker's lock, as plugins may use a seeker from several threads'''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class _TarMemberReader(tarfile.ExFileObject):
+    '''Reads a tar member through its own handle on the archive, so members can be read from
+       several threads without sharing the file position of the seeker's handle'''
+    def __init__(self, tar_file_path, member):
+        self._handle = open(tar_file_path, 'rb')
+        super().__init__(types.SimpleNamespace(fileobj=self._handle), member)
+
+    def close(self):
+        super().close()
+        self._handle.close()
+
+_FICLONE = 0x40049409 # linux ioctl, shares the data blocks of a file (btrfs, xfs)
+_clone_supported = is_platform_linux()
+
+def _clone_file(source, destination):
+    '''Copies source to destination as a copy-on-write clone of the same data blocks, so the copy is
+       instant and takes no space while the original stays untouched. Returns False if the file
+       system (or platform) does not support it, the caller then makes a regular copy.
+       Hard links are not used: plugins open the copies with sqlite, which may write to them.
+    '''
+    global _clone_supported
+    if not _clone_supported:
+        return False
+    import fcntl
+    try:
+        with open(source, 'rb') as fin, open(destination, 'wb') as fout:
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        return True
+    except OSError as ex:
+        if ex.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EXDEV):
+            _clone_supported = False # not supported by this file system, don't try again
+        return False
+
 class FileSeekerBase:
     # This is an abstract base class
+    streams_members = False # search_lazy reads files straight from an archive, without extracting them first
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
     def search(self, filepattern_to_search, return_on_first_hit=False):
         '''Returns a list of paths for files/folders that matched'''
         pass
 
+    def search_many(self, filepatterns):
+        '''Returns a dict of {filepattern: list of paths} for all the patterns'''
+        return {filepattern: self.search(filepattern) for filepattern in dict.fromkeys(filepatterns)}
+
+    def search_lazy(self, filepattern):
+        '''Like search, but returns path objects with open()/read_bytes(). Seekers reading from
+           archives return ArchiveMemberPath objects that avoid copying files to the temp folder.'''
+        return [Path(path) for path in self.search(filepattern)]
+
     def cleanup(self):
         '''close any open handles'''
         pass
 
+class _PathList:
+    '''List of paths stored as a folder prefix shared by all the entries of a folder plus the entry
+       name, with repeated names stored once. Holds a large listing in a fraction of the memory of
+       a list of full path strings, full paths are only built when items are read.
+    '''
+    def __init__(self):
+        self._folders = [] # folder prefixes, ending with a separator
+        self._folder_ids = {}
+        self._folder_of = array('I')
+        self._names = []
+        self._name_pool = {}
+
+    def folder_id(self, prefix):
+        folder_id = self._folder_ids.get(prefix)
+        if folder_id is None:
+            folder_id = self._folder_ids[prefix] = len(self._folders)
+            self._folders.append(prefix)
+        return folder_id
+
+    def append(self, folder_id, name):
+        self._folder_of.append(folder_id)
+        self._names.append(self._name_pool.setdefault(name, name))
+
+    def append_path(self, path):
+        split = path.rfind(os.sep) + 1
+        self.append(self.folder_id(path[:split]), path[split:])
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, index):
+        return self._folders[self._folder_of[index]] + self._names[index]
+
+    def __iter__(self):
+        folders = self._folders
+        return (folders[folder_id] + name for folder_id, name in zip(self._folder_of, self._names))
+
 class FileSeekerDir(FileSeekerBase):
-    def __init__(self, directory):
+    walker_threads = min(32, (os.cpu_count() or 1) * 4) # scandir waits on the disk (or network) with the GIL released
+    progress_interval = 5 # seconds between progress messages while listing
+
+    def __init__(self, directory, use_cache=False):
         FileSeekerBase.__init__(self)
         self.directory = directory
-        self._all_files = []
-        logfunc('Building files listing...')
-        self.build_files_list(directory)
-        logfunc(f'File listing complete - {len(self._all_files)} files')
+        self._all_files = _PathList()
+        cache = ListingCache() if use_cache else None
+        listing = cache.load_dir(directory) if cache else None
+        if listing is not None:
+            for relative_path in listing.relative_paths:
+                self._all_files.append_path(os.path.join(directory, relative_path))
+            logfunc(f'File listing loaded from cache - {len(self._all_files)} files')
+        else:
+            logfunc('Building files listing...')
+            listing = self.build_files_list(directory, collect_stats=cache is not None)
+            logfunc(f'File listing complete - {len(self._all_files)} files')
+            if cache:
+                cache.save_dir(directory, listing)
+        self._index = _PathIndex(self._all_files, directory, depth_first=True)
 
-    def build_files_list(self, directory):
-        '''Populates all paths in directory into _all_files'''
+    @staticmethod
+    def _scan_dir(folder, collect_stats):
+        '''Returns (folder, [(name, is_dir, stat_result)], error) for the entries of one folder'''
+        entries = []
         try:
-            files_list = os.scandir(directory)
-            for item in files_list:
-                self._all_files.append(item.path)
-                if item.is_dir(follow_symlinks=False):
-                    self.build_files_list(item.path)
+            with os.scandir(folder) as files_list:
+                for item in files_list:
+                    is_dir = item.is_dir(follow_symlinks=False)
+                    entries.append((item.name, is_dir, item.stat(follow_symlinks=False) if collect_stats else None))
         except Exception as ex:
-            logfunc(f'Error reading {directory} ' + str(ex))
+            return folder, entries, ex
+        return folder, entries, None
+
+    def build_files_list(self, directory, collect_stats=False):
+        '''Populates all paths in directory into _all_files, in depth-first order (the order the
+           _PathIndex folder ranges rely on). Folders are read by a pool of threads, then put in
+           order once all are read. Returns a DirListing with sizes and mtimes if collect_stats.
+        '''
+        scanned = {} # folder -> entries
+        file_count = 0
+        next_progress = timex.monotonic() + self.progress_interval
+        with ThreadPoolExecutor(self.walker_threads) as executor:
+            pending = {executor.submit(self._scan_dir, directory, collect_stats)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    folder, entries, error = future.result()
+                    if error is not None:
+                        logfunc(f'Error reading {folder} ' + str(error))
+                    scanned[folder] = entries
+                    file_count += len(entries)
+                    prefix = os.path.join(folder, '')
+                    for name, is_dir, _ in entries:
+                        if is_dir:
+                            pending.add(executor.submit(self._scan_dir, prefix + name, collect_stats))
+                if timex.monotonic() >= next_progress:
+                    next_progress = timex.monotonic() + self.progress_interval
+                    logfunc(f'Listing files... {file_count} files, {len(scanned)} folders read, {len(pending)} to go')
+                    GuiWindow.SetProgressBar(len(scanned), len(scanned) + len(pending))
+
+        listing = DirListing() if collect_stats else None
+        relative_start = len(os.path.join(directory, ''))
+        all_files = self._all_files
+        prefix = os.path.join(directory, '')
+        stack = [(all_files.folder_id(prefix), prefix, iter(scanned.pop(directory)))]
+        while stack:
+            folder_id, prefix, entries = stack[-1]
+            for name, is_dir, stat_result in entries:
+                all_files.append(folder_id, name)
+                if listing is not None:
+                    listing.append((prefix + name)[relative_start:], stat_result, is_dir)
+                if is_dir:
+                    folder = prefix + name
+                    sub_prefix = os.path.join(folder, '')
+                    stack.append((all_files.folder_id(sub_prefix), sub_prefix, iter(scanned.pop(folder, ()))))
+                    break
+            else:
+                stack.pop()
+        return listing
 
     def search(self, filepattern, return_on_first_hit=False):
-        pat = _compile_pattern( normcase(filepattern) )
-        root = normcase("root/")
-        if return_on_first_hit:
-            for item in self._all_files:
-                if pat( root + normcase(item) ) is not None:
-                    return [item]
-            return []
-        pathlist = []
-        for item in self._all_files:
-            if pat( root + normcase(item) ) is not None:
-                pathlist.append(item)
-        return pathlist
+        return self._index.search(filepattern, return_on_first_hit)
+
+    def search_many(self, filepatterns):
+        # the index already narrows each search down to a handful of candidates
+        return {filepattern: self._index.search(filepattern) for filepattern in dict.fromkeys(filepatterns)}
 
 class FileSeekerItunes(FileSeekerBase):
-    def __init__(self, directory, temp_folder):
+    def __init__(self, directory, temp_folder, use_cache=False):
         FileSeekerBase.__init__(self)
         self.directory = directory
         self._all_files = {}
         self.temp_folder = temp_folder
-        logfunc('Building files listing...')
-        self.build_files_list(directory)
-        logfunc(f'File listing complete - {len(self._all_files)} files')
+        cache = ListingCache() if use_cache else None
+        all_files = cache.load_itunes(directory) if cache else None
+        if all_files is not None:
+            self._all_files = all_files
+            logfunc(f'File listing loaded from cache - {len(self._all_files)} files')
+        else:
+            logfunc('Building files listing...')
+            self.build_files_list(directory)
+            logfunc(f'File listing complete - {len(self._all_files)} files')
+            if cache:
+                cache.save_itunes(directory, self._all_files)
+        # fnmatch.filter semantics, paths are matched as they are without the 'root/' prefix. The
+        # index needs the paths in depth-first order, searches return them in Manifest.db order.
+        self._order = {path: position for position, path in enumerate(self._all_files)}
+        sep = normcase('/')
+        paths = sorted(self._all_files, key=lambda path: os.path.normcase(path).split(sep))
+        self._index = _PathIndex(paths, depth_first=True, root='', dir_entries=False)
+        self._copied = {} # path -> copy in temp_folder, every file is only copied once
     
     def build_files_list(self, directory):
         '''Populates paths from Manifest.db files into _all_files'''
@@ -98,85 +564,201 @@ class FileSeekerItunes(FileSeekerBase):
             logfunc(f'Error opening Manifest.db from {directory}, ' + str(ex))
             raise ex
 
+    @_synchronized
     def search(self, filepattern, return_on_first_hit=False):
         pathlist = []
-        matching_keys = fnmatch.filter(self._all_files, filepattern)
+        matching_keys = sorted(self._index.search(filepattern), key=self._order.__getitem__)
+        if return_on_first_hit:
+            matching_keys = matching_keys[:1]
         for relative_path in matching_keys:
-            hash_filename = self._all_files[relative_path]
-            original_location = os.path.join(self.directory, hash_filename[:2], hash_filename)
-            temp_location = os.path.join(self.temp_folder, sanitize_file_path(relative_path))
-            if is_platform_windows():
-                temp_location = temp_location.replace('/', '\\')
-            try:
-                os.makedirs(os.path.dirname(temp_location), exist_ok=True)
-                copyfile(original_location, temp_location)
+            temp_location = self._copied.get(relative_path) or self._copy(relative_path)
+            if temp_location:
                 pathlist.append(temp_location)
-            except Exception as ex:
-                logfunc(f'Could not copy {original_location} to {temp_location} ' + str(ex))
         return pathlist
 
+    def _copy(self, relative_path):
+        '''Copies the backup file of relative_path to the temp folder, returns the copy's path or None'''
+        hash_filename = self._all_files[relative_path]
+        original_location = os.path.join(self.directory, hash_filename[:2], hash_filename)
+        temp_location = os.path.join(self.temp_folder, sanitize_file_path(relative_path))
+        if is_platform_windows():
+            temp_location = temp_location.replace('/', '\\')
+        try:
+            os.makedirs(os.path.dirname(temp_location), exist_ok=True)
+            if not _clone_file(original_location, temp_location):
+                copyfile(original_location, temp_location)
+            self._copied[relative_path] = temp_location
+            return temp_location
+        except Exception as ex:
+            logfunc(f'Could not copy {original_location} to {temp_location} ' + str(ex))
+        return None
+
 class FileSeekerTar(FileSeekerBase):
+    chunk_size = 1024 * 1024 # members are copied out in chunks of this size
+
     def __init__(self, tar_file_path, temp_folder):
         FileSeekerBase.__init__(self)
         self.is_gzip = tar_file_path.lower().endswith('gz')
+        self.streams_members = not self.is_gzip
         mode ='r:gz' if self.is_gzip else 'r'
         self.tar_file = tarfile.open(tar_file_path, mode)
+        self.tar_file_path = tar_file_path
         self.temp_folder = temp_folder
         self.directory = temp_folder
+        self._extracted = {} # member name -> path of the copy in temp_folder
+        self._member_lookup = None
 
+    @_synchronized
     def search(self, filepattern, return_on_first_hit=False):
         pathlist = []
         pat = _compile_pattern( normcase(filepattern) )
         root = normcase("root/")
         for member in self.tar_file.getmembers():
             if pat( root + normcase(member.name) ) is not None:
-                try:
-                    clean_name = sanitize_file_path(member.name)
-                    full_path = os.path.join(self.temp_folder, Path(clean_name))
-                    if member.isdir():
-                        os.makedirs(full_path, exist_ok=True)
-                    else:
-                        parent_dir = os.path.dirname(full_path)
-                        if not os.path.exists(parent_dir):
-                            os.makedirs(parent_dir)
-                        with open(full_path, "wb") as fout:
-                            fout.write(tarfile.ExFileObject(self.tar_file, member).read())
-                            fout.close()
-                        os.utime(full_path, (member.mtime, member.mtime))
+                full_path = self._extracted.get(member.name) or self._extract(member)
+                if full_path:
                     pathlist.append(full_path)
-                except Exception as ex:
-                    logfunc(f'Could not write file to filesystem, path was {member.name} ' + str(ex))
         return pathlist
 
+    @_synchronized
+    def search_many(self, filepatterns):
+        '''Extracts members matching any of the patterns while reading the archive once from start
+           to end. Members are written out as their headers are read, so a compressed archive is
+           never seeked backwards (which means decompressing it again from the start).
+        '''
+        pattern_set = _PatternSet(filepatterns)
+        found = {filepattern: [] for filepattern in pattern_set.filepatterns}
+        for member in self.tar_file:
+            matched = pattern_set.match(member.name)
+            if matched:
+                full_path = self._extract(member)
+                if full_path:
+                    for filepattern in matched:
+                        found[filepattern].append(full_path)
+        return found
+
+    @_synchronized
+    def search_lazy(self, filepattern):
+        if self.is_gzip:
+            # reading members out of order means decompressing from the start again. The files of
+            # lazy plugins are extracted by search_many instead, search finds them in _extracted.
+            return FileSeekerBase.search_lazy(self, filepattern)
+        pat = _compile_pattern( normcase(filepattern) )
+        root = normcase("root/")
+        return [ArchiveMemberPath(self, member.name) for member in self.tar_file.getmembers()
+                if member.isfile() and pat( root + normcase(member.name) ) is not None]
+
+    def _has_member(self, name):
+        return name in self._members_by_name()
+
+    @_synchronized
+    def _members_by_name(self):
+        if self._member_lookup is None:
+            self._member_lookup = {member.name: member for member in self.tar_file.getmembers()}
+        return self._member_lookup
+
+    def _open_member(self, name):
+        return _TarMemberReader(self.tar_file_path, self._members_by_name()[name])
+
+    @_synchronized
+    def _materialize(self, name):
+        return self._extracted.get(name) or self._extract(self._members_by_name()[name])
+
+    def _extract(self, member):
+        '''Writes member to the temp folder, returns its path or None on failure'''
+        try:
+            clean_name = sanitize_file_path(member.name)
+            full_path = os.path.join(self.temp_folder, Path(clean_name))
+            if member.isdir():
+                os.makedirs(full_path, exist_ok=True)
+            else:
+                parent_dir = os.path.dirname(full_path)
+                if not os.path.exists(parent_dir):
+                    os.makedirs(parent_dir)
+                with open(full_path, "wb") as fout:
+                    copyfileobj(tarfile.ExFileObject(self.tar_file, member), fout, self.chunk_size)
+                os.utime(full_path, (member.mtime, member.mtime))
+            self._extracted[member.name] = full_path
+            return full_path
+        except Exception as ex:
+            logfunc(f'Could not write file to filesystem, path was {member.name} ' + str(ex))
+        return None
+
     def cleanup(self):
         self.tar_file.close()
 
 class FileSeekerZip(FileSeekerBase):
+    streams_members = True
+
     def __init__(self, zip_file_path, temp_folder):
         FileSeekerBase.__init__(self)
         self.zip_file = ZipFile(zip_file_path)
         self.name_list = self.zip_file.namelist()
         self.temp_folder = temp_folder
         self.directory = temp_folder
+        self._extracted = {} # member name -> path of the copy in temp_folder
+        self._name_set = None
 
+    @_synchronized
     def search(self, filepattern, return_on_first_hit=False):
         pathlist = []
         pat = _compile_pattern( normcase(filepattern) )
         root = normcase("root/")
         for member in self.name_list:
             if pat( root + normcase(member) ) is not None:
-                try:
-                    extracted_path = self.zip_file.extract(member, path=self.temp_folder) # already replaces illegal chars with _ when exporting
-                    f = self.zip_file.getinfo(member)
-                    date_time = f.date_time
-                    date_time = timex.mktime(date_time + (0, 0, -1))
-                    os.utime(extracted_path, (date_time, date_time))
+                extracted_path = self._extract(member)
+                if extracted_path:
                     pathlist.append(extracted_path)
-                except Exception as ex:
-                    member = member.lstrip("/")
-                    logfunc(f'Could not write file to filesystem, path was {member} ' + str(ex))
         return pathlist
 
+    @_synchronized
+    def search_many(self, filepatterns):
+        pattern_set = _PatternSet(filepatterns)
+        found = {filepattern: [] for filepattern in pattern_set.filepatterns}
+        for member in self.name_list:
+            matched = pattern_set.match(member)
+            if matched:
+                extracted_path = self._extract(member)
+                if extracted_path:
+                    for filepattern in matched:
+                        found[filepattern].append(extracted_path)
+        return found
+
+    @_synchronized
+    def search_lazy(self, filepattern):
+        pat = _compile_pattern( normcase(filepattern) )
+        root = normcase("root/")
+        return [ArchiveMemberPath(self, member) for member in self.name_list
+                if not member.endswith('/') and pat( root + normcase(member) ) is not None]
+
+    def _has_member(self, name):
+        if self._name_set is None:
+            self._name_set = set(self.name_list)
+        return name in self._name_set
+
+    @_synchronized
+    def _open_member(self, name):
+        return self.zip_file.open(name)
+
+    @_synchronized
+    def _materialize(self, name):
+        return self._extracted.get(name) or self._extract(name)
+
+    def _extract(self, member):
+        '''Extracts member to the temp folder, returns its path or None on failure'''
+        try:
+            extracted_path = self.zip_file.extract(member, path=self.temp_folder) # already replaces illegal chars with _ when exporting
+            f = self.zip_file.getinfo(member)
+            date_time = f.date_time
+            date_time = timex.mktime(date_time + (0, 0, -1))
+            os.utime(extracted_path, (date_time, date_time))
+            self._extracted[member] = extracted_path
+            return extracted_path
+        except Exception as ex:
+            member = member.lstrip("/")
+            logfunc(f'Could not write file to filesystem, path was {member} ' + str(ex))
+        return None
+
     def cleanup(self):
         self.zip_file.close()
         
\ No newline at end of file